@@ -1,5 +1,6 @@
-from flask import Flask, render_template, request, jsonify, send_file
+from flask import Flask, render_template, request, jsonify, send_file, Response, stream_with_context
 import os
+import json
 import logging
 import threading
 from datetime import datetime
@@ -8,24 +9,44 @@ from dotenv import load_dotenv
 # Charger automatiquement les variables d'environnement depuis un fichier .env (si présent)
 load_dotenv()
 
+# Profilage du démarrage (STARTUP_PROFILE=1), importé avant les modules lourds
+from backend.startup_profiler import profiler
+
 # Import des modules backend personnalisés
-from backend.backendtow import (
-    process_question,
-    handle_uploaded_file,
-    handle_multiple_uploaded_files,
-    rag_fusion_multi_docs,
-    load_faiss_index,
-    add_document_to_index,
-    generate_export_file,
-    embeddings,
-)
-from backend.models import db as sqldb, ChatThread, ChatMessage
-from backend.chat_service import handle_question, get_chat_history, generate_title_from_message
-from backend.structured_data_models import Product, Ingredient, Incompatibility
-from backend.compatibility_checker import CompatibilityChecker
-from backend.data_extractor import DataExtractor, DataProcessor
-from langchain_community.vectorstores import FAISS
-from backend.config import INDEX_PATH, AUTO_PERSIST_STRUCTURED
+with profiler.step("backend.backendtow (imports inclus)", group="module"):
+    from backend.backendtow import (
+        process_question,
+        handle_uploaded_file,
+        handle_multiple_uploaded_files,
+        rag_fusion_multi_docs,
+        stream_rag_fusion_multi_docs,
+        reload_faiss_index,
+        reset_faiss_index,
+        flush_faiss_index,
+        add_document_to_index,
+        current_index,
+        get_index_status,
+        index_flusher,
+        generate_export_file,
+        warm_up_models,
+        get_readiness,
+        file_document_id,
+        get_existing_document_ids,
+        promote_faiss_index,
+        compact_faiss_index,
+        delete_document,
+        replace_document,
+    )
+    from backend.ann_index import ANN_INDEX_TYPES
+    from backend.metadata_index import FILTER_FIELDS, normalize_filters
+with profiler.step("backend.models / chat_service / structured_data", group="module"):
+    from backend.models import db as sqldb, ChatThread, ChatMessage
+    from backend.chat_service import handle_question, get_chat_history, generate_title_from_message
+    from backend.structured_data_models import Product, Ingredient, Incompatibility
+with profiler.step("backend.compatibility_checker / data_extractor", group="module"):
+    from backend.compatibility_checker import CompatibilityChecker
+    from backend.data_extractor import DataExtractor, DataProcessor
+from backend.config import AUTO_PERSIST_STRUCTURED
 import re
 
 # ==============================
@@ -34,7 +55,8 @@ import re
 
 def create_app():
     """Factory function pour créer l'application Flask"""
-    app = Flask(__name__)
+    with profiler.step("create_app: Flask"):
+        app = Flask(__name__)
 
     # Configuration de l'application
     app.config['UPLOAD_FOLDER'] = 'uploads'  # Dossier pour les fichiers uploadés
@@ -45,7 +67,8 @@ def create_app():
     os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 
     # Initialisation de la base de données avec l'application Flask
-    sqldb.init_app(app)
+    with profiler.step("create_app: sqldb.init_app"):
+        sqldb.init_app(app)
     
     return app
 
@@ -54,6 +77,13 @@ app = create_app()
 # Configuration du système de logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+# Préchauffage en arrière-plan (embeddings, cross-encoder, index en parallèle):
+# le serveur accepte les requêtes sans attendre, /ready indique l'avancement
+warm_up_models()
+
+# Rapport du démarrage synchrone; complété par le préchauffage et les chargements suivants
+profiler.finish()
+
 # ==============================
 # CONFIGURATION ADMIN ET SÉCURITÉ
 # ==============================
@@ -61,9 +91,6 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(
 # Token d'administration - en production utiliser variables d'environnement
 ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "mon_token_secret")
 
-# Verrou pour les opérations sur l'index FAISS (évite les accès concurrents)
-index_lock = threading.Lock()
-
 def check_admin_auth():
     """
     Vérifie l'authentification admin via token Bearer.
@@ -116,9 +143,38 @@ def index():
     """
     return render_template("chat.html")
 
+@app.route("/ready", methods=["GET"])
+def ready():
+    """
+    État de chargement des modèles et de l'index (sonde de disponibilité).
+    
+    Returns:
+        JSON: Composants chargés; 200 si /ask peut répondre sans chargement, 503 sinon
+    """
+    readiness = get_readiness()
+    return jsonify(readiness), 200 if readiness["ready"] else 503
+
+def _request_filters():
+    """
+    Filtres de recherche de la requête: champs document_id, source_type, product
+    et brand, répétables (document_id et source_type acceptent aussi "a,b").
+
+    Raises:
+        ValueError: Filtre invalide
+    """
+    filters = {}
+    for field in FILTER_FIELDS:
+        values = request.form.getlist(field)
+        if field in ("document_id", "source_type"):
+            values = [v for value in values for v in value.split(",")]
+        values = [v.strip() for v in values if v.strip()]
+        if values:
+            filters[field] = values
+    return normalize_filters(filters)
+
 @app.route("/ask", methods=["POST"])
 def ask():
-    # FAISS index is loaded at startup via backend.backendtow.load_faiss_index()
+    # L'index FAISS est chargé par le préchauffage ou au premier appel (current_index())
     """
     Point d'entrée principal pour les questions et uploads de fichiers.
     Gère à la fois le RAG et le mode conversation simple.
@@ -134,6 +190,17 @@ def ask():
         user_id = request.form.get("user_id") or "anonymous"
         thread_id = request.form.get("thread_id")
         nb_messages = int(request.form.get("nb_messages", "3"))
+        # use_cache=false force une nouvelle génération (cache sémantique des réponses ignoré)
+        use_cache = request.form.get("use_cache", "true").lower() == "true"
+        # summary=false: pas de ligne "📄 Résumé" (clients API qui ne l'affichent pas)
+        summary = request.form.get("summary", "true").lower() == "true"
+        # multi_query=local|llm|off: reformulations de la question (par défaut MULTI_QUERY_MODE)
+        multi_query = request.form.get("multi_query")
+        # Recherche restreinte: document_id, source_type (pdf, docx...), product, brand
+        try:
+            filters = _request_filters()
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
 
         # Validation des paramètres requis
         if not session_id:
@@ -159,40 +226,48 @@ def ask():
         user_msg = question if question else ""
         answer = ""
         context = []
-
-        # Section critique protégée par verrou (accès à l'index FAISS)
-        with index_lock:
-            if files:
-                # Traitement avec fichiers uploadés
-                answer = handle_multiple_uploaded_files(
-                    files,
-                    question=question,
-                    chat_history=get_chat_history(user_id, session_id, thread_id, nb_messages),
-                    use_rag=use_rag,
-                    nb_messages=nb_messages
+        document_ids = []
+
+        # Pas de verrou global: l'index gère ses verrous lecteurs/rédacteur en interne
+        if files:
+            # Traitement avec fichiers uploadés
+            answer = handle_multiple_uploaded_files(
+                files,
+                question=question,
+                chat_history=get_chat_history(user_id, session_id, thread_id, nb_messages),
+                use_rag=use_rag,
+                nb_messages=nb_messages
+            )
+            # Identifiants à repasser en filtre document_id pour les questions suivantes
+            # (fichiers dont l'extraction a échoué exclus: leurs chunks ont été retirés)
+            indexed_ids = get_existing_document_ids()
+            document_ids = [doc_id for doc_id in map(file_document_id, files) if doc_id in indexed_ids]
+            # Enrichissement du message utilisateur avec les noms de fichiers
+            if question:
+                user_msg += " (Fichiers : " + ", ".join([f.filename for f in files]) + ")"
+        else:
+            # Traitement question seule
+            chat_history = get_chat_history(user_id, session_id, thread_id, nb_messages)
+            if use_rag:
+                # Mode RAG avec recherche documentaire
+                answer, context = rag_fusion_multi_docs(
+                    query=question,
+                    chat_history=chat_history,
+                    nb_messages=nb_messages,
+                    use_cache=use_cache,
+                    summary_mode=None if summary else "off",
+                    multi_query=multi_query,
+                    filters=filters
                 )
-                # Enrichissement du message utilisateur avec les noms de fichiers
-                if question:
-                    user_msg += " (Fichiers : " + ", ".join([f.filename for f in files]) + ")"
             else:
-                # Traitement question seule
-                chat_history = get_chat_history(user_id, session_id, thread_id, nb_messages)
-                if use_rag:
-                    # Mode RAG avec recherche documentaire
-                    answer, context = rag_fusion_multi_docs(
-                        query=question,
-                        chat_history=chat_history,
-                        nb_messages=nb_messages
-                    )
-                else:
-                    # Mode conversation simple
-                    answer = process_question(
-                        question,
-                        use_rag=False,
-                        chat_history=chat_history,
-                        nb_messages=nb_messages
-                    )
-                    context = []
+                # Mode conversation simple
+                answer = process_question(
+                    question,
+                    use_rag=False,
+                    chat_history=chat_history,
+                    nb_messages=nb_messages
+                )
+                context = []
 
         # Sauvegarde de l'échange en base de données
         handle_question(user_id, session_id, thread_id, user_msg, answer)
@@ -209,6 +284,7 @@ def ask():
         return jsonify({
             "answer": answer,
             "context": context_serializable,
+            "document_ids": document_ids,
             "session_id": session_id,
             "thread_id": thread_id
         })
@@ -217,6 +293,96 @@ def ask():
         logging.error(f"Erreur serveur /ask : {e}", exc_info=True)
         return jsonify({"error": f"Erreur serveur: {str(e)}"}), 500
 
+def _sse(event, data):
+    """Formate un événement Server-Sent Events (données JSON)"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@app.route("/ask/stream", methods=["POST"])
+def ask_stream():
+    """
+    Variante en flux de /ask (questions sans fichier) via Server-Sent Events.
+
+    Événements envoyés dans l'ordre:
+        sources: chunks utilisés, dès la fin de la recherche
+        token:   fragments de la réponse au fil de la génération
+        summary: résumé "📄 Résumé" (si activé)
+        done:    réponse complète, session_id et thread_id (échange sauvegardé)
+        error:   erreur serveur, à la place de done
+
+    Returns:
+        Response: Flux text/event-stream
+    """
+    question = request.form.get("question", "").strip()
+    use_rag = request.form.get("use_rag", "true").lower() == "true"
+    session_id = request.form.get("session_id")
+    user_id = request.form.get("user_id") or "anonymous"
+    thread_id = request.form.get("thread_id") or 'thread_' + os.urandom(8).hex()
+    nb_messages = int(request.form.get("nb_messages", "3"))
+    use_cache = request.form.get("use_cache", "true").lower() == "true"
+    summary = request.form.get("summary", "true").lower() == "true"
+    multi_query = request.form.get("multi_query")
+    try:
+        filters = _request_filters()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    if not session_id:
+        return jsonify({"error": "session_id manquant"}), 400
+    if request.files.getlist("file"):
+        return jsonify({"error": "Les fichiers ne sont pas pris en charge en flux, utilisez /ask."}), 400
+    if not question:
+        return jsonify({"error": "Aucune question reçue."}), 400
+
+    logging.info(f"/ask/stream reçu - user_id:{user_id} session_id:{session_id} thread_id:{thread_id}")
+
+    thread = create_thread_if_not_exists(user_id, thread_id)
+    chat_history = get_chat_history(user_id, session_id, thread_id, nb_messages)
+
+    def generate():
+        try:
+            if use_rag:
+                events = stream_rag_fusion_multi_docs(
+                    query=question,
+                    chat_history=chat_history,
+                    nb_messages=nb_messages,
+                    use_cache=use_cache,
+                    summary_mode=None if summary else "off",
+                    multi_query=multi_query,
+                    filters=filters
+                )
+            else:
+                # Mode conversation simple: réponse envoyée en un seul fragment
+                answer = process_question(question, use_rag=False, chat_history=chat_history, nb_messages=nb_messages)
+                events = iter([("sources", []), ("token", answer), ("done", answer)])
+
+            answer = ""
+            for event, data in events:
+                if event == "sources":
+                    data = [{"page_content": doc.page_content, "metadata": doc.metadata} for doc in data]
+                if event == "done":
+                    answer = data
+                    break
+                yield _sse(event, data)
+
+            # Sauvegarde de l'échange une fois la réponse complète
+            handle_question(user_id, session_id, thread_id, question, answer)
+            if thread and (not thread.title or thread.title == "Nouvelle conversation"):
+                thread.title = generate_title_from_message(question)
+                thread.created_at = thread.created_at or datetime.utcnow()
+                sqldb.session.commit()
+
+            yield _sse("done", {"answer": answer, "session_id": session_id, "thread_id": thread_id})
+        except Exception as e:
+            logging.error(f"Erreur serveur /ask/stream : {e}", exc_info=True)
+            yield _sse("error", {"error": f"Erreur serveur: {str(e)}"})
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        # Pas de mise en tampon par un proxy (nginx) ni de cache navigateur
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 @app.route("/export", methods=["POST"])
 def export():
     """
@@ -825,21 +991,86 @@ def list_incompatibilities():
 @app.route("/admin/reload_index", methods=["POST"])
 def admin_reload_index():
     """
-    Recharge l'index FAISS (admin seulement).
+    Recharge l'index FAISS en arrière-plan (admin seulement).
+    La nouvelle version remplace l'ancienne dès qu'elle est prête; les
+    requêtes en cours ne sont pas interrompues.
     
     Returns:
-        JSON: Statut de l'opération
+        JSON: Statut de l'opération et version actuellement active
     """
     if not check_admin_auth():
         return jsonify({"error": "Unauthorized"}), 401
         
-    with index_lock:
-        try:
-            load_faiss_index()
-            return jsonify({"status": "Index FAISS rechargé."})
-        except Exception as e:
-            logging.error(f"Erreur reload index : {e}", exc_info=True)
-            return jsonify({"error": str(e)}), 500
+    try:
+        started = reload_faiss_index(background=True)
+        status = get_index_status()
+        status["status"] = "Rechargement lancé." if started else "Rechargement déjà en cours."
+        return jsonify(status), 202
+    except Exception as e:
+        logging.error(f"Erreur reload index : {e}", exc_info=True)
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/admin/promote_index", methods=["POST"])
+def admin_promote_index():
+    """
+    Reconstruit l'index FAISS en index approximatif en arrière-plan (admin seulement).
+    Corps JSON optionnel: {"index_type": "flat" | "ivf_flat" | "ivf_pq" | "hnsw"};
+    sans type, celui visé par ANN_INDEX_TYPE et la taille de l'index.
+    
+    Returns:
+        JSON: Statut de l'opération et état de l'index
+    """
+    if not check_admin_auth():
+        return jsonify({"error": "Unauthorized"}), 401
+
+    index_type = (request.get_json(silent=True) or {}).get("index_type")
+    if index_type is not None and index_type not in ANN_INDEX_TYPES:
+        return jsonify({"error": f"index_type invalide (types: {', '.join(ANN_INDEX_TYPES)})"}), 400
+
+    try:
+        threading.Thread(target=promote_faiss_index, args=(index_type,),
+                         name="faiss-index-promotion", daemon=True).start()
+        status = get_index_status()
+        status["status"] = "Promotion lancée."
+        return jsonify(status), 202
+    except Exception as e:
+        logging.error(f"Erreur promotion index : {e}", exc_info=True)
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/admin/compact_index", methods=["POST"])
+def admin_compact_index():
+    """
+    Reconstruit l'index FAISS sans les chunks supprimés, en arrière-plan (admin seulement).
+    Lancée automatiquement quand INDEX_COMPACTION_MIN_DELETED et
+    INDEX_COMPACTION_DELETED_RATIO sont atteints.
+    
+    Returns:
+        JSON: Statut de l'opération et état de l'index
+    """
+    if not check_admin_auth():
+        return jsonify({"error": "Unauthorized"}), 401
+
+    try:
+        threading.Thread(target=compact_faiss_index, name="faiss-index-compaction", daemon=True).start()
+        status = get_index_status()
+        status["status"] = "Compaction lancée."
+        return jsonify(status), 202
+    except Exception as e:
+        logging.error(f"Erreur compaction index : {e}", exc_info=True)
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/admin/index_status", methods=["GET"])
+def admin_index_status():
+    """
+    Version active de l'index, date de chargement et rechargement en cours (admin seulement).
+    
+    Returns:
+        JSON: Statut de l'index
+    """
+    if not check_admin_auth():
+        return jsonify({"error": "Unauthorized"}), 401
+
+    return jsonify(get_index_status())
 
 @app.route("/admin/reset_index", methods=["POST"])
 def admin_reset_index():
@@ -852,20 +1083,97 @@ def admin_reset_index():
     if not check_admin_auth():
         return jsonify({"error": "Unauthorized"}), 401
         
-    with index_lock:
-        try:
-            # Création d'un nouvel index vide
-            db_faiss = FAISS.from_documents([], embeddings)
-            db_faiss.save_local(INDEX_PATH)
-            
-            # Mise à jour de la référence dans le module backend
-            from backend import backendtow as backend_mod
-            backend_mod.db = db_faiss
-            
-            return jsonify({"status": "Index FAISS réinitialisé."})
-        except Exception as e:
-            logging.error(f"Erreur reset index : {e}", exc_info=True)
-            return jsonify({"error": str(e)}), 500
+    try:
+        # Nouvelle version vide publiée à la place de l'index courant
+        reset_faiss_index()
+        return jsonify({"status": "Index FAISS réinitialisé.", "version": current_index().version})
+    except Exception as e:
+        logging.error(f"Erreur reset index : {e}", exc_info=True)
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/admin/flush_index", methods=["POST"])
+def admin_flush_index():
+    """
+    Force l'écriture sur disque des ajouts en attente dans l'index (admin seulement).
+    
+    Returns:
+        JSON: Statut de l'opération
+    """
+    if not check_admin_auth():
+        return jsonify({"error": "Unauthorized"}), 401
+
+    try:
+        pending = index_flusher.pending
+        written = flush_faiss_index()
+        return jsonify({
+            "status": "Index FAISS sauvegardé." if written else "Aucune modification en attente.",
+            "pending_chunks": pending,
+        })
+    except Exception as e:
+        logging.error(f"Erreur flush index : {e}", exc_info=True)
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/admin/documents", methods=["GET"])
+def admin_list_documents():
+    """
+    Liste les documents présents dans le registre de l'index (admin seulement).
+    
+    Returns:
+        JSON: Documents indexés avec leur nombre de chunks
+    """
+    if not check_admin_auth():
+        return jsonify({"error": "Unauthorized"}), 401
+
+    handle = current_index()
+    return jsonify(handle.registry.list_documents() if handle else [])
+
+@app.route("/admin/documents/<document_id>", methods=["DELETE"])
+def admin_delete_document(document_id):
+    """
+    Supprime un document de l'index (admin seulement): ses chunks sont
+    exclus des recherches immédiatement, retirés à la compaction.
+    
+    Returns:
+        JSON: Nombre de chunks supprimés
+    """
+    if not check_admin_auth():
+        return jsonify({"error": "Unauthorized"}), 401
+
+    try:
+        deleted = delete_document(document_id)
+        if not deleted:
+            return jsonify({"error": "Document introuvable."}), 404
+        return jsonify({"status": "Document supprimé.", "document_id": document_id, "deleted_chunks": deleted})
+    except Exception as e:
+        logging.error(f"Erreur suppression document : {e}", exc_info=True)
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/admin/documents/<document_id>", methods=["PUT"])
+def admin_replace_document(document_id):
+    """
+    Remplace le contenu d'un document indexé (admin seulement): seuls ses
+    chunks sont réindexés. Corps JSON: {"text": "...", "metadata": {...}}.
+    
+    Returns:
+        JSON: Chunks supprimés et ajoutés
+    """
+    if not check_admin_auth():
+        return jsonify({"error": "Unauthorized"}), 401
+
+    payload = request.get_json(silent=True) or {}
+    text = payload.get("text", "")
+    if not text.strip():
+        return jsonify({"error": "Texte vide fourni."}), 400
+
+    try:
+        result = replace_document(document_id, text, payload.get("metadata"))
+        if result is None:
+            return jsonify({"error": "Document introuvable."}), 404
+        result["status"] = "Contenu inchangé." if result["unchanged"] else "Document remplacé."
+        return jsonify(result)
+    except Exception as e:
+        logging.error(f"Erreur remplacement document : {e}", exc_info=True)
+        return jsonify({"error": str(e)}), 500
 
 @app.route("/admin/add_document", methods=["POST"])
 def admin_add_document():
@@ -878,23 +1186,22 @@ def admin_add_document():
     if not check_admin_auth():
         return jsonify({"error": "Unauthorized"}), 401
         
-    with index_lock:
-        try:
-            text = request.json.get("text", "")
-            metadata = request.json.get("metadata", {})
+    try:
+        text = request.json.get("text", "")
+        metadata = request.json.get("metadata", {})
             
-            if not text.strip():
-                return jsonify({"error": "Texte vide fourni."}), 400
+        if not text.strip():
+            return jsonify({"error": "Texte vide fourni."}), 400
                 
-            success = add_document_to_index(text, metadata)
-            if success:
-                return jsonify({"status": "Document ajouté à l'index."})
-            else:
-                return jsonify({"error": "Échec de l'ajout du document."}), 500
+        success = add_document_to_index(text, metadata)
+        if success:
+            return jsonify({"status": "Document ajouté à l'index."})
+        else:
+            return jsonify({"error": "Échec de l'ajout du document."}), 500
                 
-        except Exception as e:
-            logging.error(f"Erreur add document : {e}", exc_info=True)
-            return jsonify({"error": str(e)}), 500
+    except Exception as e:
+        logging.error(f"Erreur add document : {e}", exc_info=True)
+        return jsonify({"error": str(e)}), 500
 
 # ==============================
 # POINT D'ENTRÉE DE L'APPLICATION
@@ -902,12 +1209,9 @@ def admin_add_document():
 
 if __name__ == "__main__":
     # Création des tables de base de données
-    with app.app_context():
+    with app.app_context(), profiler.step("sqldb.create_all"):
         sqldb.create_all()
         logging.info("Tables de données créées")
     
-    # Chargement de l'index FAISS au démarrage
-    load_faiss_index()
-    
     # Lancement de l'application Flask
     app.run(debug=True, use_reloader=False)
@@ -0,0 +1,104 @@
+"""
+Recherche adaptative pour le RAG
+Les distances FAISS servent à écarter les chunks hors sujet, à élargir la
+recherche seulement quand les meilleurs candidats sont trop proches pour être
+départagés, et à sauter le reranking quand le premier résultat est nettement
+devant. Les questions faciles coûtent moins de reranking et de tokens de
+prompt; les questions ambiguës reçoivent plus de candidats.
+
+Distances: L2 au carré de l'index FAISS (IndexFlatL2); sur des vecteurs
+normalisés (all-MiniLM-L6-v2), d = 2 - 2 * cosinus, plus petit = plus proche.
+"""
+
+import threading
+from typing import Callable, Dict, List, Tuple
+
+# [(Document LangChain, distance)] triés par distance croissante
+ScoredDocs = List[Tuple[object, float]]
+
+
+class RetrievalPlan:
+    """Résultat de la recherche: candidats retenus et décisions prises"""
+
+    def __init__(self, docs: List, distances: List[float], fetched: int,
+                 expanded: bool, rerank: bool):
+        self.docs = docs
+        self.distances = distances
+        self.fetched = fetched
+        self.expanded = expanded
+        self.rerank = rerank
+
+    def to_dict(self) -> Dict:
+        return {
+            "fetched": self.fetched,
+            "kept": len(self.docs),
+            "expanded": self.expanded,
+            "reranked": self.rerank,
+            "top_distance": round(float(self.distances[0]), 4) if self.distances else None,
+        }
+
+
+def plan_retrieval(search: Callable[[int], ScoredDocs], k: int, max_k: int, max_distance: float,
+                   close_margin: float, rerank_skip_margin: float, min_docs: int = 1) -> RetrievalPlan:
+    """
+    Args:
+        search: Fonction n -> n meilleurs (Document, distance)
+        k: Nombre de candidats de la première recherche
+        max_k: Nombre de candidats quand les k premiers sont trop proches
+        max_distance: Distance au-delà de laquelle un chunk est écarté (<= 0: pas de seuil)
+        close_margin: Écart maximal entre le 1er et le k-ième candidat qui déclenche l'élargissement
+        rerank_skip_margin: Avance du 1er candidat sur le 2e au-delà de laquelle le reranking est sauté
+        min_docs: Candidats conservés même au-delà du seuil (les plus proches)
+    """
+    results = search(k)
+    expanded = False
+    if max_k > k and len(results) >= k and results[k - 1][1] - results[0][1] <= close_margin:
+        # Les k premiers sont indiscernables: d'autres candidats peuvent être aussi bons
+        results = search(max_k)
+        expanded = True
+    fetched = len(results)
+
+    if max_distance > 0:
+        kept = [(doc, dist) for doc, dist in results if dist <= max_distance]
+        if len(kept) < min_docs:
+            kept = results[:min_docs]
+    else:
+        kept = results
+
+    distances = [dist for _, dist in kept]
+    rerank = len(kept) > 1 and distances[1] - distances[0] < rerank_skip_margin
+    return RetrievalPlan([doc for doc, _ in kept], distances, fetched, expanded, rerank)
+
+
+class RetrievalStats:
+    """Compteurs cumulés des décisions de recherche"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.queries = 0
+        self.fetched = 0
+        self.kept = 0
+        self.expanded = 0
+        self.rerank_skipped = 0
+        self.context_tokens = 0
+
+    def record(self, plan: RetrievalPlan, context_tokens: int) -> None:
+        with self._lock:
+            self.queries += 1
+            self.fetched += plan.fetched
+            self.kept += len(plan.docs)
+            self.expanded += int(plan.expanded)
+            self.rerank_skipped += int(not plan.rerank)
+            self.context_tokens += context_tokens
+
+    def stats(self) -> Dict:
+        with self._lock:
+            n = self.queries
+            return {
+                "queries": n,
+                "avg_fetched": round(self.fetched / n, 2) if n else None,
+                "avg_kept": round(self.kept / n, 2) if n else None,
+                "expanded": self.expanded,
+                "rerank_skipped": self.rerank_skipped,
+                "avg_context_tokens": round(self.context_tokens / n, 1) if n else None,
+            }
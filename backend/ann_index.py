@@ -0,0 +1,148 @@
+"""
+Index FAISS approximatifs (IVF-Flat, IVF-PQ, HNSW) et promotion depuis l'index exact
+L'index plat (IndexFlatL2) compare la question à chaque vecteur: son coût croît
+linéairement avec le corpus. Au-delà d'un seuil, l'index est reconstruit en
+index approximatif, entraîné sur les vecteurs existants:
+- ivf_flat: partitionne l'espace (nlist cellules), n'explore que nprobe cellules,
+- ivf_pq:   idem avec vecteurs compressés (product quantization), pour les très gros corpus,
+- hnsw:     graphe de voisinage (efSearch), rapide mais sans suppression possible.
+
+Les vecteurs sont ajoutés dans l'ordre des positions de l'index plat: le
+mapping position -> docstore de LangChain, BM25 et l'index des métadonnées
+restent valides sans modification.
+"""
+
+import math
+import logging
+from typing import Dict, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+ANN_INDEX_TYPES = ("flat", "ivf_flat", "ivf_pq", "hnsw")
+
+# En dessous, les centroïdes IVF seraient entraînés sur trop peu de vecteurs
+MIN_TRAIN_VECTORS = 1000
+
+
+def index_type_of(index) -> str:
+    """Type ("flat", "ivf_flat", "ivf_pq", "hnsw") d'un index FAISS"""
+    import faiss
+    index = faiss.downcast_index(index)
+    if isinstance(index, faiss.IndexHNSW):
+        return "hnsw"
+    if isinstance(index, faiss.IndexIVFPQ):
+        return "ivf_pq"
+    if isinstance(index, faiss.IndexIVF):
+        return "ivf_flat"
+    return "flat"
+
+
+def choose_index_type(ntotal: int, configured: str, ivf_min_vectors: int, pq_min_vectors: int) -> str:
+    """
+    Type d'index visé pour `ntotal` vecteurs.
+
+    Args:
+        configured: "auto" (selon les seuils) ou un type de ANN_INDEX_TYPES imposé
+    """
+    if configured != "auto":
+        return configured
+    if ntotal >= pq_min_vectors:
+        return "ivf_pq"
+    if ntotal >= ivf_min_vectors:
+        return "ivf_flat"
+    return "flat"
+
+
+def auto_nlist(ntotal: int) -> int:
+    """Nombre de cellules IVF: ~4 * sqrt(n), avec au moins 39 vecteurs d'entraînement par cellule"""
+    return max(1, min(int(4 * math.sqrt(ntotal)), ntotal // 39))
+
+
+def _pq_subquantizers(dim: int, m: int) -> int:
+    # m doit diviser la dimension: plus grand diviseur <= m demandé
+    return max(d for d in range(1, min(m, dim) + 1) if dim % d == 0)
+
+
+def build_index(vectors: np.ndarray, index_type: str, nlist: int = 0, pq_m: int = 48, pq_nbits: int = 8,
+                hnsw_m: int = 32, ef_construction: int = 200, train_size: int = 0):
+    """
+    Construit et remplit un index du type demandé avec `vectors` (ordre conservé).
+
+    Args:
+        nlist: Cellules IVF (0: auto_nlist)
+        train_size: Vecteurs tirés pour l'entraînement IVF (0: 256 par cellule)
+
+    Returns:
+        faiss.Index
+    """
+    import faiss
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    ntotal, dim = vectors.shape
+    if index_type == "flat":
+        index = faiss.IndexFlatL2(dim)
+    elif index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, hnsw_m)
+        index.hnsw.efConstruction = ef_construction
+    elif index_type in ("ivf_flat", "ivf_pq"):
+        nlist = nlist or auto_nlist(ntotal)
+        quantizer = faiss.IndexFlatL2(dim)
+        if index_type == "ivf_flat":
+            index = faiss.IndexIVFFlat(quantizer, dim, nlist, faiss.METRIC_L2)
+        else:
+            index = faiss.IndexIVFPQ(quantizer, dim, nlist, _pq_subquantizers(dim, pq_m), pq_nbits)
+        # Reconstruction (recherche filtrée, migrations) et suppressions par identifiant
+        index.set_direct_map_type(faiss.DirectMap.Hashtable)
+        train_size = min(ntotal, train_size or 256 * nlist)
+        sample = vectors
+        if train_size < ntotal:
+            sample = vectors[np.random.default_rng(0).choice(ntotal, train_size, replace=False)]
+        index.train(sample)
+    else:
+        raise ValueError(f"Type d'index inconnu '{index_type}' (types: {', '.join(ANN_INDEX_TYPES)})")
+    if ntotal:
+        index.add(vectors)
+    return index
+
+
+def all_vectors(index) -> np.ndarray:
+    """Vecteurs de l'index dans l'ordre des positions (approchés pour IVF-PQ)"""
+    import faiss
+    index = faiss.downcast_index(index)
+    if isinstance(index, faiss.IndexIVF) and index.direct_map.type == faiss.DirectMap.NoMap:
+        index.make_direct_map()
+    return index.reconstruct_n(0, index.ntotal)
+
+
+def apply_search_params(index, nprobe: int = None, ef_search: int = None) -> None:
+    """Réglages de recherche: cellules explorées (IVF) ou largeur du parcours du graphe (HNSW)"""
+    import faiss
+    index = faiss.downcast_index(index)
+    if isinstance(index, faiss.IndexIVF) and nprobe:
+        index.nprobe = min(nprobe, index.nlist)
+    elif isinstance(index, faiss.IndexHNSW) and ef_search:
+        index.hnsw.efSearch = ef_search
+
+
+def search_parameters(index, selector):
+    """SearchParameters adaptés au type d'index, restreints aux identifiants de `selector`"""
+    import faiss
+    index = faiss.downcast_index(index)
+    if isinstance(index, faiss.IndexIVF):
+        return faiss.SearchParametersIVF(sel=selector, nprobe=index.nprobe)
+    if isinstance(index, faiss.IndexHNSW):
+        return faiss.SearchParametersHNSW(sel=selector, efSearch=index.hnsw.efSearch)
+    return faiss.SearchParameters(sel=selector)
+
+
+def describe(index) -> Dict:
+    """Type et réglages de l'index (pour get_index_status)"""
+    import faiss
+    index = faiss.downcast_index(index)
+    info: Dict[str, Optional[int]] = {"type": index_type_of(index), "vectors": index.ntotal}
+    if isinstance(index, faiss.IndexIVF):
+        info.update(nlist=index.nlist, nprobe=index.nprobe)
+    elif isinstance(index, faiss.IndexHNSW):
+        info.update(ef_search=index.hnsw.efSearch)
+    return info
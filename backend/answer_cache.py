@@ -0,0 +1,128 @@
+"""
+Cache sémantique des réponses RAG
+Une question proche d'une question déjà traitée, avec les mêmes chunks récupérés
+sur la même version de l'index, réutilise la réponse sans appeler le LLM
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, FrozenSet, Optional
+
+import faiss
+import numpy as np
+
+
+class SemanticAnswerCache:
+    """
+    Index FAISS dédié (produit scalaire sur vecteurs normalisés = cosinus)
+    des questions passées, associé aux réponses générées.
+
+    Une entrée n'est servie que si:
+    - la similarité avec la question dépasse `threshold`,
+    - l'ensemble des chunks récupérés est identique,
+    - l'historique de conversation inclus dans le prompt est identique
+      (empreinte `history_key`): une réponse qui dépend de la conversation
+      d'un utilisateur n'est jamais servie à un autre,
+    - la version de l'index est la même,
+    - l'entrée a moins de `ttl` secondes.
+    """
+
+    def __init__(self, threshold: float = 0.95, ttl: float = 3600, max_size: int = 1000):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_size = max_size
+        self._index = None
+        self._entries: "OrderedDict[int, Dict]" = OrderedDict()
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def _normalize(vector) -> np.ndarray:
+        array = np.array(vector, dtype=np.float32).reshape(1, -1)
+        faiss.normalize_L2(array)
+        return array
+
+    def lookup(self, query_vector, chunk_key: FrozenSet, index_version: int,
+               history_key: str = "") -> Optional[Dict]:
+        """
+        Returns:
+            dict: Entrée {answer, summary, context, question, created_at} ou None
+        """
+        with self._lock:
+            if self._index is None or not self._entries:
+                self.misses += 1
+                return None
+            scores, ids = self._index.search(self._normalize(query_vector), min(5, len(self._entries)))
+            now = time.time()
+            for score, entry_id in zip(scores[0], ids[0]):
+                if entry_id < 0 or score < self.threshold:
+                    break
+                entry = self._entries.get(int(entry_id))
+                if entry is None:
+                    continue
+                if now - entry["created_at"] > self.ttl:
+                    self._remove(int(entry_id))
+                    continue
+                if (entry["index_version"] == index_version and entry["chunk_key"] == chunk_key
+                        and entry["history_key"] == history_key):
+                    self._entries.move_to_end(int(entry_id))
+                    self.hits += 1
+                    return entry
+            self.misses += 1
+            return None
+
+    def store(self, query_vector, chunk_key: FrozenSet, index_version: int,
+              answer: str, context: list, summary: str = None, question: str = None,
+              history_key: str = "") -> None:
+        with self._lock:
+            vector = self._normalize(query_vector)
+            if self._index is None:
+                self._index = faiss.IndexIDMap2(faiss.IndexFlatIP(vector.shape[1]))
+            entry_id = self._next_id
+            self._next_id += 1
+            self._index.add_with_ids(vector, np.array([entry_id], dtype=np.int64))
+            self._entries[entry_id] = {
+                "answer": answer,
+                "summary": summary,
+                "context": context,
+                "question": question,
+                "chunk_key": chunk_key,
+                "history_key": history_key,
+                "index_version": index_version,
+                "created_at": time.time(),
+            }
+            while len(self._entries) > self.max_size:
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, entry_id: int) -> None:
+        self._entries.pop(entry_id, None)
+        self._index.remove_ids(np.array([entry_id], dtype=np.int64))
+
+    def invalidate(self) -> None:
+        """Vide le cache (l'index documentaire a changé)"""
+        with self._lock:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            if self._index is not None:
+                self._index.reset()
+
+    def stats(self) -> Dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else None,
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "threshold": self.threshold,
+            "ttl_seconds": self.ttl,
+            "invalidations": self.invalidations,
+        }
@@ -0,0 +1,163 @@
+"""
+Format des réponses RAG: réponse détaillée + résumé "📄 Résumé"
+Le résumé est demandé dans la même génération (section délimitée) et, s'il
+manque, calculé localement à partir des phrases de la réponse
+"""
+
+import re
+from collections import Counter
+from typing import Optional, Tuple
+
+# Modes de génération du résumé
+SUMMARY_SINGLE = "single"  # réponse + résumé en un seul appel LLM
+SUMMARY_OFF = "off"        # pas de résumé
+SUMMARY_MODES = (SUMMARY_SINGLE, SUMMARY_OFF)
+
+SUMMARY_LABEL = "📄 Résumé :"
+
+# Consigne ajoutée au prompt en mode "single"
+SUMMARY_INSTRUCTION = f"""
+Rédige d'abord ta réponse complète. Termine ensuite par une ligne seule
+"### {SUMMARY_LABEL}" suivie d'une synthèse de 1 à 2 phrases simples et claires
+pour un utilisateur non-expert.
+""".strip()
+
+# Délimiteur de la section résumé, tolérant aux variantes du modèle
+# en début de ligne ("### 📄 Résumé :", "**Résumé**:", "Resume :"...)
+SUMMARY_MARKER = re.compile(
+    r"^[ \t]*(?:#{1,6}[ \t]*)?(?:\*\*)?[ \t]*(?:📄[ \t]*)?R[ée]sum[ée][ \t]*(?:\*\*)?[ \t]*:[ \t]*(?:\*\*)?[ \t]*",
+    re.IGNORECASE | re.MULTILINE,
+)
+
+_SENTENCE_SPLIT = re.compile(r"(?<=[.!?])\s+")
+_WORD = re.compile(r"\w{4,}", re.UNICODE)
+
+
+def split_answer_summary(text: str) -> Tuple[str, Optional[str]]:
+    """
+    Sépare la réponse et la section résumé d'une génération. Le dernier
+    délimiteur l'emporte (un intertitre "Résumé :" dans la réponse n'en coupe
+    pas la suite); SummaryStreamSplitter applique la même règle en flux.
+
+    Returns:
+        tuple: (réponse, résumé ou None si la section est absente ou vide)
+    """
+    matches = list(SUMMARY_MARKER.finditer(text))
+    if not matches:
+        return text.strip(), None
+    last = matches[-1]
+    answer = text[:last.start()].strip()
+    summary = " ".join(text[last.end():].split()).strip("* ")
+    if not answer:
+        # Le modèle n'a produit que la section résumé: elle sert de réponse
+        return summary, None
+    return answer, summary or None
+
+
+def extractive_summary(text: str, max_sentences: int = 2, max_chars: int = 400) -> str:
+    """
+    Résumé extractif local: les phrases les plus représentatives de la réponse
+    (fréquence de leurs mots de 4 lettres ou plus), dans leur ordre d'origine.
+    """
+    lines = [line.strip(" #*-•\t") for line in text.splitlines()]
+    sentences = [s.strip() for line in lines if line for s in _SENTENCE_SPLIT.split(line) if s.strip()]
+    if not sentences:
+        return ""
+    if len(sentences) <= max_sentences:
+        return " ".join(sentences)[:max_chars]
+
+    frequencies = Counter(word.lower() for word in _WORD.findall(text))
+
+    def score(sentence):
+        words = [word.lower() for word in _WORD.findall(sentence)]
+        return sum(frequencies[word] for word in words) / (len(words) or 1)
+
+    best = sorted(range(len(sentences)), key=lambda i: score(sentences[i]), reverse=True)[:max_sentences]
+    summary = " ".join(sentences[i] for i in sorted(best))
+    return summary if len(summary) <= max_chars else summary[:max_chars].rsplit(" ", 1)[0] + "..."
+
+
+def format_answer(answer: str, summary: Optional[str]) -> str:
+    """Réponse finale affichée à l'utilisateur"""
+    if not summary:
+        return answer
+    return f"{answer}\n\n{SUMMARY_LABEL} {summary}"
+
+
+_MARKER_WORDS = ("résumé", "resume", "résume", "resumé")
+
+
+def _may_start_marker(line: str) -> bool:
+    """Une ligne incomplète pourrait-elle encore devenir le délimiteur du résumé ?"""
+    head = line.lstrip(" \t#*📄").lower()
+    return any(head.startswith(word) or word.startswith(head) for word in _MARKER_WORDS)
+
+
+class SummaryStreamSplitter:
+    """
+    Sépare au fil de l'eau la réponse de la section résumé d'une génération en flux.
+
+    Le texte de la réponse est rendu dès réception; seule une ligne en cours
+    qui pourrait commencer par le délimiteur "Résumé :" est retenue jusqu'à
+    ce qu'elle soit tranchée. Le texte qui suit un délimiteur est retenu
+    jusqu'à la fin du flux: comme pour split_answer_summary, le dernier
+    délimiteur l'emporte, et ce qui précède est rendu par close().
+    """
+
+    def __init__(self):
+        self._answer = []
+        self._pending = ""
+        self._line_start = True
+        self._tail = None
+        self._summary = None
+
+    def feed(self, text: str) -> str:
+        """
+        Returns:
+            str: Texte de réponse pouvant être affiché immédiatement
+        """
+        if self._tail is not None:
+            self._tail.append(text)
+            return ""
+        buffer = self._pending + text
+        self._pending = ""
+        visible = []
+        while buffer:
+            newline = buffer.find("\n")
+            line = buffer if newline < 0 else buffer[:newline + 1]
+            if self._line_start:
+                match = SUMMARY_MARKER.match(line)
+                if match:
+                    # Délimiteur (peut-être pas le dernier) inclus dans le texte retenu
+                    self._tail = [buffer]
+                    break
+                if newline < 0 and _may_start_marker(line):
+                    self._pending = line
+                    break
+            visible.append(line)
+            buffer = buffer[len(line):]
+            self._line_start = newline >= 0
+        text = "".join(visible)
+        self._answer.append(text)
+        return text
+
+    def close(self) -> str:
+        """Fin du flux: retourne le texte retenu qui appartient finalement à la réponse"""
+        rest, self._pending = self._pending, ""
+        if self._tail is not None:
+            tail = "".join(self._tail)
+            last = list(SUMMARY_MARKER.finditer(tail))[-1]
+            rest += tail[:last.start()]
+            self._summary = tail[last.end():]
+        self._answer.append(rest)
+        return rest
+
+    @property
+    def answer(self) -> str:
+        return "".join(self._answer).strip()
+
+    @property
+    def summary(self) -> Optional[str]:
+        if self._summary is None:
+            return None
+        return " ".join(self._summary.split()).strip("* ") or None
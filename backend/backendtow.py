@@ -1,30 +1,126 @@
 import os
 import logging
-import time
 import tempfile
 import hashlib
 import json
 import mimetypes
-
-import google.generativeai as genai
-import whisper
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_community.vectorstores import FAISS
-from langchain_core.documents import Document
-from sentence_transformers import CrossEncoder
-from PyPDF2 import PdfReader
-from docx import Document as DocxDocument
-from PIL import Image
-from transformers import BlipProcessor, BlipForConditionalGeneration
-import tiktoken
-from reportlab.platypus import SimpleDocTemplate, Paragraph
-from reportlab.lib.styles import getSampleStyleSheet
+import atexit
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .startup_profiler import profiler
+
+# Imports lourds mesurés par groupe (STARTUP_PROFILE=1)
+with profiler.step("langchain_community / langchain_core", group="import"):
+    from langchain_community.vectorstores import FAISS
+    from langchain_core.documents import Document
+with profiler.step("PyPDF2 / python-docx / PIL", group="import"):
+    from PyPDF2 import PdfReader
+    from docx import Document as DocxDocument
+    from PIL import Image
+with profiler.step("tiktoken", group="import"):
+    import tiktoken
+with profiler.step("reportlab", group="import"):
+    from reportlab.platypus import SimpleDocTemplate, Paragraph
+    from reportlab.lib.styles import getSampleStyleSheet
 # from nltk.tokenize import sent_tokenize  # Lazy load
-from .config import AUTO_PERSIST_STRUCTURED
+from .chunking import chunk_sentences, iter_sentence_chunks, iter_sentences
+from .config import (
+    AUTO_PERSIST_STRUCTURED,
+    INDEX_FLUSH_MAX_PENDING,
+    INDEX_FLUSH_INTERVAL_SECONDS,
+    EMBED_BATCH_SIZE,
+    EMBEDDING_CACHE,
+    QUERY_EMBEDDING_CACHE_SIZE,
+    ANSWER_CACHE,
+    ANSWER_CACHE_THRESHOLD,
+    ANSWER_CACHE_TTL_SECONDS,
+    ANSWER_CACHE_MAX_SIZE,
+    ANSWER_SUMMARY_MODE,
+    MODEL_WARMUP_COMPONENTS,
+    MODEL_RETRY_SECONDS,
+    RERANK_BATCHING,
+    RERANK_BATCH_MAX_WAIT_MS,
+    RERANK_BATCH_MAX_PAIRS,
+    RERANK_PREDICT_BATCH_SIZE,
+    EMBEDDING_INFERENCE_BACKEND,
+    RERANK_INFERENCE_BACKEND,
+    RETRIEVAL_ADAPTIVE,
+    RETRIEVAL_MAX_DISTANCE,
+    RETRIEVAL_MIN_DOCS,
+    RETRIEVAL_MAX_K,
+    RETRIEVAL_CLOSE_MARGIN,
+    RERANK_SKIP_MARGIN,
+    HYBRID_RETRIEVAL,
+    BM25_TOP_K,
+    RRF_K,
+    MULTI_QUERY_MODE,
+    MULTI_QUERY_VARIANTS,
+    MULTI_QUERY_WORKERS,
+    MULTI_QUERY_LLM_TIMEOUT_SECONDS,
+    METADATA_FILTER_BRUTE_FORCE_MAX,
+    ANN_INDEX_TYPE,
+    ANN_IVF_MIN_VECTORS,
+    ANN_PQ_MIN_VECTORS,
+    ANN_NLIST,
+    ANN_PQ_M,
+    ANN_PQ_NBITS,
+    ANN_HNSW_M,
+    ANN_HNSW_EF_CONSTRUCTION,
+    ANN_NPROBE,
+    ANN_HNSW_EF_SEARCH,
+    INDEX_MMAP,
+    INDEX_AUTO_MIGRATE,
+    INDEX_COMPACTION_MIN_DELETED,
+    INDEX_COMPACTION_DELETED_RATIO,
+)
+from .adaptive_retrieval import RetrievalStats, plan_retrieval
+from .ann_index import (
+    MIN_TRAIN_VECTORS,
+    all_vectors,
+    apply_search_params,
+    build_index,
+    choose_index_type,
+    describe as describe_ann_index,
+    index_type_of,
+)
+from .answer_cache import SemanticAnswerCache
+from .bm25_index import BM25Index, reciprocal_rank_fusion
+from .chunk_store import ChunkStore, LegacyIndexError, PositionIds
+from .metadata_index import MetadataIndex, filtered_search, normalize_filters
+from .tombstones import Tombstones, search_excluding
+from .answer_format import (
+    SUMMARY_INSTRUCTION,
+    SUMMARY_MODES,
+    SUMMARY_OFF,
+    SummaryStreamSplitter,
+    extractive_summary,
+    format_answer,
+    split_answer_summary,
+)
 from .data_extractor import DataExtractor, DataProcessor
+from .document_registry import DocumentRegistry
+from .embedding_cache import CachedEmbeddings, EmbeddingStore, QueryEmbeddingCache
+from .index_migration import migrate_if_legacy
+from .index_persistence import IndexFlusher, atomic_replace_dir, recover_index_dir
+from .index_versions import VersionedIndex
+from .llm_backend import get_llm_backend, llm_usage_stats
+from .inference_backend import load_cross_encoder, load_embedding_model
+from .model_registry import ModelRegistry
+from .query_expansion import llm_reformulations, local_reformulations
+from .rerank_batcher import BatchingReranker
+from .llm_resilience import (
+    CircuitOpenError,
+    default_retry_policy,
+    get_circuit_breaker,
+    resilience_stats,
+)
 from .models import db as sqldb
 
 # === CONFIGURATION ===
+EMBEDDING_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+CROSS_ENCODER_MODEL_NAME = "cross-encoder/ms-marco-MiniLM-L-6-v2"
 INDEX_PATH = os.path.join(os.getcwd(), "index/arx_faiss")
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY", "")
 CACHE_DIR = os.path.join(os.getcwd(), "cache")
@@ -33,59 +129,106 @@ os.makedirs(os.path.dirname(INDEX_PATH), exist_ok=True)
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-# Initialisation lazy des modèles (chargement à la demande)
-genai.configure(api_key=GOOGLE_API_KEY)
-model = None
-whisper_model = None
+# Modèles et index chargés au premier usage (ou par warm_up_models après le démarrage);
+# torch, transformers et whisper ne sont importés que par les fonctions de chargement
+models = ModelRegistry(retry_seconds=MODEL_RETRY_SECONDS)
 
-# Embeddings et modèles
-embeddings = None
-cross_encoder = None
-db = None
+# Version active de l'index FAISS (vectorstore + registre des documents).
+# Rechargement et reset publient une nouvelle version sans bloquer les recherches.
+index_versions = VersionedIndex()
 
-# Tokenizer pour compter précisément les tokens
-tokenizer = tiktoken.get_encoding("gpt2")
+# Réponses RAG déjà générées pour des questions quasi identiques (vidé à chaque modification de l'index)
+answer_cache = SemanticAnswerCache(
+    threshold=ANSWER_CACHE_THRESHOLD,
+    ttl=ANSWER_CACHE_TTL_SECONDS,
+    max_size=ANSWER_CACHE_MAX_SIZE,
+) if ANSWER_CACHE else None
 
-# === BLIP IMAGE CAPTIONING ===
-blip_processor = None
-blip_model = None
+# Décisions de la recherche adaptative (candidats, reranking sauté, tokens de contexte)
+retrieval_stats = RetrievalStats()
+
+# Tokenizer pour compter précisément les tokens
+with profiler.step("tiktoken gpt2 encoding"):
+    tokenizer = tiktoken.get_encoding("gpt2")
 
 # Fonctions lazy loading
 def get_model():
-    global model
-    if model is None:
-        logging.info("Chargement du modèle Gemini...")
-        model = genai.GenerativeModel("models/gemini-2.5-pro")
-    return model
+    """Backend LLM des réponses /ask (Gemini par défaut, voir LLM_BACKEND_ASK)."""
+    return get_llm_backend("ask", api_key=GOOGLE_API_KEY)
+
+def _generate_with_retry(prompt, retries=None):
+    """
+    Appel LLM avec nouvelles tentatives (backoff exponentiel avec jitter),
+    délai total par requête et disjoncteur du backend.
+    """
+    llm = get_model()
+    policy = default_retry_policy(retries)
+    return policy.call(
+        lambda remaining: llm.generate(prompt, timeout=_call_timeout(llm, remaining)),
+        breaker=get_circuit_breaker(llm.name),
+    )
+
+def _call_timeout(llm, remaining):
+    """Timeout d'un appel: celui du backend, borné par le temps restant de la requête"""
+    if remaining is None:
+        return llm.timeout
+    return min(remaining, llm.timeout) if llm.timeout else remaining
+
+def _unavailable_message(error):
+    if isinstance(error, CircuitOpenError):
+        return "❌ Service de génération momentanément indisponible, réessayez dans quelques instants."
+    return "❌ Réponse impossible."
+
+def _load_whisper():
+    import whisper
+    return whisper.load_model("base")
+
+def _load_embeddings():
+    # torch float32, ONNX ou int8 selon EMBEDDING_INFERENCE_BACKEND
+    base = load_embedding_model(EMBEDDING_MODEL_NAME, EMBEDDING_INFERENCE_BACKEND)
+    # Les chunks déjà vus (ré-indexation, nouvelle version d'un catalogue) ne sont pas ré-embeddés;
+    # les vecteurs ONNX / int8 sont mis en cache à part des vecteurs float32
+    cache_namespace = EMBEDDING_MODEL_NAME
+    if EMBEDDING_INFERENCE_BACKEND != "torch":
+        cache_namespace += f"@{EMBEDDING_INFERENCE_BACKEND}"
+    store = EmbeddingStore(os.path.join(CACHE_DIR, "embeddings"), cache_namespace) if EMBEDDING_CACHE else None
+    # Les questions répétées ne repassent pas par MiniLM
+    query_cache = QueryEmbeddingCache(QUERY_EMBEDDING_CACHE_SIZE) if QUERY_EMBEDDING_CACHE_SIZE > 0 else None
+    return CachedEmbeddings(base, store, query_cache) if store or query_cache else base
+
+def _load_cross_encoder():
+    return load_cross_encoder(CROSS_ENCODER_MODEL_NAME, RERANK_INFERENCE_BACKEND)
+
+def _load_blip():
+    from transformers import BlipProcessor, BlipForConditionalGeneration
+    processor = BlipProcessor.from_pretrained("Salesforce/blip-image-captioning-base")
+    model = BlipForConditionalGeneration.from_pretrained("Salesforce/blip-image-captioning-base")
+    return processor, model
 
 def get_whisper_model():
-    global whisper_model
-    if whisper_model is None:
-        logging.info("Chargement du modèle Whisper...")
-        whisper_model = whisper.load_model("base")
-    return whisper_model
+    return models.get("whisper")
 
 def get_embeddings():
-    global embeddings
-    if embeddings is None:
-        logging.info("Chargement des embeddings...")
-        embeddings = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
-    return embeddings
+    return models.get("embeddings")
+
+def embed_query(query):
+    """Embedding d'une question (servi par le cache LRU pour les questions répétées)."""
+    return get_embeddings().embed_query(query)
+
+def _embedding_cache_counters():
+    emb = get_embeddings()
+    if isinstance(emb, CachedEmbeddings) and emb.store is not None:
+        return emb.hits, emb.misses
+    return None
 
 def get_cross_encoder():
-    global cross_encoder
-    if cross_encoder is None:
-        logging.info("Chargement du cross-encoder...")
-        cross_encoder = CrossEncoder("cross-encoder/ms-marco-MiniLM-L-6-v2")
-    return cross_encoder
+    return models.get("cross_encoder")
 
 def get_blip_models():
-    global blip_processor, blip_model
-    if blip_processor is None:
-        logging.info("Chargement des modèles BLIP...")
-        blip_processor = BlipProcessor.from_pretrained("Salesforce/blip-image-captioning-base")
-        blip_model = BlipForConditionalGeneration.from_pretrained("Salesforce/blip-image-captioning-base")
-    return blip_processor, blip_model
+    return models.get("blip")
+
+class ExtractionError(Exception):
+    """Échec d'extraction (BLIP, Whisper): message affichable, jamais indexé comme texte"""
 
 def describe_image_with_blip(image_path):
     try:
@@ -96,40 +239,14 @@ def describe_image_with_blip(image_path):
         caption = blip_processor.decode(out[0], skip_special_tokens=True)
         return caption
     except Exception as e:
-        return f"[Erreur lors de la description de l'image : {str(e)}]"
+        raise ExtractionError(f"Erreur lors de la description de l'image : {e}") from e
 
 # === UTILS ===
 
 def chunk_text_semantically(text, max_tokens=500, overlap_tokens=100):
     from nltk.tokenize import sent_tokenize
-    sentences = sent_tokenize(text)
-    chunks = []
-    current_chunk = []
-    current_len = 0
-
-    for sentence in sentences:
-        sent_tokens = count_tokens(sentence)
-
-        if current_len + sent_tokens > max_tokens:
-            chunks.append(" ".join(current_chunk))
-            # Overlap sémantique
-            overlap = []
-            token_sum = 0
-            for sent in reversed(current_chunk):
-                token_sum += count_tokens(sent)
-                overlap.insert(0, sent)
-                if token_sum >= overlap_tokens:
-                    break
-            current_chunk = overlap
-            current_len = sum(count_tokens(s) for s in current_chunk)
-
-        current_chunk.append(sentence)
-        current_len += sent_tokens
-
-    if current_chunk:
-        chunks.append(" ".join(current_chunk))
-
-    return chunks
+    # Chaque phrase n'est encodée qu'une fois (tiktoken), chevauchement en O(1) amorti
+    return chunk_sentences(sent_tokenize(text), max_tokens, overlap_tokens, count_tokens)
 
 def generate_export_file(data, format="txt"):
     answer = data.get("answer", "Aucune réponse")
@@ -178,6 +295,12 @@ def generate_export_file(data, format="txt"):
     else:
         raise ValueError("Format non pris en charge")
 
+def file_document_id(file):
+    """document_id sous lequel un fichier uploadé est indexé (hash de son contenu)."""
+    file_bytes = file.read()
+    file.seek(0)
+    return get_file_hash(file_bytes)
+
 def get_file_hash(file_bytes):
     return hashlib.md5(file_bytes).hexdigest()
 
@@ -204,11 +327,10 @@ def summarize_chat_history(chat_history, max_chars=1000):
         full_text += f"Utilisateur : {turn['user']}\nAssistant : {turn['assistant']}\n"
     return summarize_text(full_text, max_chars=max_chars)
 
-from sklearn.metrics.pairwise import cosine_similarity
-import numpy as np
-
 def evaluate_answer_quality(answer: str, context_docs: list, model_name="sentence-transformers/all-MiniLM-L6-v2"):
     try:
+        import numpy as np
+        from sklearn.metrics.pairwise import cosine_similarity
         from sentence_transformers import SentenceTransformer
         sbert_model = SentenceTransformer(model_name)
 
@@ -232,79 +354,667 @@ def evaluate_answer_quality(answer: str, context_docs: list, model_name="sentenc
 
 # === FAISS INDEX ===
 
+def current_index():
+    """
+    Version active de l'index (IndexHandle), chargée depuis le disque au premier
+    appel; None si le chargement a échoué. Jamais sous writer_mutex: le
+    chargement prend le verrou du composant puis writer_mutex (index_versions.active).
+    """
+    handle = index_versions.active
+    if handle is None:
+        try:
+            models.get("faiss_index")
+        except Exception:
+            return None
+        handle = index_versions.active
+    return handle
+
+def index_unavailable_message():
+    """Message affiché quand l'index n'a pas pu être chargé, avec la cause."""
+    error = models.status()["faiss_index"]["error"]
+    return f" Index non chargé : {error}" if error else " Index non chargé."
+
+def _invalidate_answer_cache():
+    """Les réponses en cache ne valent que pour l'état de l'index qui les a produites."""
+    if answer_cache is not None:
+        answer_cache.invalidate()
+
+def _index_size(vectorstore):
+    return vectorstore.index.ntotal if vectorstore is not None else 0
+
+def save_faiss_index():
+    """Sauvegarde atomique de la version active de l'index et de son registre."""
+    # Jamais de chargement ici: appelée sous writer_mutex
+    handle = index_versions.active
+    if handle is None:
+        return
+
+    def write_index_files(directory):
+        _write_vectorstore(handle.store, directory)
+        handle.registry.save(ntotal=_index_size(handle.store), directory=directory)
+        if handle.sparse is not None:
+            handle.sparse.save(ntotal=_index_size(handle.store), directory=directory)
+        if handle.metadata is not None:
+            handle.metadata.save(ntotal=_index_size(handle.store), directory=directory)
+        handle.tombstones.save(ntotal=_index_size(handle.store), directory=directory)
+
+    # Verrou partagé: les recherches continuent pendant l'écriture, pas les ajouts
+    with handle.lock.read_locked():
+        atomic_replace_dir(INDEX_PATH, write_index_files)
+
+# Écriture différée: les ajouts sont en mémoire, le disque est mis à jour par lots
+index_flusher = IndexFlusher(
+    save_faiss_index,
+    max_pending=INDEX_FLUSH_MAX_PENDING,
+    max_delay=INDEX_FLUSH_INTERVAL_SECONDS,
+)
+atexit.register(index_flusher.close)
+
+def flush_faiss_index(force=False):
+    """Écrit immédiatement les modifications en attente de l'index."""
+    return index_flusher.flush(force=force)
+
+def _load_tombstones(vectorstore):
+    """Charge les positions des chunks supprimés (aucune si l'index n'en a jamais eu)."""
+    tombstones = Tombstones(INDEX_PATH)
+    if tombstones.load(expected_chunks=_index_size(vectorstore)) and len(tombstones):
+        logging.info(f" {len(tombstones)} chunks supprimés en attente de compaction.")
+    return tombstones
+
+def _load_document_registry(vectorstore, tombstones):
+    """Charge le registre; le reconstruit depuis le docstore s'il est absent ou désynchronisé."""
+    registry = DocumentRegistry(INDEX_PATH)
+    if registry.load(expected_chunks=_index_size(vectorstore)):
+        logging.info(f" Registre chargé : {len(registry)} documents.")
+    else:
+        registry.rebuild_from_docstore(vectorstore, deleted=tombstones.positions)
+        registry.save(ntotal=_index_size(vectorstore))
+    return registry
+
+def _load_sparse_index(vectorstore):
+    """Charge l'index BM25; le reconstruit depuis le docstore s'il est absent ou désynchronisé."""
+    if not HYBRID_RETRIEVAL:
+        return None
+    sparse = BM25Index(INDEX_PATH)
+    if sparse.load(expected_chunks=_index_size(vectorstore)):
+        logging.info(f" Index BM25 chargé : {len(sparse)} chunks.")
+    else:
+        sparse.rebuild_from_docstore(vectorstore)
+        sparse.save(ntotal=_index_size(vectorstore))
+    return sparse
+
+def _empty_sparse_index():
+    return BM25Index(INDEX_PATH) if HYBRID_RETRIEVAL else None
+
+def _load_metadata_index(vectorstore):
+    """Charge l'index des métadonnées; le reconstruit depuis le docstore s'il est absent ou désynchronisé."""
+    metadata_index = MetadataIndex(INDEX_PATH)
+    if metadata_index.load(expected_chunks=_index_size(vectorstore)):
+        logging.info(f" Index des métadonnées chargé : {len(metadata_index)} chunks.")
+    else:
+        metadata_index.rebuild_from_docstore(vectorstore)
+        metadata_index.save(ntotal=_index_size(vectorstore))
+    return metadata_index
+
+def _empty_faiss_index(emb):
+    import faiss
+    # Dimension des embeddings donnée par une requête d'essai
+    dimension = len(emb.embed_query("placeholder"))
+    return FAISS(emb, faiss.IndexFlatL2(dimension), ChunkStore(), PositionIds())
+
+FAISS_INDEX_FILENAME = "index.faiss"
+# Docstore picklé du format précédent (FAISS.save_local)
+LEGACY_INDEX_FILENAME = "index.pkl"
+
+def _write_vectorstore(store, directory):
+    """Vecteurs (index.faiss) et chunks (ChunkStore, par position FAISS); sans pickle."""
+    import faiss
+    faiss.write_index(store.index, os.path.join(directory, FAISS_INDEX_FILENAME))
+    store.docstore.save(directory)
+
+def _read_faiss_index(path):
+    """
+    Returns:
+        tuple: (index FAISS, True si projeté en mmap lecture seule)
+    """
+    import faiss
+    if INDEX_MMAP:
+        # IO_FLAG_MMAP_IFC (FAISS >= 1.9) étend le mmap aux index plats
+        flags = faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY | getattr(faiss, "IO_FLAG_MMAP_IFC", 0)
+        try:
+            return faiss.read_index(path, flags), True
+        except RuntimeError as e:
+            logging.warning(f" Chargement mmap impossible ({e}), lecture en mémoire")
+    return faiss.read_index(path), False
+
+def _load_vectorstore(emb):
+    """
+    Ouvre l'index sur disque: vecteurs en mmap et chunks lus à la demande.
+    Aucun pickle n'est désérialisé: un index à l'ancien format se convertit
+    avec scripts/migrate_index.py.
+
+    Returns:
+        tuple: (vectorstore, mmappé)
+
+    Raises:
+        LegacyIndexError: Index à l'ancien format (non chargé, jamais écrasé)
+        FileNotFoundError: Pas d'index sur disque
+    """
+    if not ChunkStore.exists(INDEX_PATH):
+        if os.path.exists(os.path.join(INDEX_PATH, LEGACY_INDEX_FILENAME)):
+            raise LegacyIndexError(f"Index à l'ancien format ({LEGACY_INDEX_FILENAME}) : convertir avec "
+                                   "`python scripts/migrate_index.py`")
+        if os.path.exists(os.path.join(INDEX_PATH, FAISS_INDEX_FILENAME)):
+            raise RuntimeError(f"Index incomplet dans {INDEX_PATH} : {FAISS_INDEX_FILENAME} sans fichiers de chunks")
+        raise FileNotFoundError(f"Pas d'index dans {INDEX_PATH}")
+    index, mmapped = _read_faiss_index(os.path.join(INDEX_PATH, FAISS_INDEX_FILENAME))
+    chunks = ChunkStore.open(INDEX_PATH)
+    if len(chunks) != index.ntotal:
+        raise RuntimeError(f"Index incohérent : {index.ntotal} vecteurs pour {len(chunks)} chunks")
+    return FAISS(emb, index, chunks, PositionIds(len(chunks))), mmapped
+
+def _ensure_writable_index(handle):
+    """Copie en mémoire un index projeté en lecture seule avant de le modifier (sous verrou exclusif)."""
+    if handle.mmapped:
+        import faiss
+        handle.store.index = faiss.clone_index(handle.store.index)
+        handle.mmapped = False
+        logging.info(" Index FAISS mmap copié en mémoire pour modification")
+
 def load_faiss_index():
-    global db
-    try:
-        emb = get_embeddings()
-        db = FAISS.load_local(INDEX_PATH, emb, allow_dangerous_deserialization=True)
-        logging.info(" Index FAISS chargé.")
-    except Exception as e:
-        logging.warning(f" Index non trouvé ou invalide, création d'un index vide : {e}")
-        # Créer un document placeholder pour initialiser l'index
+    """
+    Construit une nouvelle version de l'index depuis le disque puis l'active.
+    Les requêtes en cours terminent sur l'ancienne version; les ajouts
+    attendent la fin du chargement pour ne pas être perdus.
+
+    Un index vide n'est créé que si le dossier ne contient aucun index: une
+    erreur de chargement est relevée sans toucher aux fichiers (la version
+    active, s'il y en a une, reste en service). Seul reset_faiss_index vide
+    un index existant.
+
+    Raises:
+        LegacyIndexError: Index à l'ancien format
+        Exception: Index présent mais illisible ou incohérent
+    """
+    with index_versions.writer_mutex:
+        # Le disque doit contenir les ajouts en attente avant d'être relu
+        if index_versions.active is not None:
+            index_flusher.flush()
+        recover_index_dir(INDEX_PATH)
         emb = get_embeddings()
-        placeholder = Document(page_content="placeholder", metadata={"source": "init"})
-        db = FAISS.from_documents([placeholder], emb)
-        # Supprimer le document placeholder
-        db.delete([db.index_to_docstore_id[0]])
-        db.save_local(INDEX_PATH)
-        logging.info(" Index FAISS vide créé.")
-
-def reload_faiss_index():
+        if INDEX_AUTO_MIGRATE:
+            # Index au format index.pkl converti une seule fois (opt-in: désérialise
+            # le pickle); un échec laisse l'ancien index intact et empêche le chargement
+            try:
+                with profiler.step("index: conversion de l'ancien format"):
+                    migrate_if_legacy(INDEX_PATH)
+            except Exception as e:
+                logging.error(f" Conversion de l'index à l'ancien format impossible : {e}")
+                raise
+        try:
+            with profiler.step("index: FAISS (mmap) + chunks"):
+                store, mmapped = _load_vectorstore(emb)
+            logging.info(f" Index FAISS chargé{' (mmap)' if mmapped else ''}.")
+        except FileNotFoundError as e:
+            # Premier démarrage: index vide en mémoire, écrit au premier ajout
+            logging.warning(f" {e}, création d'un index vide")
+            index_versions.swap(_empty_faiss_index(emb), DocumentRegistry(INDEX_PATH), source="empty",
+                                sparse=_empty_sparse_index(), metadata=MetadataIndex(INDEX_PATH),
+                                tombstones=Tombstones(INDEX_PATH))
+            _invalidate_answer_cache()
+            logging.info(" Index FAISS vide créé.")
+            return index_versions.active
+        except Exception as e:
+            # Ne jamais remplacer un index existant (ancien format, incohérent,
+            # erreur passagère) par un index vide: fichiers laissés en l'état
+            logging.error(f" Chargement de l'index FAISS impossible : {e}")
+            raise
+        tombstones = _load_tombstones(store)
+        with profiler.step("index: registre des documents"):
+            registry = _load_document_registry(store, tombstones)
+        with profiler.step("index: BM25"):
+            sparse = _load_sparse_index(store)
+        with profiler.step("index: métadonnées"):
+            metadata_index = _load_metadata_index(store)
+        apply_search_params(store.index, ANN_NPROBE, ANN_HNSW_EF_SEARCH)
+        handle = index_versions.swap(store, registry, source="disk", sparse=sparse, metadata=metadata_index,
+                                     tombstones=tombstones)
+        handle.mmapped = mmapped
+        _invalidate_answer_cache()
+        # Index sauvegardé sous un seuil depuis dépassé, ou type changé dans la configuration
+        maybe_promote_faiss_index()
+        maybe_compact_faiss_index()
+        return handle
+
+def reload_faiss_index(background=False):
+    """
+    Recharge l'index depuis le disque.
+
+    Args:
+        background: Construit la nouvelle version dans un thread de fond
+
+    Returns:
+        bool: False si un rechargement en arrière-plan est déjà en cours
+    """
     logging.info(" Rechargement de l’index FAISS...")
-    load_faiss_index()
+    build = load_faiss_index
+    if not models.is_ready("faiss_index"):
+        # Premier chargement échoué: nouvelle tentative immédiate via le registre,
+        # qui enregistre le résultat (prêt, ou nouvel échec et nouveau délai)
+        models.retry("faiss_index")
+        build = lambda: models.get("faiss_index")
+    if background:
+        return index_versions.reload_async(build)
+    build()
+    return True
 
 def reset_faiss_index():
-    global db
     logging.info(" Réinitialisation de l'index FAISS...")
-    emb = get_embeddings()
-    placeholder = Document(page_content="placeholder", metadata={"source": "init"})
-    db = FAISS.from_documents([placeholder], emb)
-    db.delete([db.index_to_docstore_id[0]])
-    db.save_local(INDEX_PATH)
+    store = _empty_faiss_index(get_embeddings())
+    with index_versions.writer_mutex:
+        handle = index_versions.swap(store, DocumentRegistry(INDEX_PATH), source="reset",
+                                     sparse=_empty_sparse_index(), metadata=MetadataIndex(INDEX_PATH),
+                                     tombstones=Tombstones(INDEX_PATH))
+        _invalidate_answer_cache()
+        index_flusher.flush(force=True)
+    # Reset avant le premier chargement: l'index vide tient lieu de chargement initial.
+    # Hors writer_mutex: le chargement prend le verrou du composant puis writer_mutex
+    models.set("faiss_index", handle)
     logging.info(" Index FAISS réinitialisé.")
 
-def get_existing_document_ids():
+# === INDEX APPROXIMATIF ===
+
+_promotion_lock = threading.Lock()
+
+def _target_index_type(store):
+    return choose_index_type(_index_size(store), ANN_INDEX_TYPE, ANN_IVF_MIN_VECTORS, ANN_PQ_MIN_VECTORS)
+
+def promote_faiss_index(index_type=None):
+    """
+    Reconstruit l'index actif dans le type visé (IVF-Flat, IVF-PQ, HNSW ou plat),
+    entraîné sur ses vecteurs. Les ajouts attendent la fin de la construction
+    (writer_mutex); les recherches continuent sur l'ancien index jusqu'à
+    l'échange, fait sous verrou exclusif.
+
+    Args:
+        index_type: Type imposé; par défaut selon ANN_INDEX_TYPE et la taille de l'index
+
+    Returns:
+        str: Type de l'index après l'opération, None si une promotion est déjà en cours
+    """
+    if not _promotion_lock.acquire(blocking=False):
+        return None
     try:
-        return set(doc.metadata.get("document_id") for doc in db.similarity_search("", k=1000) if doc.metadata.get("document_id"))
-    except Exception as e:
-        logging.warning(f"Erreur récupération des document_id : {e}")
-        return set()
+        with index_versions.writer_mutex:
+            handle = index_versions.active
+            if handle is None:
+                return None
+            current = index_type_of(handle.store.index)
+            target = index_type or _target_index_type(handle.store)
+            ntotal = _index_size(handle.store)
+            if target == current:
+                return current
+            if target.startswith("ivf") and ntotal < MIN_TRAIN_VECTORS:
+                logging.info(f" Promotion en {target} reportée : {ntotal} vecteurs, "
+                             f"{MIN_TRAIN_VECTORS} requis pour l'entraînement")
+                return current
+
+            logging.info(f" Promotion de l'index FAISS : {current} -> {target} ({ntotal} vecteurs)...")
+            start = time.perf_counter()
+            with handle.lock.read_locked():
+                vectors = all_vectors(handle.store.index)
+            new_index = build_index(
+                vectors, target, nlist=ANN_NLIST, pq_m=ANN_PQ_M, pq_nbits=ANN_PQ_NBITS,
+                hnsw_m=ANN_HNSW_M, ef_construction=ANN_HNSW_EF_CONSTRUCTION,
+            )
+            apply_search_params(new_index, ANN_NPROBE, ANN_HNSW_EF_SEARCH)
+            with handle.lock.write_locked():
+                handle.store.index = new_index
+                handle.mmapped = False
+            _invalidate_answer_cache()
+            logging.info(f" Index FAISS {target} actif ({time.perf_counter() - start:.1f}s)")
+        index_flusher.flush(force=True)
+        return target
+    finally:
+        _promotion_lock.release()
+
+def maybe_promote_faiss_index():
+    """Lance la promotion en arrière-plan si la taille de l'index a franchi un seuil."""
+    handle = index_versions.active
+    if handle is None or _promotion_lock.locked():
+        return False
+    target = _target_index_type(handle.store)
+    if target == index_type_of(handle.store.index):
+        return False
+    threading.Thread(target=promote_faiss_index, name="faiss-index-promotion", daemon=True).start()
+    return True
 
-def add_document_to_index(text, metadata=None):
-    global db
+# === COMPACTION ===
+
+_compaction_lock = threading.Lock()
+
+def _compaction_due(handle):
+    deleted = len(handle.tombstones)
+    return (deleted >= INDEX_COMPACTION_MIN_DELETED
+            and deleted >= INDEX_COMPACTION_DELETED_RATIO * _index_size(handle.store))
+
+def compact_faiss_index():
+    """
+    Reconstruit l'index sans les chunks supprimés: vecteurs (même type d'index,
+    réentraîné), ChunkStore, BM25 et métadonnées aux positions renumérotées,
+    registre renommé. Publié comme nouvelle version: les recherches en cours
+    terminent sur l'ancienne, les ajouts attendent la fin (writer_mutex).
+
+    Returns:
+        int: Nombre de chunks retirés, None si une compaction est déjà en cours
+    """
+    if not _compaction_lock.acquire(blocking=False):
+        return None
     try:
-        if not text.strip():
-            logging.warning("Texte vide, rien à indexer.")
+        with index_versions.writer_mutex:
+            handle = index_versions.active
+            if handle is None or not len(handle.tombstones):
+                return 0
+            ntotal = _index_size(handle.store)
+            removed = len(handle.tombstones)
+            logging.info(f" Compaction de l'index FAISS : {removed} chunks supprimés sur {ntotal}...")
+            start = time.perf_counter()
+            with handle.lock.read_locked():
+                live = handle.tombstones.live_positions(ntotal)
+                vectors = all_vectors(handle.store.index)[live]
+                docs = [handle.store.docstore.search(str(position)) for position in live]
+                index_type = index_type_of(handle.store.index)
+            if index_type.startswith("ivf") and len(live) < MIN_TRAIN_VECTORS:
+                index_type = "flat"
+            new_index = build_index(
+                vectors, index_type, nlist=ANN_NLIST, pq_m=ANN_PQ_M, pq_nbits=ANN_PQ_NBITS,
+                hnsw_m=ANN_HNSW_M, ef_construction=ANN_HNSW_EF_CONSTRUCTION,
+            )
+            apply_search_params(new_index, ANN_NPROBE, ANN_HNSW_EF_SEARCH)
+
+            chunks = ChunkStore()
+            chunks.add({str(position): doc for position, doc in enumerate(docs)})
+            store = FAISS(get_embeddings(), new_index, chunks, PositionIds(len(docs)))
+            registry = handle.registry.renumbered(
+                {str(old): str(new) for new, old in enumerate(live.tolist())}
+            )
+            sparse = _empty_sparse_index()
+            if sparse is not None:
+                sparse.add_many((str(position), doc.page_content) for position, doc in enumerate(docs))
+            metadata_index = MetadataIndex(INDEX_PATH)
+            metadata_index.add_many(0, [doc.metadata for doc in docs])
+
+            index_versions.swap(store, registry, source="compaction", sparse=sparse, metadata=metadata_index,
+                                tombstones=Tombstones(INDEX_PATH))
+            _invalidate_answer_cache()
+            logging.info(f" Index FAISS compacté : {len(docs)} chunks ({time.perf_counter() - start:.1f}s)")
+        index_flusher.flush(force=True)
+        # Seuils de type d'index franchis à la baisse
+        maybe_promote_faiss_index()
+        return removed
+    finally:
+        _compaction_lock.release()
+
+def maybe_compact_faiss_index():
+    """Lance la compaction en arrière-plan si les chunks supprimés ont atteint les seuils."""
+    handle = index_versions.active
+    if handle is None or _compaction_lock.locked() or not _compaction_due(handle):
+        return False
+    threading.Thread(target=compact_faiss_index, name="faiss-index-compaction", daemon=True).start()
+    return True
+
+def get_index_status():
+    """Version active, date de chargement et état de la persistance de l'index."""
+    status = index_versions.status()
+    emb = models.peek("embeddings")
+    if isinstance(emb, CachedEmbeddings):
+        if emb.store is not None:
+            status["embedding_cache"] = emb.stats()
+        if emb.query_cache is not None:
+            status["query_embedding_cache"] = emb.query_cache.stats()
+    if answer_cache is not None:
+        status["answer_cache"] = answer_cache.stats()
+    if reranker is not None:
+        status["rerank_batching"] = reranker.stats()
+    if RETRIEVAL_ADAPTIVE:
+        status["retrieval"] = retrieval_stats.stats()
+    handle = index_versions.active
+    if handle is not None and handle.sparse is not None:
+        status["bm25"] = handle.sparse.stats()
+    if handle is not None and handle.metadata is not None:
+        status["metadata_filters"] = handle.metadata.stats()
+    if handle is not None:
+        status["ann_index"] = describe_ann_index(handle.store.index)
+        status["ann_index"]["target"] = _target_index_type(handle.store)
+        status["ann_index"]["promotion_in_progress"] = _promotion_lock.locked()
+        status["ann_index"]["mmapped"] = handle.mmapped
+        if isinstance(handle.store.docstore, ChunkStore):
+            status["chunk_store"] = handle.store.docstore.stats()
+        status["tombstones"] = handle.tombstones.stats()
+        status["tombstones"]["compaction_due"] = _compaction_due(handle)
+        status["tombstones"]["compaction_in_progress"] = _compaction_lock.locked()
+    status["llm_usage"] = llm_usage_stats()
+    status["llm_resilience"] = resilience_stats()
+    status["persistence"] = {
+        "pending_chunks": index_flusher.pending,
+        "flush_count": index_flusher.flush_count,
+        "last_flush_at": index_flusher.last_flush_at,
+    }
+    return status
+
+def get_existing_document_ids():
+    handle = current_index()
+    return handle.registry.document_ids() if handle else set()
+
+def _add_chunk_batch(docs, document_id, first_batch):
+    """Embedde un micro-lot de chunks hors verrou puis l'ajoute à la version active de l'index."""
+    texts = [doc.page_content for doc in docs]
+    vectors = get_embeddings().embed_documents(texts)
+    # Chargement initial éventuel hors writer_mutex (load_faiss_index le prend lui-même)
+    current_index()
+
+    with index_versions.writer_mutex:
+        handle = index_versions.active
+        if handle is None:
+            raise RuntimeError("Index FAISS non chargé")
+        # Re-vérification: un upload concurrent du même fichier a pu passer entre-temps
+        if first_batch and document_id in handle.registry:
+            logging.info(f" Document déjà indexé : {document_id}")
             return False
+        with handle.lock.write_locked():
+            _ensure_writable_index(handle)
+            first_position = _index_size(handle.store)
+            # Identifiant d'un chunk = sa position FAISS (ChunkStore)
+            chunk_ids = handle.store.add_embeddings(
+                list(zip(texts, vectors)),
+                metadatas=[doc.metadata for doc in docs],
+                ids=[str(first_position + offset) for offset in range(len(docs))],
+            )
+            if handle.sparse is not None:
+                handle.sparse.add_many(zip(chunk_ids, texts))
+            if handle.metadata is not None:
+                handle.metadata.add_many(first_position, [doc.metadata for doc in docs])
+            handle.registry.register(
+                document_id,
+                chunk_ids,
+                title=docs[0].metadata.get("title"),
+                source=docs[0].metadata.get("source"),
+            )
+        _invalidate_answer_cache()
+    # Sauvegarde différée (seuil de chunks / délai / arrêt / flush explicite)
+    index_flusher.mark_dirty(len(docs))
+    return True
+
+def add_document_stream(segments, metadata=None, batch_size=EMBED_BATCH_SIZE):
+    """
+    Indexe un document au fil de l'eau: segments (pages) -> phrases -> chunks -> micro-lots.
+    Chaque micro-lot est interrogeable dès son ajout, avant la fin de l'extraction,
+    et la mémoire utilisée ne dépend pas de la taille du document.
 
-        document_id = metadata.get("document_id") if metadata else None
-        existing_ids = get_existing_document_ids()
+    Args:
+        segments: Itérable de textes (pages PDF, paragraphes...)
+        metadata: Métadonnées du document; `document_id` requis pour la déduplication
+        batch_size: Nombre de chunks embeddés par micro-lot
 
-        if document_id and document_id in existing_ids:
+    Returns:
+        bool: True si au moins un chunk a été ajouté
+    """
+    from nltk.tokenize import sent_tokenize
+    added = 0
+    try:
+        metadata = dict(metadata) if metadata else {}
+        document_id = metadata.get("document_id")
+        if not document_id:
+            raise ValueError("document_id requis pour l'indexation en flux")
+
+        if document_id in get_existing_document_ids():
             logging.info(f" Document déjà indexé : {document_id}")
-            return False  
+            return False
+
+        content_hash = hashlib.md5()
+        cache_before = _embedding_cache_counters()
+
+        def hashed_segments():
+            for i, segment in enumerate(segments):
+                if i:
+                    content_hash.update(b"\n")
+                content_hash.update(segment.encode("utf-8"))
+                yield segment
 
-        chunks = chunk_text_semantically(text, max_tokens=500, overlap_tokens=100)
+        sentences = iter_sentences(hashed_segments(), sent_tokenize)
+        chunks = iter_sentence_chunks(sentences, 500, 100, count_tokens)
 
-        docs = []
+        batch = []
         for i, chunk in enumerate(chunks):
-            chunk_metadata = metadata.copy() if metadata else {}
+            chunk_metadata = metadata.copy()
             chunk_metadata.update({
                 "chunk_index": i,
                 "chunk_length": len(chunk),
-                "title": metadata.get("title", "Sans titre") if metadata else "Sans titre"
+                "title": metadata.get("title", "Sans titre")
             })
+            batch.append(Document(page_content=chunk, metadata=chunk_metadata))
+            if len(batch) >= batch_size:
+                if not _add_chunk_batch(batch, document_id, first_batch=not added):
+                    return False
+                added += len(batch)
+                batch = []
+        if batch:
+            if not _add_chunk_batch(batch, document_id, first_batch=not added):
+                return False
+            added += len(batch)
+
+        if not added:
+            logging.warning("Texte vide, rien à indexer.")
+            return False
 
-            docs.append(Document(page_content=chunk, metadata=chunk_metadata))
-
-        db.add_documents(docs)
-        db.save_local(INDEX_PATH)
-        logging.info(f" {len(docs)} chunks ajoutés avec métadonnées enrichies.")
+        current_index().registry.update(document_id, content_hash=content_hash.hexdigest())
+        logging.info(f" {added} chunks ajoutés avec métadonnées enrichies.")
+        maybe_promote_faiss_index()
+        if cache_before is not None:
+            hits, misses = (now - before for now, before in zip(_embedding_cache_counters(), cache_before))
+            if hits + misses:
+                logging.info(f" Cache embeddings : {hits}/{hits + misses} chunks réutilisés "
+                             f"({hits / (hits + misses):.0%})")
         return True
     except Exception as e:
         logging.error(f"Erreur ajout document à l'index : {e}")
+        if added:
+            # Pas de document partiellement indexé: il bloquerait les réimports (doublon)
+            delete_document(document_id)
         return False
 
+def add_document_to_index(text, metadata=None):
+    if not text.strip():
+        logging.warning("Texte vide, rien à indexer.")
+        return False
+
+    metadata = dict(metadata) if metadata else {}
+    # Sans document_id explicite, le hash du contenu sert d'identifiant de déduplication
+    metadata.setdefault("document_id", hashlib.md5(text.encode("utf-8")).hexdigest())
+    return add_document_stream([text], metadata)
+
+def _mark_deleted(handle, chunk_ids):
+    """Exclut des recherches les chunks (identifiant = position FAISS), sous verrou exclusif."""
+    with handle.lock.write_locked():
+        handle.tombstones.add(int(chunk_id) for chunk_id in chunk_ids)
+
+def delete_document(document_id):
+    """
+    Supprime un document de l'index: les positions FAISS de ses chunks (registre)
+    sont marquées supprimées et aussitôt exclues des recherches vectorielles,
+    BM25 et filtrées. L'espace est récupéré par la compaction.
+
+    Returns:
+        int: Nombre de chunks supprimés (0 si le document est inconnu)
+    """
+    current_index()
+    with index_versions.writer_mutex:
+        handle = index_versions.active
+        entry = handle.registry.remove(document_id) if handle is not None else None
+        if entry is None:
+            return 0
+        _mark_deleted(handle, entry["chunk_ids"])
+        _invalidate_answer_cache()
+    index_flusher.mark_dirty(len(entry["chunk_ids"]))
+    logging.info(f" Document supprimé : {document_id} ({len(entry['chunk_ids'])} chunks)")
+    maybe_compact_faiss_index()
+    return len(entry["chunk_ids"])
+
+def replace_document(document_id, text, metadata=None):
+    """
+    Remplace le contenu d'un document indexé (fiche produit mise à jour): seuls
+    ses chunks sont réindexés. Les nouveaux chunks sont ajoutés avant que les
+    anciens soient marqués supprimés, le document reste interrogeable pendant
+    le remplacement; les autres ajouts attendent la fin (writer_mutex).
+
+    Args:
+        metadata: Métadonnées des nouveaux chunks; titre et source du document remplacé par défaut
+
+    Returns:
+        dict: Chunks supprimés / ajoutés; None si le document est inconnu
+
+    Raises:
+        ValueError: Texte vide
+        RuntimeError: Échec de l'indexation (l'ancien contenu est conservé)
+    """
+    if not text.strip():
+        raise ValueError("Texte vide")
+    current_index()
+    with index_versions.writer_mutex:
+        handle = index_versions.active
+        previous = handle.registry.get(document_id) if handle is not None else None
+        if previous is None:
+            return None
+        result = {"document_id": document_id, "unchanged": False, "deleted_chunks": 0, "added_chunks": 0}
+        # Même hash que add_document_stream pour un contenu d'un seul tenant
+        if previous.get("content_hash") == hashlib.md5(text.encode("utf-8")).hexdigest():
+            result["unchanged"] = True
+            return result
+
+        metadata = dict(metadata) if metadata else {}
+        metadata["document_id"] = document_id
+        for key in ("title", "source"):
+            if previous.get(key) is not None:
+                metadata.setdefault(key, previous[key])
+
+        # Retiré du registre pour que le nouveau contenu ne soit pas pris pour un doublon
+        handle.registry.remove(document_id)
+        if not add_document_stream([text], metadata):
+            # Micro-lots déjà ajoutés marqués supprimés, ancienne entrée rétablie
+            partial = handle.registry.remove(document_id)
+            if partial is not None:
+                _mark_deleted(handle, partial["chunk_ids"])
+            handle.registry.restore(document_id, previous)
+            raise RuntimeError(f"Échec de l'indexation du nouveau contenu de {document_id}")
+        _mark_deleted(handle, previous["chunk_ids"])
+        _invalidate_answer_cache()
+        result["deleted_chunks"] = len(previous["chunk_ids"])
+        result["added_chunks"] = len(handle.registry.get(document_id)["chunk_ids"])
+    index_flusher.mark_dirty(result["deleted_chunks"])
+    logging.info(f" Document remplacé : {document_id} ({result['deleted_chunks']} -> {result['added_chunks']} chunks)")
+    maybe_compact_faiss_index()
+    return result
+
 # === STRUCTURED DATA AUTO-PERSISTENCE ===
 
 def _auto_persist_structured(text: str, source_name: str, source_type: str = "FILE"):
@@ -318,11 +1028,11 @@ def _auto_persist_structured(text: str, source_name: str, source_type: str = "FI
         if not text or len(text.strip()) < 50:
             # Evite les très petits contenus
             return
-        if not GOOGLE_API_KEY:
+        extractor = DataExtractor(GOOGLE_API_KEY)
+        if not extractor.llm.available:
             logging.info("AUTO_PERSIST_STRUCTURED actif mais GOOGLE_API_KEY manquant; skip")
             return
 
-        extractor = DataExtractor(GOOGLE_API_KEY)
         structured = extractor.parse_ingredients_and_products(text)
         has_payload = any([
             structured.get("products"),
@@ -338,42 +1048,127 @@ def _auto_persist_structured(text: str, source_name: str, source_type: str = "FI
 
 # === EXTRACTION ===
 
+def _text_cache_path(file_hash):
+    return os.path.join(CACHE_DIR, f"{file_hash}_text.json")
+
+def _write_text_cache(file_hash, text):
+    with open(_text_cache_path(file_hash), "w", encoding="utf-8") as f:
+        json.dump({"text": text}, f, ensure_ascii=False, indent=2)
+
+def iter_text_segments(file, file_hash):
+    """
+    Produit le texte d'un fichier segment par segment (page PDF, paragraphe DOCX),
+    sans construire la chaîne complète. Le cache d'extraction est relu tel quel.
+    """
+    cache_path = _text_cache_path(file_hash)
+    if os.path.exists(cache_path):
+        logging.info("Chargement texte extrait en cache")
+        with open(cache_path, "r", encoding="utf-8") as f:
+            yield json.load(f)["text"]
+        return
+
+    ext = os.path.splitext(file.filename)[1].lower()
+    mime_type, _ = mimetypes.guess_type(file.filename)
+
+    if ext == ".pdf":
+        for page in PdfReader(file).pages:
+            yield page.extract_text() or ""
+    elif ext == ".docx":
+        for paragraph in DocxDocument(file).paragraphs:
+            yield paragraph.text
+    elif ext in [".png", ".jpg", ".jpeg"]:
+        file.seek(0)
+        yield describe_image_with_blip(file)
+    elif "audio" in (mime_type or "") or ext in [".mp3", ".wav", ".m4a"]:
+        yield transcribe_audio(file)
+    else:
+        file.seek(0)
+        yield file.read().decode("utf-8", errors="ignore")
+
 def extract_text(file):
     try:
         file_bytes = file.read()
         file.seek(0)
         file_hash = get_file_hash(file_bytes)
-        cache_path = os.path.join(CACHE_DIR, f"{file_hash}_text.json")
-        if os.path.exists(cache_path):
-            logging.info("Chargement texte extrait en cache")
-            return json.load(open(cache_path, "r", encoding="utf-8"))["text"]
-
-        ext = os.path.splitext(file.filename)[1].lower()
-        mime_type, _ = mimetypes.guess_type(file.filename)
-        text = ""
-
-        if ext == ".pdf":
-            text = "\n".join([p.extract_text() or "" for p in PdfReader(file).pages])
-        elif ext == ".docx":
-            text = "\n".join([p.text for p in DocxDocument(file).paragraphs])
-        elif ext in [".png", ".jpg", ".jpeg"]:
-            file.seek(0)
-            text = describe_image_with_blip(file)
-        elif "audio" in (mime_type or "") or ext in [".mp3", ".wav", ".m4a"]:
-            text = transcribe_audio(file)
-        else:
-            file.seek(0)
-            text = file.read().decode("utf-8", errors="ignore")
+        cached = os.path.exists(_text_cache_path(file_hash))
 
-        with open(cache_path, "w", encoding="utf-8") as f:
-            json.dump({"text": text}, f, ensure_ascii=False, indent=2)
+        text = "\n".join(iter_text_segments(file, file_hash))
+        if not cached:
+            _write_text_cache(file_hash, text)
 
         file.seek(0)
         return text
+    except ExtractionError as e:
+        logging.error(str(e))
+        return str(e)
     except Exception as e:
         logging.error(f"Erreur extraction : {e}")
         return f"Erreur extraction : {e}"
 
+def extract_and_index_file(file):
+    """
+    Extrait un fichier et l'indexe en flux: les pages sont découpées et
+    embeddées au fur et à mesure de leur lecture.
+
+    Returns:
+        tuple: (texte complet pour le prompt et le cache, None) ou (None, message d'erreur)
+    """
+    if current_index() is None:
+        # Sinon l'indexation échouerait sans que l'utilisateur le voie
+        error = f"Erreur indexation : {index_unavailable_message().strip()}"
+        logging.error(error)
+        return None, error
+
+    file_hash = file_document_id(file)
+    cached = os.path.exists(_text_cache_path(file_hash))
+    metadata = {
+        "document_id": file_hash,
+        "source": file.filename,
+        "title": get_title_from_filename(file.filename)
+    }
+
+    parts = []
+    errors = []
+
+    def segments():
+        try:
+            for segment in iter_text_segments(file, file_hash):
+                parts.append(segment)
+                yield segment
+        except ExtractionError as e:
+            # BLIP / Whisper: le message d'erreur n'est pas indexé comme contenu
+            errors.append(str(e))
+        except Exception as e:
+            errors.append(f"Erreur extraction : {e}")
+
+    stream = segments()
+    indexed = add_document_stream(stream, metadata=metadata)
+    # Document déjà indexé: l'extraction est terminée pour construire le prompt
+    for _ in stream:
+        pass
+    file.seek(0)
+
+    if errors:
+        logging.error(errors[0])
+        if indexed:
+            # Texte partiel indexé et enregistré sous le hash du fichier: retiré,
+            # sinon le fichier complet serait ensuite ignoré comme doublon
+            delete_document(file_hash)
+        return None, errors[0]
+
+    text = "\n".join(parts)
+    if not text.strip():
+        return None, "Aucun contenu exploitable trouvé dans le fichier."
+    if not indexed and file_hash not in get_existing_document_ids():
+        # Embeddings ou ajout FAISS en échec (et non doublon): pas de cache ni de
+        # réponse filtrée sur un document absent de l'index
+        error = "Erreur indexation : le document n'a pas pu être ajouté à l'index."
+        logging.error(f"{error} ({file.filename})")
+        return None, error
+    if not cached:
+        _write_text_cache(file_hash, text)
+    return text, None
+
 def transcribe_audio(audio_input):
     try:
         file_bytes = audio_input.read()
@@ -394,59 +1189,204 @@ def transcribe_audio(audio_input):
         return result["text"]
     except Exception as e:
         logging.error(f"Erreur transcription : {e}")
-        return f"Erreur transcription : {e}"
+        raise ExtractionError(f"Erreur transcription : {e}") from e
 
 # === RERANKING ===
 
+def _predict_rerank_scores(pairs, batch_size=RERANK_PREDICT_BATCH_SIZE):
+    return get_cross_encoder().predict(pairs, batch_size=batch_size, show_progress_bar=False)
+
+# Un seul predict pour les paires de toutes les requêtes concurrentes
+reranker = BatchingReranker(
+    _predict_rerank_scores,
+    max_wait_ms=RERANK_BATCH_MAX_WAIT_MS,
+    max_pairs=RERANK_BATCH_MAX_PAIRS,
+    batch_size=RERANK_PREDICT_BATCH_SIZE,
+) if RERANK_BATCHING else None
+
 def rerank_documents(query, docs, top_k=4):
     if not docs:
         return []
     pairs = [(query, doc.page_content) for doc in docs]
-    encoder = get_cross_encoder()
-    scores = encoder.predict(pairs)
+    scores = reranker.score(pairs) if reranker is not None else _predict_rerank_scores(pairs)
     scored_docs = sorted(zip(scores, docs), key=lambda x: x[0], reverse=True)
     return [doc for _, doc in scored_docs[:top_k]]
 
 # === RAG FUSION MULTI-DOCS ===
 
-def rag_fusion_multi_docs(
-    query, 
-    chat_history=None, 
-    k=6, 
-    max_context_tokens=1500, 
-    max_history_tokens=1000, 
-    nb_messages=5, 
-    retries=3
-):
-    if db is None:
-        logging.error("Index FAISS non chargé")
-        return " Index non chargé.", []
+def _chunk_key(docs):
+    """Identifiants (document_id, chunk_index) des chunks récupérés, indépendants de l'ordre."""
+    return frozenset(
+        (doc.metadata.get("document_id") or doc.metadata.get("title"), doc.metadata.get("chunk_index"))
+        for doc in docs
+    )
+
+def _doc_key(doc):
+    """Identité d'un chunk commune aux recherches vectorielle et BM25."""
+    if doc.metadata.get("chunk_index") is None:
+        return ("content", doc.page_content)
+    return (doc.metadata.get("document_id") or doc.metadata.get("title"), doc.metadata.get("chunk_index"))
+
+def _select_positions(handle, filters):
+    """Positions FAISS autorisées par les filtres normalisés (hors chunks supprimés); None sans filtre."""
+    if not filters or handle.metadata is None:
+        return None
+    with handle.lock.read_locked():
+        return handle.tombstones.exclude(handle.metadata.select(filters))
+
+def _search_by_vector(handle, vector, n, allowed=None):
+    """(Document, distance) des n chunks les plus proches, parmi les positions `allowed` si fournies."""
+    with handle.lock.read_locked():
+        deleted = handle.tombstones.positions
+        if allowed is None and not len(deleted):
+            return handle.store.similarity_search_with_score_by_vector(vector, k=n)
+        # Filtre et chunks supprimés appliqués dans le parcours FAISS, pas après coup
+        if allowed is None:
+            hits = search_excluding(handle.store.index, vector, deleted, n)
+        else:
+            hits = filtered_search(handle.store.index, vector, allowed, n, METADATA_FILTER_BRUTE_FORCE_MAX)
+        scored = [
+            (handle.store.docstore.search(handle.store.index_to_docstore_id[position]), distance)
+            for position, distance in hits
+        ]
+    return [(doc, distance) for doc, distance in scored if isinstance(doc, Document)]
 
-    if chat_history is None:
-        chat_history = []
+def _fuse_lexical(handle, query, dense_docs, allowed=None):
+    """
+    Fusionne (reciprocal rank fusion) les chunks de la recherche vectorielle et
+    les meilleurs chunks BM25.
 
-    try:
-        # Recherche dans FAISS
-        retrieved_docs = db.similarity_search(query, k=k)
-        # Reranking des documents les plus pertinents
-        docs = rerank_documents(query, retrieved_docs, top_k=k)
-    except Exception as e:
-        logging.error(f"Erreur recherche documentaire : {e}")
-        return f"Erreur recherche documentaire : {e}", []
+    Returns:
+        tuple: (documents fusionnés, True si BM25 a apporté des chunks absents de la recherche vectorielle)
+    """
+    with handle.lock.read_locked():
+        hits = handle.sparse.search(query, k=BM25_TOP_K, allowed=allowed, excluded=handle.tombstones.positions)
+        lexical_docs = [handle.store.docstore.search(docstore_id) for docstore_id, _ in hits]
+    # Le docstore renvoie un message (str) pour un identifiant inconnu
+    lexical_docs = [doc for doc in lexical_docs if isinstance(doc, Document)]
+    if not lexical_docs:
+        return dense_docs, False
+
+    by_key = {}
+    for doc in dense_docs + lexical_docs:
+        by_key.setdefault(_doc_key(doc), doc)
+    dense_keys = [_doc_key(doc) for doc in dense_docs]
+    fused = reciprocal_rank_fusion([dense_keys, [_doc_key(doc) for doc in lexical_docs]], k=RRF_K)
+    return [by_key[key] for key in fused], len(fused) > len(set(dense_keys))
+
+# Recherches des reformulations en parallèle (RAG-Fusion multi-requêtes)
+multi_query_pool = ThreadPoolExecutor(max_workers=MULTI_QUERY_WORKERS, thread_name_prefix="multi-query")
+
+def _reformulate(query, mode):
+    if mode == "llm":
+        return llm_reformulations(query, get_model(), MULTI_QUERY_VARIANTS,
+                                  timeout=MULTI_QUERY_LLM_TIMEOUT_SECONDS)
+    return local_reformulations(query, MULTI_QUERY_VARIANTS)
+
+def _variant_ranking(handle, variant, k, allowed=None):
+    """Classement d'une reformulation: recherche vectorielle (seuil de distance) et BM25 fusionnés."""
+    scored = _search_by_vector(handle, embed_query(variant), k, allowed)
+    docs = [doc for doc, dist in scored if not RETRIEVAL_ADAPTIVE or dist <= RETRIEVAL_MAX_DISTANCE]
+    if handle.sparse is not None:
+        docs, _ = _fuse_lexical(handle, variant, docs, allowed)
+    return docs
+
+def _fuse_reformulations(handle, query, docs, k, mode, allowed=None):
+    """
+    Recherche les reformulations de la question en parallèle et fusionne (RRF)
+    leurs classements avec celui de la question, sans doublon (document_id, chunk_index).
 
-    context_text = ""
-    context_token_count = 0
-    context_docs = []
+    Returns:
+        tuple: (documents fusionnés, True si les reformulations ont apporté de nouveaux chunks)
+    """
+    variants = _reformulate(query, mode)
+    if not variants:
+        return docs, False
+    rankings = [docs] + list(multi_query_pool.map(lambda variant: _variant_ranking(handle, variant, k, allowed), variants))
+
+    by_key = {}
+    for ranking in rankings:
+        for doc in ranking:
+            by_key.setdefault(_doc_key(doc), doc)
+    fused = reciprocal_rank_fusion([[_doc_key(doc) for doc in ranking] for ranking in rankings], k=RRF_K)
+    # Candidats bornés comme la recherche élargie: le reranking reste borné
+    fused = fused[:max(k, RETRIEVAL_MAX_K)]
+    original = {_doc_key(doc) for doc in docs}
+    return [by_key[key] for key in fused], any(key not in original for key in fused)
+
+def _resolve_multi_query(multi_query):
+    mode = (multi_query or MULTI_QUERY_MODE).lower()
+    if mode not in ("off", "local", "llm"):
+        logging.warning(f"Mode multi-requêtes inconnu '{mode}', désactivé")
+        mode = "off"
+    return mode
+
+def _resolve_summary_mode(summary_mode):
+    summary_mode = (summary_mode or ANSWER_SUMMARY_MODE).lower()
+    if summary_mode not in SUMMARY_MODES:
+        logging.warning(f"Mode de résumé inconnu '{summary_mode}', résumé désactivé")
+        summary_mode = SUMMARY_OFF
+    return summary_mode
+
+def _complete_summary(answer, summary, summary_mode):
+    """Résumé à afficher: celui du modèle, sinon extractif local; None si désactivé."""
+    if summary_mode == SUMMARY_OFF:
+        return None
+    return summary or extractive_summary(answer)
 
-    # Construction du contexte fusionné en respectant max tokens
-    for doc in docs:
-        doc_tokens = count_tokens(doc.page_content)
-        if context_token_count + doc_tokens > max_context_tokens:
-            break
-        source_info = doc.metadata.get("title", "Document inconnu")
-        context_text += f"[Source: {source_info}]\n{doc.page_content}\n\n"
-        context_token_count += doc_tokens
-        context_docs.append(doc)
+def _prepare_rag_fusion(query, chat_history, k, max_context_tokens, max_history_tokens,
+                        nb_messages, use_cache, summary_mode, multi_query="off", filters=None):
+    """
+    Étapes communes aux réponses complètes et en flux: recherche FAISS (et
+    BM25, restreintes aux chunks des filtres), cache sémantique, reranking,
+    contexte fusionné et prompt.
+
+    Returns:
+        dict: handle, query_vector, chunk_key (None sans cache), history_key
+              (empreinte de l'historique du prompt), cached (entrée
+              du cache ou None), context_docs, prompt, retrieval (décisions de
+              la recherche adaptative ou None)
+    """
+    handle = current_index()
+    # Embedding de la question (cache LRU), puis recherche dans FAISS
+    # sous verrou partagé: les requêtes s'exécutent en parallèle
+    query_vector = embed_query(query)
+    allowed = _select_positions(handle, filters)
+    if allowed is not None and not len(allowed):
+        logging.info(f" Aucun chunk ne correspond aux filtres {filters}")
+
+    def search(n):
+        return _search_by_vector(handle, query_vector, n, allowed)
+
+    plan = None
+    if RETRIEVAL_ADAPTIVE:
+        # Seuil de distance, k élargi si les candidats sont proches, reranking si utile
+        plan = plan_retrieval(search, k, RETRIEVAL_MAX_K, RETRIEVAL_MAX_DISTANCE,
+                              RETRIEVAL_CLOSE_MARGIN, RERANK_SKIP_MARGIN, RETRIEVAL_MIN_DOCS)
+        retrieved_docs = plan.docs
+    else:
+        retrieved_docs = [doc for doc, _ in search(k)]
+
+    # Termes exacts (noms INCI, codes CI): chunks BM25 fusionnés avec les chunks vectoriels
+    lexical_added = False
+    if handle.sparse is not None:
+        retrieved_docs, lexical_added = _fuse_lexical(handle, query, retrieved_docs, allowed)
+
+    # RAG-Fusion: reformulations recherchées en parallèle et fusionnées
+    if multi_query != "off":
+        retrieved_docs, variants_added = _fuse_reformulations(handle, query, retrieved_docs, k, multi_query, allowed)
+        lexical_added = lexical_added or variants_added
+
+    rag = {
+        "handle": handle,
+        "query_vector": query_vector,
+        "chunk_key": None,
+        "history_key": "",
+        "cached": None,
+        "context_docs": [],
+        "prompt": None,
+        "retrieval": plan.to_dict() if plan is not None else None,
+    }
 
     # Préparation historique résumé en respectant max tokens
     summarized_history = ""
@@ -461,6 +1401,39 @@ def rag_fusion_multi_docs(
 
     summarized_history = truncate_text_by_tokens(summarized_history, max_history_tokens)
 
+    # Cache sémantique: question proche, mêmes chunks récupérés, même historique
+    # (jamais la réponse d'une autre conversation), même version d'index
+    if use_cache and answer_cache is not None:
+        rag["chunk_key"] = _chunk_key(retrieved_docs)
+        rag["history_key"] = hashlib.sha256(summarized_history.encode("utf-8")).hexdigest()
+        rag["cached"] = answer_cache.lookup(query_vector, rag["chunk_key"], handle.version,
+                                            history_key=rag["history_key"])
+        if rag["cached"] is not None:
+            logging.info(" Réponse servie par le cache sémantique")
+            rag["context_docs"] = rag["cached"]["context"]
+            return rag
+
+    # Reranking des documents les plus pertinents (sauté si le premier est nettement
+    # devant et que BM25 n'a rien apporté de plus)
+    if plan is None or plan.rerank or lexical_added:
+        docs = rerank_documents(query, retrieved_docs, top_k=k)
+    else:
+        docs = retrieved_docs[:k]
+
+    context_text = ""
+    context_token_count = 0
+    context_docs = []
+
+    # Construction du contexte fusionné en respectant max tokens
+    for doc in docs:
+        doc_tokens = count_tokens(doc.page_content)
+        if context_token_count + doc_tokens > max_context_tokens:
+            break
+        source_info = doc.metadata.get("title", "Document inconnu")
+        context_text += f"[Source: {source_info}]\n{doc.page_content}\n\n"
+        context_token_count += doc_tokens
+        context_docs.append(doc)
+
     prompt = f"""
 Tu es un assistant IA expert. Voici une question d'utilisateur, des extraits documentaires provenant de plusieurs documents/fichiers, ainsi qu'un historique résumé du dialogue.
 
@@ -472,63 +1445,227 @@ Tu es un assistant IA expert. Voici une question d'utilisateur, des extraits doc
 
 ### 💬 Historique résumé :
 {summarized_history}
-
-### ✍️ Réponse :
 """.strip()
+    if summary_mode != SUMMARY_OFF:
+        # Réponse et résumé dans la même génération (sections délimitées)
+        prompt += f"\n\n{SUMMARY_INSTRUCTION}"
+    prompt += "\n\n### ✍️ Réponse :"
 
-    for attempt in range(retries):
-        try:
-            llm_model = get_model()
-            response = llm_model.generate_content(prompt)
-            #full_answer = response.text.strip()
-            if response.candidates and response.candidates[0].content.parts:
-                full_answer = "".join(
-                    [part.text for part in response.candidates[0].content.parts if hasattr(part, "text")]
-                ).strip()
-            else:
-                full_answer = " Désolé, je n'ai pas pu générer de réponse."
+    if plan is not None:
+        retrieval_stats.record(plan, context_token_count)
 
+    rag["context_docs"] = context_docs
+    rag["prompt"] = prompt
+    return rag
 
-            # Résumé automatique de la réponse pour simplicité
-            summary_prompt = f"""
-Résume ce texte en 1 à 2 phrases simples et claires, comme une synthèse pour un utilisateur non-expert.
+def _cache_answer(rag, query, answer, summary):
+    if rag["chunk_key"] is not None:
+        answer_cache.store(rag["query_vector"], rag["chunk_key"], rag["handle"].version, answer,
+                           rag["context_docs"], summary=summary, question=query,
+                           history_key=rag["history_key"])
 
-Texte :
-{full_answer}
+def rag_fusion_multi_docs(
+    query, 
+    chat_history=None, 
+    k=6, 
+    max_context_tokens=1500, 
+    max_history_tokens=1000, 
+    nb_messages=5, 
+    retries=None,
+    use_cache=True,
+    summary_mode=None,
+    multi_query=None,
+    filters=None
+):
+    """
+    Args:
+        retries: Nombre maximal de tentatives LLM (par défaut LLM_RETRY_MAX_ATTEMPTS)
+        summary_mode: "single" (réponse + résumé en un appel) ou "off";
+            par défaut ANSWER_SUMMARY_MODE
+        multi_query: "off", "local" ou "llm" (reformulations fusionnées);
+            par défaut MULTI_QUERY_MODE
+        filters: Restreint la recherche, ex. {"document_id": [...], "source_type": "pdf",
+            "product": ..., "brand": ...}: OU entre valeurs d'un champ, ET entre champs
+
+    Raises:
+        ValueError: Filtre inconnu
+    """
+    if current_index() is None:
+        logging.error("Index FAISS non chargé")
+        return index_unavailable_message(), []
 
-Résumé :
-""".strip()
-            summary_response = llm_model.generate_content(summary_prompt)
-            answer_summary = summary_response.text.strip()
+    summary_mode = _resolve_summary_mode(summary_mode)
+    filters = normalize_filters(filters)
+    if chat_history is None:
+        chat_history = []
 
-            # Ne pas afficher les chunks utilisés dans la réponse
-            final_response = f"{full_answer}\n\n📄 Résumé : {answer_summary}"
+    try:
+        rag = _prepare_rag_fusion(query, chat_history, k, max_context_tokens, max_history_tokens,
+                                  nb_messages, use_cache, summary_mode, _resolve_multi_query(multi_query),
+                                  filters)
+    except Exception as e:
+        logging.error(f"Erreur recherche documentaire : {e}")
+        return f"Erreur recherche documentaire : {e}", []
 
-            return final_response, context_docs
+    context_docs = rag["context_docs"]
+    cached = rag["cached"]
+    if cached is not None:
+        summary = _complete_summary(cached["answer"], cached["summary"], summary_mode)
+        return format_answer(cached["answer"], summary), context_docs
 
-        except Exception as e:
-            logging.warning(f"Tentative {attempt+1} échouée : {e}")
-            time.sleep(2)
+    try:
+        response = _generate_with_retry(rag["prompt"], retries)
+    except Exception as e:
+        logging.error(f"Génération impossible : {e}")
+        return _unavailable_message(e), context_docs
+
+    full_answer = response.text.strip()
+    generated = bool(full_answer)
+    if not generated:
+        full_answer = " Désolé, je n'ai pas pu générer de réponse."
+
+    # Séparation réponse / résumé; résumé extractif local si la section manque
+    full_answer, answer_summary = split_answer_summary(full_answer)
+    answer_summary = _complete_summary(full_answer, answer_summary, summary_mode)
+
+    # Ne pas afficher les chunks utilisés dans la réponse
+    final_response = format_answer(full_answer, answer_summary)
+
+    if generated:
+        _cache_answer(rag, query, full_answer, answer_summary)
+
+    return final_response, context_docs
+
+def stream_rag_fusion_multi_docs(
+    query,
+    chat_history=None,
+    k=6,
+    max_context_tokens=1500,
+    max_history_tokens=1000,
+    nb_messages=5,
+    retries=None,
+    use_cache=True,
+    summary_mode=None,
+    multi_query=None,
+    filters=None
+):
+    """
+    Version en flux de rag_fusion_multi_docs: les sources sont envoyées dès la
+    fin de la recherche, puis la réponse au fil de la génération.
+
+    Yields:
+        tuple: (événement, données) dans l'ordre
+            ("sources", [Document]) contexte utilisé,
+            ("token", str) fragments de la réponse (plusieurs),
+            ("summary", str) résumé, si activé,
+            ("done", str) réponse finale complète, au format de rag_fusion_multi_docs
+    """
+    if current_index() is None:
+        logging.error("Index FAISS non chargé")
+        message = index_unavailable_message()
+        yield "sources", []
+        yield "token", message
+        yield "done", message
+        return
+
+    summary_mode = _resolve_summary_mode(summary_mode)
+    filters = normalize_filters(filters)
+    if chat_history is None:
+        chat_history = []
 
-    return "❌ Réponse impossible.", context_docs
+    try:
+        rag = _prepare_rag_fusion(query, chat_history, k, max_context_tokens, max_history_tokens,
+                                  nb_messages, use_cache, summary_mode, _resolve_multi_query(multi_query),
+                                  filters)
+    except Exception as e:
+        logging.error(f"Erreur recherche documentaire : {e}")
+        yield "sources", []
+        yield "token", f"Erreur recherche documentaire : {e}"
+        yield "done", f"Erreur recherche documentaire : {e}"
+        return
+
+    yield "sources", rag["context_docs"]
+
+    cached = rag["cached"]
+    if cached is not None:
+        summary = _complete_summary(cached["answer"], cached["summary"], summary_mode)
+        yield "token", cached["answer"]
+        if summary:
+            yield "summary", summary
+        yield "done", format_answer(cached["answer"], summary)
+        return
+
+    llm = get_model()
+    retry = default_retry_policy(retries).start(get_circuit_breaker(llm.name))
+    while True:
+        splitter = SummaryStreamSplitter()
+        try:
+            timeout = retry.begin()
+        except Exception as e:
+            logging.error(f"Génération impossible : {e}")
+            message = _unavailable_message(e)
+            yield "token", message
+            yield "done", message
+            return
+        try:
+            for text in llm.stream(rag["prompt"], timeout=_call_timeout(llm, timeout)):
+                visible = splitter.feed(text)
+                if visible:
+                    yield "token", visible
+            retry.succeeded()
+        except Exception as e:
+            try:
+                # Des tokens sont déjà affichés: une nouvelle tentative les dupliquerait
+                retry.failed(e, retry=not splitter.answer)
+            except Exception:
+                logging.error(f"Génération impossible : {e}")
+                if splitter.answer:
+                    interrupted = f"{splitter.answer}\n\n❌ Réponse interrompue."
+                    yield "token", "\n\n❌ Réponse interrompue."
+                    yield "done", interrupted
+                else:
+                    message = _unavailable_message(e)
+                    yield "token", message
+                    yield "done", message
+                return
+            continue
+        finally:
+            # Client déconnecté pendant la génération (GeneratorExit, hors
+            # `except Exception`): la sonde du disjoncteur semi-ouvert est libérée
+            retry.abandon()
+        break
+
+    rest = splitter.close()
+    if rest:
+        yield "token", rest
+    full_answer, answer_summary = splitter.answer, splitter.summary
+    generated = bool(full_answer or answer_summary)
+    if not full_answer:
+        # Le modèle n'a produit que la section résumé (ou rien): elle sert de réponse
+        full_answer = answer_summary or " Désolé, je n'ai pas pu générer de réponse."
+        answer_summary = None
+        yield "token", full_answer
+
+    answer_summary = _complete_summary(full_answer, answer_summary, summary_mode)
+    if answer_summary:
+        yield "summary", answer_summary
+    if generated:
+        _cache_answer(rag, query, full_answer, answer_summary)
+    yield "done", format_answer(full_answer, answer_summary)
 
 
 
 # === RAG DIRECT PROMPT ===
 
-def rag_direct_prompt(query, chat_history=None, nb_messages=5, retries=3):
+def rag_direct_prompt(query, chat_history=None, nb_messages=5, retries=None):
     if chat_history is None:
         chat_history = []
     prompt = build_prompt_with_context(chat_history[-nb_messages:], query)
-    for attempt in range(retries):
-        try:
-            llm_model = get_model()
-            response = llm_model.generate_content(prompt)
-            return response.text.strip()
-        except Exception as e:
-            logging.warning(f"Tentative {attempt+1} échouée : {e}")
-            time.sleep(2)
-    return "❌ Réponse impossible."
+    try:
+        return _generate_with_retry(prompt, retries).text.strip()
+    except Exception as e:
+        logging.error(f"Génération impossible : {e}")
+        return _unavailable_message(e)
 
 # === CONSTRUCTION PROMPT ===
 
@@ -551,10 +1688,10 @@ Tu es un assistant IA expert. Voici une question d'utilisateur et un historique
 
 # === PROCESS QUESTION ===
 
-def process_question(query, use_rag=True, chat_history=None, nb_messages=5):
+def process_question(query, use_rag=True, chat_history=None, nb_messages=5, filters=None):
     if use_rag:
         # Utiliser la fusion multi-docs ici
-        answer, _ = rag_fusion_multi_docs(query, chat_history, nb_messages=nb_messages)
+        answer, _ = rag_fusion_multi_docs(query, chat_history, nb_messages=nb_messages, filters=filters)
     else:
         answer = rag_direct_prompt(query, chat_history, nb_messages=nb_messages)
     return answer
@@ -562,22 +1699,10 @@ def process_question(query, use_rag=True, chat_history=None, nb_messages=5):
 # === HANDLE UPLOADED FILE ===
 
 def handle_uploaded_file(file, question=None, chat_history=None, use_rag=True, nb_messages=5):
-    text = extract_text(file)
-    if not text or "Erreur" in text:
-        return text
+    text, error = extract_and_index_file(file)
+    if error:
+        return error
 
-    file_bytes = file.read()
-    file.seek(0)
-    doc_id = get_file_hash(file_bytes)
-    title = get_title_from_filename(file.filename)
-
-    metadata = {
-        "document_id": doc_id,
-        "source": file.filename,
-        "title": title
-    }
-
-    add_document_to_index(text, metadata=metadata)
     # Persistance automatique des données structurées (best-effort)
     try:
         _auto_persist_structured(text, source_name=file.filename, source_type=os.path.splitext(file.filename)[1].lower())
@@ -589,44 +1714,74 @@ def handle_uploaded_file(file, question=None, chat_history=None, use_rag=True, n
     else:
         prompt = text.strip()
 
-    return process_question(prompt, use_rag=use_rag, chat_history=chat_history, nb_messages=nb_messages)
+    # La question porte sur ce fichier: recherche restreinte à ses chunks
+    return process_question(prompt, use_rag=use_rag, chat_history=chat_history, nb_messages=nb_messages,
+                            filters={"document_id": file_document_id(file)})
 
 def handle_multiple_uploaded_files(files, question=None, chat_history=None, use_rag=True, nb_messages=5):
     """
     Traite plusieurs fichiers uploadés et génère une réponse RAG combinée.
     """
     all_text = ""
-    for file in files:
-        text = extract_text(file)
-        if not text or "Erreur" in text:
-            continue  # Ignore les fichiers avec erreur
-        file_bytes = file.read()
-        file.seek(0)
-        doc_id = get_file_hash(file_bytes)
-        title = get_title_from_filename(file.filename)
-        ext = os.path.splitext(file.filename)[1].lower()
-        metadata = {
-            "document_id": doc_id,
-            "source": file.filename,
-            "title": title
-        }
-        add_document_to_index(text, metadata=metadata)
-        # Persistance automatique par fichier (best-effort)
-        try:
-            _auto_persist_structured(text, source_name=file.filename, source_type=ext)
-        except Exception:
-            pass
-        all_text += f"\n\n### Fichier : {file.filename} ###\n{text.strip()}"
+    document_ids = []
+    errors = []
+    # Une seule écriture de l'index pour tout le lot, à la fin
+    with index_flusher.deferred():
+        for file in files:
+            text, error = extract_and_index_file(file)
+            if error:
+                errors.append(error)
+                continue  # Ignore les fichiers avec erreur
+            ext = os.path.splitext(file.filename)[1].lower()
+            # Persistance automatique par fichier (best-effort)
+            try:
+                _auto_persist_structured(text, source_name=file.filename, source_type=ext)
+            except Exception:
+                pass
+            all_text += f"\n\n### Fichier : {file.filename} ###\n{text.strip()}"
+            document_ids.append(file_document_id(file))
 
     if not all_text.strip():
-        return "Aucun contenu exploitable trouvé dans les fichiers."
+        # Cause affichée (index non chargé, extraction impossible...) plutôt qu'un échec muet
+        return errors[0] if errors else "Aucun contenu exploitable trouvé dans les fichiers."
 
     if question:
         prompt = f"{question.strip()}\n\nContenu combiné des fichiers :\n{all_text.strip()}"
     else:
         prompt = all_text.strip()
 
-    return process_question(prompt, use_rag=use_rag, chat_history=chat_history, nb_messages=nb_messages)
+    # Recherche restreinte aux chunks des fichiers uploadés
+    return process_question(prompt, use_rag=use_rag, chat_history=chat_history, nb_messages=nb_messages,
+                            filters={"document_id": document_ids})
 
 # === INIT ===
-load_faiss_index()
+models.register("embeddings", _load_embeddings)
+models.register("cross_encoder", _load_cross_encoder)
+models.register("whisper", _load_whisper)
+models.register("blip", _load_blip)
+models.register("faiss_index", load_faiss_index)
+
+# Composants nécessaires pour répondre à /ask
+REQUIRED_COMPONENTS = ("embeddings", "faiss_index")
+
+def warm_up_models(components=None):
+    """
+    Précharge en parallèle, dans des threads de fond, les composants listés
+    (par défaut MODEL_WARMUP_COMPONENTS) sans bloquer le démarrage du serveur.
+    """
+    if components is None:
+        components = MODEL_WARMUP_COMPONENTS
+    if not components:
+        return None
+    logging.info(f"Préchauffage en arrière-plan : {', '.join(components)}")
+    return models.warm_up(components)
+
+def get_readiness():
+    """État de chargement de chaque composant et disponibilité pour /ask."""
+    components = models.status()
+    return {
+        "ready": all(models.is_ready(name) for name in REQUIRED_COMPONENTS),
+        "warming_up": models.warming_up,
+        "required": list(REQUIRED_COMPONENTS),
+        "components": components,
+    }
@@ -0,0 +1,227 @@
+"""
+Index lexical BM25 des chunks FAISS
+Les noms INCI ("Sodium Lauryl Sulfate", "CI 77891") sont des termes exacts que
+MiniLM représente mal; cet index inversé les retrouve mot pour mot. Il couvre
+les mêmes chunks que le docstore FAISS, est alimenté à chaque ajout et ses
+résultats sont fusionnés avec la recherche vectorielle (reciprocal rank fusion).
+
+Stockage compact: une liste de postings par terme en tableaux typés
+(array 'I' pour les numéros de chunk, 'H' pour les fréquences), sauvegardés
+au format CSR (numpy .npz) à côté de l'index FAISS.
+"""
+
+import io
+import os
+import re
+import json
+import math
+import logging
+import unicodedata
+from array import array
+from typing import Dict, Hashable, Iterable, List, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: str) -> List[str]:
+    """Minuscules sans accents, mots alphanumériques (les codes CI restent des termes)"""
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    return _TOKEN_RE.findall(text)
+
+
+class BM25Index:
+    """
+    Index inversé BM25 incrémental.
+
+    Pas de verrou interne: comme le vectorstore, il est protégé par le verrou
+    lecteurs/rédacteur de la version d'index (IndexHandle.lock).
+    """
+
+    FILENAME = "bm25.npz"
+    META_FILENAME = "bm25.json"
+
+    def __init__(self, index_path: str, k1: float = 1.5, b: float = 0.75):
+        self.index_path = index_path
+        self.k1 = k1
+        self.b = b
+        self._vocabulary: Dict[str, int] = {}
+        self._post_docs: List[array] = []   # terme -> numéros de chunk croissants
+        self._post_tfs: List[array] = []    # terme -> fréquences (plafonnées à 65535)
+        self._doc_lens = array("I")
+        self._docstore_ids: List[str] = []
+        self._total_len = 0
+
+    def __len__(self) -> int:
+        return len(self._docstore_ids)
+
+    # --- Construction ---
+
+    def add(self, docstore_id: str, text: str) -> None:
+        terms = tokenize(text)
+        doc = len(self._docstore_ids)
+        self._docstore_ids.append(docstore_id)
+        self._doc_lens.append(len(terms))
+        self._total_len += len(terms)
+        counts: Dict[str, int] = {}
+        for term in terms:
+            counts[term] = counts.get(term, 0) + 1
+        for term, tf in counts.items():
+            term_id = self._vocabulary.get(term)
+            if term_id is None:
+                term_id = len(self._post_docs)
+                self._vocabulary[term] = term_id
+                self._post_docs.append(array("I"))
+                self._post_tfs.append(array("H"))
+            self._post_docs[term_id].append(doc)
+            self._post_tfs[term_id].append(min(tf, 65535))
+
+    def add_many(self, items: Iterable[Tuple[str, str]]) -> None:
+        """Ajoute des (docstore_id, texte)"""
+        for docstore_id, text in items:
+            self.add(docstore_id, text)
+
+    def rebuild_from_docstore(self, vectorstore) -> None:
+        """Reconstruit l'index en parcourant une fois le docstore (ordre des positions FAISS)"""
+        self.__init__(self.index_path, self.k1, self.b)
+        for position in sorted(vectorstore.index_to_docstore_id):
+            docstore_id = vectorstore.index_to_docstore_id[position]
+            doc = vectorstore.docstore.search(docstore_id)
+            self.add(docstore_id, getattr(doc, "page_content", "") or "")
+        logger.info(f"Index BM25 reconstruit : {len(self)} chunks, {len(self._vocabulary)} termes")
+
+    def rename_chunks(self, new_ids: Dict[str, str]) -> None:
+        """Renomme les identifiants docstore des chunks (conversion de format d'index)"""
+        self._docstore_ids = [new_ids.get(docstore_id, docstore_id) for docstore_id in self._docstore_ids]
+
+    # --- Recherche ---
+
+    def search(self, query: str, k: int = 10, allowed: np.ndarray = None,
+               excluded: np.ndarray = None) -> List[Tuple[str, float]]:
+        """
+        Args:
+            allowed: Positions FAISS autorisées (recherche filtrée); None: tous les chunks
+            excluded: Positions FAISS des chunks supprimés (tombstones)
+
+        Returns:
+            list: (docstore_id, score) des k meilleurs chunks, score décroissant
+        """
+        n_docs = len(self._docstore_ids)
+        if not n_docs:
+            return []
+        avg_len = self._total_len / n_docs or 1.0
+        # Vues numpy sans copie sur les tableaux (libérées en fin d'appel, sous verrou partagé)
+        doc_lens = np.frombuffer(self._doc_lens, dtype=np.uint32)
+        scores = np.zeros(n_docs, dtype=np.float32)
+        for term in set(tokenize(query)):
+            term_id = self._vocabulary.get(term)
+            if term_id is None:
+                continue
+            docs = np.frombuffer(self._post_docs[term_id], dtype=np.uint32)
+            tfs = np.frombuffer(self._post_tfs[term_id], dtype=np.uint16).astype(np.float32)
+            idf = math.log(1 + (n_docs - len(docs) + 0.5) / (len(docs) + 0.5))
+            norm = self.k1 * (1 - self.b + self.b * doc_lens[docs] / avg_len)
+            # Un chunk apparaît une seule fois par liste: affectation indexée sans doublon
+            scores[docs] += idf * tfs * (self.k1 + 1) / (tfs + norm)
+        if allowed is not None:
+            # Les numéros de chunk BM25 suivent l'ordre des positions FAISS
+            mask = np.zeros(n_docs, dtype=bool)
+            mask[allowed[allowed < n_docs]] = True
+            scores[~mask] = 0
+        if excluded is not None and len(excluded):
+            # Les chunks supprimés comptent encore dans idf jusqu'à la compaction
+            scores[excluded[excluded < n_docs]] = 0
+        candidates = np.flatnonzero(scores)
+        if len(candidates) > k:
+            candidates = candidates[np.argpartition(-scores[candidates], k)[:k]]
+        best = candidates[np.argsort(-scores[candidates], kind="stable")]
+        return [(self._docstore_ids[doc], float(scores[doc])) for doc in best]
+
+    # --- Persistance ---
+
+    def save(self, ntotal: int = None, directory: str = None) -> None:
+        """Sauvegarde atomique (postings au format CSR + vocabulaire JSON)"""
+        directory = directory or self.index_path
+        os.makedirs(directory, exist_ok=True)
+        offsets = np.zeros(len(self._post_docs) + 1, dtype=np.uint64)
+        if self._post_docs:
+            offsets[1:] = np.cumsum([len(p) for p in self._post_docs])
+        buffer = io.BytesIO()
+        np.savez(
+            buffer,
+            offsets=offsets,
+            docs=np.frombuffer(b"".join(p.tobytes() for p in self._post_docs), dtype=np.uint32),
+            tfs=np.frombuffer(b"".join(p.tobytes() for p in self._post_tfs), dtype=np.uint16),
+            doc_lens=np.frombuffer(self._doc_lens.tobytes(), dtype=np.uint32),
+        )
+        meta = {
+            "ntotal": ntotal,
+            "k1": self.k1,
+            "b": self.b,
+            "vocabulary": sorted(self._vocabulary, key=self._vocabulary.get),
+            "docstore_ids": self._docstore_ids,
+        }
+        for filename, write in (
+            (self.FILENAME, lambda f: f.write(buffer.getvalue())),
+            (self.META_FILENAME, lambda f: f.write(json.dumps(meta).encode("utf-8"))),
+        ):
+            path = os.path.join(directory, filename)
+            with open(f"{path}.tmp", "wb") as f:
+                write(f)
+            os.replace(f"{path}.tmp", path)
+
+    def load(self, expected_chunks: int = None) -> bool:
+        """
+        Returns:
+            bool: True si l'index est chargé et couvre `expected_chunks` chunks
+        """
+        meta_path = os.path.join(self.index_path, self.META_FILENAME)
+        data_path = os.path.join(self.index_path, self.FILENAME)
+        if not (os.path.exists(meta_path) and os.path.exists(data_path)):
+            return False
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            with np.load(data_path) as data:
+                offsets, docs, tfs = data["offsets"], data["docs"], data["tfs"]
+                doc_lens = data["doc_lens"]
+        except Exception as e:
+            logger.warning(f"Index BM25 illisible ({data_path}) : {e}")
+            return False
+        if expected_chunks is not None and meta.get("ntotal") != expected_chunks:
+            logger.warning("Index BM25 désynchronisé de l'index FAISS")
+            return False
+        self.k1, self.b = meta["k1"], meta["b"]
+        self._vocabulary = {term: i for i, term in enumerate(meta["vocabulary"])}
+        self._docstore_ids = meta["docstore_ids"]
+        self._post_docs, self._post_tfs = [], []
+        for i in range(len(offsets) - 1):
+            start, end = int(offsets[i]), int(offsets[i + 1])
+            self._post_docs.append(array("I", docs[start:end].tobytes()))
+            self._post_tfs.append(array("H", tfs[start:end].tobytes()))
+        self._doc_lens = array("I", doc_lens.astype(np.uint32).tobytes())
+        self._total_len = int(doc_lens.sum())
+        return True
+
+    def stats(self) -> Dict:
+        return {
+            "chunks": len(self._docstore_ids),
+            "terms": len(self._vocabulary),
+            "postings": sum(len(p) for p in self._post_docs),
+        }
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[Hashable]], k: int = 60) -> List[Hashable]:
+    """
+    Fusionne des classements: score(x) = somme des 1 / (k + rang) sur les listes
+    où x apparaît (rang à partir de 1). Retourne les clés par score décroissant.
+    """
+    scores: Dict[Hashable, float] = {}
+    for ranking in rankings:
+        for rank, key in enumerate(ranking, start=1):
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank)
+    return sorted(scores, key=scores.get, reverse=True)
@@ -0,0 +1,263 @@
+"""
+Stockage compact des chunks, indexé par position FAISS (remplace le docstore picklé)
+- chunks.txt:         textes UTF-8 bout à bout, projeté en mémoire (mmap),
+- chunks.offsets.npy: n + 1 offsets (uint64) dans chunks.txt, projeté en mémoire,
+- chunks.meta.npz / chunks.meta.json: métadonnées en colonnes (chaînes
+  encodées par dictionnaire en codes int32, entiers en int64; les autres
+  valeurs, rares, en JSON par position).
+
+L'identifiant d'un chunk est sa position dans l'index FAISS: ni table
+d'identifiants ni désérialisation pickle. Le chargement lit des tableaux
+proportionnels au nombre de vecteurs; seuls les k chunks récupérés par une
+requête sont matérialisés en Document.
+
+Compatible avec l'interface Docstore de LangChain (search / add): se passe
+directement au vectorstore FAISS avec PositionIds comme index_to_docstore_id.
+Le stockage est en ajout seul: delete garde le comportement de Docstore
+(non implémenté), FAISS.delete renumérotant les positions. Les documents se
+suppriment par backendtow.delete_document / replace_document (tombstones),
+et la compaction réécrit un ChunkStore sans les chunks supprimés.
+Les ajouts restent en mémoire jusqu'à la sauvegarde suivante, qui réécrit les
+fichiers puis les rouvre.
+"""
+
+import os
+import json
+import mmap
+import logging
+from collections.abc import Mapping
+from typing import Dict, List, Union
+
+import numpy as np
+from langchain_community.docstore.base import AddableMixin, Docstore
+from langchain_core.documents import Document
+
+logger = logging.getLogger(__name__)
+
+INT_MISSING = np.iinfo(np.int64).min
+
+
+class LegacyIndexError(RuntimeError):
+    """Index au format précédent (docstore picklé): conversion explicite requise"""
+
+
+class PositionIds(Mapping):
+    """
+    index_to_docstore_id de LangChain sans table: la position FAISS i a pour
+    identifiant str(i). LangChain y ajoute les positions des nouveaux vecteurs.
+    """
+
+    def __init__(self, count: int = 0):
+        self._count = count
+
+    def __getitem__(self, position) -> str:
+        if isinstance(position, (int, np.integer)) and 0 <= position < self._count:
+            return str(int(position))
+        raise KeyError(position)
+
+    def __iter__(self):
+        return iter(range(self._count))
+
+    def __len__(self) -> int:
+        return self._count
+
+    def update(self, index_to_id: Dict[int, str]) -> None:
+        for offset, position in enumerate(sorted(index_to_id)):
+            if position != self._count + offset or index_to_id[position] != str(position):
+                raise ValueError("Identifiants de chunks attendus: positions FAISS consécutives (ids=str(position))")
+        self._count += len(index_to_id)
+
+
+class _Columns:
+    """Métadonnées en colonnes pour n chunks (immuable: `appended` en crée une nouvelle)"""
+
+    def __init__(self, n: int = 0, strings: Dict[str, List[str]] = None, codes: Dict[str, np.ndarray] = None,
+                 ints: Dict[str, np.ndarray] = None, extras: Dict[int, Dict] = None):
+        self.n = n
+        self.strings = strings or {}
+        self.codes = codes or {}
+        self.ints = ints or {}
+        self.extras = extras or {}
+
+    def row(self, position: int) -> Dict:
+        metadata = {}
+        for key, codes in self.codes.items():
+            code = int(codes[position])
+            if code >= 0:
+                metadata[key] = self.strings[key][code]
+        for key, values in self.ints.items():
+            value = int(values[position])
+            if value != INT_MISSING:
+                metadata[key] = value
+        metadata.update(self.extras.get(position, {}))
+        return metadata
+
+    def appended(self, rows: List[Dict]) -> "_Columns":
+        m = len(rows)
+        strings = {key: list(table) for key, table in self.strings.items()}
+        lookup = {key: {value: i for i, value in enumerate(table)} for key, table in strings.items()}
+        new_codes: Dict[str, np.ndarray] = {}
+        new_ints: Dict[str, np.ndarray] = {}
+        extras = dict(self.extras)
+        for offset, metadata in enumerate(rows):
+            for key, value in metadata.items():
+                # Une clé garde un seul type de colonne; bool (sous-classe d'int) et
+                # les autres types vont dans les extras
+                if isinstance(value, str) and key not in self.ints and key not in new_ints:
+                    table = lookup.setdefault(key, {})
+                    if value not in table:
+                        table[value] = len(table)
+                        strings.setdefault(key, []).append(value)
+                    new_codes.setdefault(key, np.full(m, -1, dtype=np.int32))[offset] = table[value]
+                elif (isinstance(value, int) and not isinstance(value, bool) and value != INT_MISSING
+                      and key not in self.codes and key not in new_codes):
+                    new_ints.setdefault(key, np.full(m, INT_MISSING, dtype=np.int64))[offset] = value
+                else:
+                    extras.setdefault(self.n + offset, {})[key] = value
+
+        def merge(old, new, fill, dtype):
+            return {
+                key: np.concatenate([
+                    old[key] if key in old else np.full(self.n, fill, dtype=dtype),
+                    new[key] if key in new else np.full(m, fill, dtype=dtype),
+                ])
+                for key in set(old) | set(new)
+            }
+
+        return _Columns(self.n + m, strings, merge(self.codes, new_codes, -1, np.int32),
+                        merge(self.ints, new_ints, INT_MISSING, np.int64), extras)
+
+
+class _Snapshot:
+    """Fichiers projetés et colonnes, remplacés ensemble à chaque sauvegarde"""
+
+    def __init__(self, text=None, offsets=None, columns: _Columns = None):
+        self.text = text
+        self.offsets = offsets if offsets is not None else np.zeros(1, dtype=np.uint64)
+        self.columns = columns or _Columns()
+
+    @property
+    def count(self) -> int:
+        return len(self.offsets) - 1
+
+
+class ChunkStore(Docstore, AddableMixin):
+    """
+    Chunks par position FAISS: texte dans chunks.txt (mmap), métadonnées en colonnes.
+
+    AddableMixin: FAISS.add_embeddings refuse un docstore qui n'en hérite pas.
+
+    Pas de verrou interne: comme le vectorstore, il est protégé par le verrou
+    lecteurs/rédacteur de la version d'index (IndexHandle.lock).
+    """
+
+    TEXT_FILENAME = "chunks.txt"
+    OFFSETS_FILENAME = "chunks.offsets.npy"
+    COLUMNS_FILENAME = "chunks.meta.npz"
+    COLUMNS_META_FILENAME = "chunks.meta.json"
+
+    def __init__(self):
+        self._snapshot = _Snapshot()
+        self._pending: List[Document] = []
+
+    @classmethod
+    def exists(cls, directory: str) -> bool:
+        return all(os.path.exists(os.path.join(directory, name)) for name in (
+            cls.TEXT_FILENAME, cls.OFFSETS_FILENAME, cls.COLUMNS_FILENAME, cls.COLUMNS_META_FILENAME))
+
+    @classmethod
+    def open(cls, directory: str) -> "ChunkStore":
+        store = cls()
+        store._snapshot = cls._open_snapshot(directory)
+        return store
+
+    @classmethod
+    def _open_snapshot(cls, directory: str) -> _Snapshot:
+        offsets = np.load(os.path.join(directory, cls.OFFSETS_FILENAME), mmap_mode="r")
+        text = None
+        if int(offsets[-1]):
+            with open(os.path.join(directory, cls.TEXT_FILENAME), "rb") as f:
+                text = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        with open(os.path.join(directory, cls.COLUMNS_META_FILENAME), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        with np.load(os.path.join(directory, cls.COLUMNS_FILENAME)) as arrays:
+            codes = {key: arrays[f"s:{key}"] for key in meta["strings"]}
+            ints = {key: arrays[f"i:{key}"] for key in meta["ints"]}
+        extras = {int(position): values for position, values in meta["extras"].items()}
+        return _Snapshot(text, offsets, _Columns(len(offsets) - 1, meta["strings"], codes, ints, extras))
+
+    def __len__(self) -> int:
+        return self._snapshot.count + len(self._pending)
+
+    # --- Interface Docstore (LangChain) ---
+
+    def search(self, search: str) -> Union[str, Document]:
+        try:
+            position = int(search)
+        except (TypeError, ValueError):
+            return f"ID {search} not found."
+        # Ajouts lus avant l'état projeté (ordre inverse de save)
+        pending = self._pending
+        snapshot = self._snapshot
+        if 0 <= position < snapshot.count:
+            start, end = int(snapshot.offsets[position]), int(snapshot.offsets[position + 1])
+            text = snapshot.text[start:end].decode("utf-8") if end > start else ""
+            return Document(page_content=text, metadata=snapshot.columns.row(position))
+        if 0 <= position - snapshot.count < len(pending):
+            return pending[position - snapshot.count]
+        return f"ID {search} not found."
+
+    def add(self, texts: Dict[str, Document]) -> None:
+        start = len(self)
+        if list(texts) != [str(start + offset) for offset in range(len(texts))]:
+            raise ValueError("Identifiants de chunks attendus: positions FAISS consécutives (ids=str(position))")
+        self._pending = self._pending + list(texts.values())
+
+    # --- Persistance ---
+
+    def save(self, directory: str) -> None:
+        """
+        Écrit les chunks (existants recopiés tels quels, ajouts encodés) puis
+        rouvre les fichiers écrits: les ajouts quittent la mémoire privée.
+        """
+        os.makedirs(directory, exist_ok=True)
+        snapshot, pending = self._snapshot, self._pending
+        persisted_bytes = int(snapshot.offsets[-1])
+        added = np.empty(len(pending), dtype=np.uint64)
+        with open(os.path.join(directory, self.TEXT_FILENAME), "wb") as f:
+            if persisted_bytes:
+                f.write(snapshot.text[:persisted_bytes])
+            end = persisted_bytes
+            for i, doc in enumerate(pending):
+                encoded = doc.page_content.encode("utf-8")
+                f.write(encoded)
+                end += len(encoded)
+                added[i] = end
+        np.save(os.path.join(directory, self.OFFSETS_FILENAME),
+                np.concatenate([np.asarray(snapshot.offsets, dtype=np.uint64), added]))
+
+        columns = snapshot.columns.appended([doc.metadata for doc in pending])
+        arrays = {f"s:{key}": codes for key, codes in columns.codes.items()}
+        arrays.update({f"i:{key}": values for key, values in columns.ints.items()})
+        np.savez(os.path.join(directory, self.COLUMNS_FILENAME), **arrays)
+        with open(os.path.join(directory, self.COLUMNS_META_FILENAME), "w", encoding="utf-8") as f:
+            json.dump({
+                "strings": columns.strings,
+                "ints": sorted(columns.ints),
+                "extras": {str(position): values for position, values in columns.extras.items()},
+            }, f, ensure_ascii=False)
+
+        # Le nouvel état contient déjà les ajouts: il est publié avant de vider
+        # les ajouts en mémoire, un lecteur concurrent trouve toujours le chunk
+        self._snapshot = self._open_snapshot(directory)
+        self._pending = []
+
+    def stats(self) -> Dict:
+        columns = self._snapshot.columns
+        return {
+            "chunks": len(self),
+            "pending": len(self._pending),
+            "text_bytes": int(self._snapshot.offsets[-1]),
+            "metadata_columns": sorted(list(columns.codes) + list(columns.ints)),
+            "metadata_extras": len(columns.extras),
+        }
@@ -0,0 +1,89 @@
+"""
+Découpage sémantique en chunks avec comptage incrémental des tokens
+Chaque phrase est tokenisée une seule fois; le chevauchement réutilise les comptes déjà calculés
+"""
+
+from collections import deque
+from typing import Callable, Iterable, Iterator, List
+
+
+def iter_sentence_chunks(sentences: Iterable[str], max_tokens: int, overlap_tokens: int,
+                         count_tokens: Callable[[str], int]) -> Iterator[str]:
+    """
+    Regroupe des phrases en chunks d'au plus `max_tokens` tokens avec chevauchement.
+
+    Les chunks produits sont identiques à l'algorithme historique (liste de
+    phrases + recomptage du chevauchement), mais les paires (phrase, nb_tokens)
+    sont conservées dans une deque: le chevauchement se construit en remontant
+    la fin de la deque et les phrases abandonnées sont retirées en tête, soit
+    un coût linéaire en nombre de phrases.
+
+    Args:
+        sentences: Phrases dans l'ordre du document (liste ou générateur)
+        max_tokens: Nombre maximum de tokens par chunk
+        overlap_tokens: Nombre minimum de tokens repris du chunk précédent
+        count_tokens: Fonction de comptage des tokens d'une phrase
+
+    Yields:
+        str: Texte de chaque chunk
+    """
+    current = deque()
+    current_len = 0
+
+    for sentence in sentences:
+        sent_tokens = count_tokens(sentence)
+
+        if current_len + sent_tokens > max_tokens:
+            yield " ".join(sent for sent, _ in current)
+            # Plus court suffixe atteignant overlap_tokens
+            token_sum = 0
+            keep = 0
+            for _, n_tokens in reversed(current):
+                token_sum += n_tokens
+                keep += 1
+                if token_sum >= overlap_tokens:
+                    break
+            for _ in range(len(current) - keep):
+                current.popleft()
+            current_len = token_sum
+
+        current.append((sentence, sent_tokens))
+        current_len += sent_tokens
+
+    if current:
+        yield " ".join(sent for sent, _ in current)
+
+
+def chunk_sentences(sentences: Iterable[str], max_tokens: int, overlap_tokens: int,
+                    count_tokens: Callable[[str], int]) -> List[str]:
+    """Version liste de `iter_sentence_chunks`"""
+    return list(iter_sentence_chunks(sentences, max_tokens, overlap_tokens, count_tokens))
+
+
+def iter_sentences(segments: Iterable[str], split_sentences: Callable[[str], List[str]]) -> Iterator[str]:
+    """
+    Découpe paresseusement un flux de segments (pages PDF, paragraphes) en phrases.
+
+    La dernière phrase de chaque segment est retenue et préfixée au segment
+    suivant, car une phrase peut se poursuivre sur la page d'après. Les
+    segments sont joints par un saut de ligne, comme l'extraction complète.
+
+    Args:
+        segments: Textes successifs du document
+        split_sentences: Découpeur de phrases (ex: nltk sent_tokenize)
+
+    Yields:
+        str: Phrases dans l'ordre du document
+    """
+    carry = ""
+    for segment in segments:
+        text = f"{carry}\n{segment}" if carry else segment
+        sentences = split_sentences(text)
+        if not sentences:
+            carry = ""
+            continue
+        for sentence in sentences[:-1]:
+            yield sentence
+        carry = sentences[-1]
+    if carry:
+        yield carry
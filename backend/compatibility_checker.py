@@ -6,7 +6,7 @@ Répond aux questions comme "Puis-je utiliser le produit A avec le produit B ?"
 import logging
 from typing import List, Dict, Tuple, Optional
 from datetime import datetime, timedelta
-import google.generativeai as genai
+from .llm_backend import LLMBackend, get_llm_backend
 
 logger = logging.getLogger(__name__)
 
@@ -22,12 +22,11 @@ class CompatibilityChecker:
         'UNKNOWN': {'score': 0, 'emoji': '⚪', 'label': 'Inconnu'}
     }
     
-    def __init__(self, db=None, api_key: str = None):
+    def __init__(self, db=None, api_key: str = None, llm: LLMBackend = None):
         self.db = db
         self.api_key = api_key
-        if api_key:
-            genai.configure(api_key=api_key)
-            self.model = genai.GenerativeModel('gemini-2.5-pro')
+        # Backend de la route "compatibility" (Gemini par défaut, voir LLM_BACKEND_COMPATIBILITY)
+        self.llm = llm or get_llm_backend("compatibility", api_key=api_key)
     
     def check_products_compatibility(self, product1_id: int, product2_id: int) -> Dict:
         """
@@ -266,7 +265,7 @@ class CompatibilityChecker:
         Returns:
             Réponse texte structurée
         """
-        if not self.model:
+        if not self.llm.available:
             return "Modèle Gemini non configuré"
         
         try:
@@ -283,7 +282,7 @@ Répondez à cette question sur la compatibilité:
 
 Fournissez une réponse claire, structurée et basée sur les données disponibles."""
             
-            response = self.model.generate_content(prompt)
+            response = self.llm.generate(prompt)
             return response.text
             
         except Exception as e:
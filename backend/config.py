@@ -47,4 +47,244 @@ MAX_FILE_SIZE_MB = 20  # Limite taille fichier en Mo (ajustable)
 # Active l'enregistrement automatique en base des données structurées
 # extraites (produits, ingrédients, incompatibilités) après extraction.
 # Peut être contrôlé via la variable d'environnement AUTO_PERSIST_STRUCTURED=0/1
-AUTO_PERSIST_STRUCTURED = bool(int(os.getenv("AUTO_PERSIST_STRUCTURED", "1")))
\ No newline at end of file
+AUTO_PERSIST_STRUCTURED = bool(int(os.getenv("AUTO_PERSIST_STRUCTURED", "1")))
+
+# ==============================
+# PERSISTANCE DIFFÉRÉE DE L'INDEX FAISS
+# ==============================
+
+# Nombre de chunks ajoutés en mémoire au-delà duquel l'index est écrit sur disque
+INDEX_FLUSH_MAX_PENDING = int(os.getenv("INDEX_FLUSH_MAX_PENDING", "2000"))
+
+# Délai maximal (secondes) avant l'écriture des chunks en attente
+INDEX_FLUSH_INTERVAL_SECONDS = float(os.getenv("INDEX_FLUSH_INTERVAL_SECONDS", "30"))
+
+# ==============================
+# INDEXATION EN FLUX
+# ==============================
+
+# Nombre de chunks embeddés puis ajoutés à FAISS par micro-lot
+# (mémoire constante, premiers chunks interrogeables avant la fin du document)
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "64"))
+
+# ==============================
+# CACHE DES EMBEDDINGS DE CHUNKS
+# ==============================
+
+# Réutilise les vecteurs des chunks déjà embeddés (hash du contenu + modèle),
+# stockés sous CACHE_DIR/embeddings. Contrôlé via EMBEDDING_CACHE=0/1
+EMBEDDING_CACHE = bool(int(os.getenv("EMBEDDING_CACHE", "1")))
+
+# Taille du cache LRU question normalisée -> embedding (0 pour désactiver)
+QUERY_EMBEDDING_CACHE_SIZE = int(os.getenv("QUERY_EMBEDDING_CACHE_SIZE", "2048"))
+
+# ==============================
+# CACHE SÉMANTIQUE DES RÉPONSES
+# ==============================
+
+# Réutilise la réponse d'une question quasi identique (mêmes chunks, même
+# version de l'index) sans rappeler Gemini. Contrôlé via ANSWER_CACHE=0/1
+ANSWER_CACHE = bool(int(os.getenv("ANSWER_CACHE", "1")))
+
+# Similarité cosinus minimale entre deux questions pour réutiliser une réponse
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))
+
+# Durée de vie (secondes) et nombre maximal d'entrées du cache
+ANSWER_CACHE_TTL_SECONDS = float(os.getenv("ANSWER_CACHE_TTL_SECONDS", "3600"))
+ANSWER_CACHE_MAX_SIZE = int(os.getenv("ANSWER_CACHE_MAX_SIZE", "1000"))
+
+# ==============================
+# RÉSUMÉ DES RÉPONSES RAG
+# ==============================
+
+# "single": réponse et "📄 Résumé" produits par un seul appel Gemini
+#           (résumé extractif local si la section manque)
+# "off":    pas de résumé (clients API qui ne l'affichent pas)
+ANSWER_SUMMARY_MODE = os.getenv("ANSWER_SUMMARY_MODE", "single").lower()
+
+# ==============================
+# BACKENDS LLM
+# ==============================
+
+# Backend de génération pour toutes les routes: gemini, mpt ou fake (réponses
+# simulées, sans quota, pour les tests de charge). Vide = défaut de chaque route.
+# Surcharge par route: LLM_BACKEND_ASK, LLM_BACKEND_COMPATIBILITY,
+# LLM_BACKEND_EXTRACTION, LLM_BACKEND_LEGACY
+LLM_BACKEND = os.getenv("LLM_BACKEND", "").lower()
+
+# Délai maximal d'un appel de génération (secondes)
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "60"))
+
+GEMINI_MODEL_NAME = os.getenv("GEMINI_MODEL_NAME", "models/gemini-2.5-pro")
+MPT_MODEL_NAME = os.getenv("MPT_MODEL_NAME", "mosaicml/mpt-7b-instruct")
+
+# Backend simulé: latence avant le premier token, nombre de tokens et délai entre tokens
+FAKE_LLM_LATENCY_SECONDS = float(os.getenv("FAKE_LLM_LATENCY_SECONDS", "0.5"))
+FAKE_LLM_TOKENS = int(os.getenv("FAKE_LLM_TOKENS", "80"))
+FAKE_LLM_TOKEN_INTERVAL_SECONDS = float(os.getenv("FAKE_LLM_TOKEN_INTERVAL_SECONDS", "0.01"))
+
+# ==============================
+# NOUVELLES TENTATIVES ET DISJONCTEUR LLM
+# ==============================
+
+# Nombre maximal de tentatives par requête (attente exponentielle avec jitter entre deux)
+LLM_RETRY_MAX_ATTEMPTS = int(os.getenv("LLM_RETRY_MAX_ATTEMPTS", "3"))
+LLM_RETRY_BASE_DELAY_SECONDS = float(os.getenv("LLM_RETRY_BASE_DELAY_SECONDS", "0.5"))
+LLM_RETRY_MAX_DELAY_SECONDS = float(os.getenv("LLM_RETRY_MAX_DELAY_SECONDS", "4"))
+
+# Délai total d'une requête, tentatives et attentes comprises (0 = illimité)
+LLM_REQUEST_DEADLINE_SECONDS = float(os.getenv("LLM_REQUEST_DEADLINE_SECONDS", "45"))
+
+# Échecs transitoires consécutifs qui ouvrent le disjoncteur d'un backend, et
+# durée (secondes) pendant laquelle les appels sont refusés avant un appel d'essai
+LLM_BREAKER_FAILURE_THRESHOLD = int(os.getenv("LLM_BREAKER_FAILURE_THRESHOLD", "5"))
+LLM_BREAKER_RESET_SECONDS = float(os.getenv("LLM_BREAKER_RESET_SECONDS", "30"))
+
+# ==============================
+# PRÉCHAUFFAGE DES MODÈLES
+# ==============================
+
+# Composants chargés en parallèle en arrière-plan après le démarrage du serveur
+# (embeddings, cross_encoder, faiss_index, whisper, blip). Vide = chargement au
+# premier usage uniquement (ex: workers qui ne servent que /chats).
+MODEL_WARMUP_COMPONENTS = [
+    name.strip()
+    for name in os.getenv("MODEL_WARMUP_COMPONENTS", "embeddings,cross_encoder,faiss_index").split(",")
+    if name.strip()
+]
+
+# Après un échec de chargement (index illisible, modèle absent), l'erreur est
+# renvoyée telle quelle pendant ce délai avant une nouvelle tentative;
+# /admin/reload_index relance le chargement immédiatement
+MODEL_RETRY_SECONDS = float(os.getenv("MODEL_RETRY_SECONDS", "30"))
+
+# ==============================
+# PROFILAGE DU DÉMARRAGE
+# ==============================
+
+# STARTUP_PROFILE=1: temps et mémoire (RSS) de chaque import lourd et étape
+# d'initialisation, écrits en JSON (et tableau .txt voisin) dans STARTUP_PROFILE_PATH
+STARTUP_PROFILE = os.getenv("STARTUP_PROFILE", "0").lower() in ("1", "true", "yes")
+STARTUP_PROFILE_PATH = os.getenv("STARTUP_PROFILE_PATH", os.path.join(CACHE_DIR, "startup_profile.json"))
+
+# ==============================
+# RERANKING PAR MICRO-LOTS
+# ==============================
+
+# Regroupe les paires (question, passage) des requêtes concurrentes en un seul
+# appel au cross-encoder (0 = un appel par requête)
+RERANK_BATCHING = bool(int(os.getenv("RERANK_BATCHING", "1")))
+
+# Attente maximale (ms) pour compléter un lot, et nombre de paires qui le déclenche sans attendre
+RERANK_BATCH_MAX_WAIT_MS = float(os.getenv("RERANK_BATCH_MAX_WAIT_MS", "5"))
+RERANK_BATCH_MAX_PAIRS = int(os.getenv("RERANK_BATCH_MAX_PAIRS", "64"))
+
+# Taille des lots internes de CrossEncoder.predict
+RERANK_PREDICT_BATCH_SIZE = int(os.getenv("RERANK_PREDICT_BATCH_SIZE", "32"))
+
+# ==============================
+# BACKEND D'INFÉRENCE CPU
+# ==============================
+
+# Exécution des embeddings et du cross-encoder: torch (float32), onnx (onnxruntime)
+# ou int8 (quantification dynamique). Vérifier la parité avec scripts/bench_inference.py.
+INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "torch").lower()
+EMBEDDING_INFERENCE_BACKEND = os.getenv("EMBEDDING_INFERENCE_BACKEND", INFERENCE_BACKEND).lower()
+RERANK_INFERENCE_BACKEND = os.getenv("RERANK_INFERENCE_BACKEND", INFERENCE_BACKEND).lower()
+
+# ==============================
+# RECHERCHE ADAPTATIVE
+# ==============================
+
+# Seuil de distance, élargissement de k et reranking conditionnel (0 = k fixe, tout reranker)
+RETRIEVAL_ADAPTIVE = bool(int(os.getenv("RETRIEVAL_ADAPTIVE", "1")))
+
+# Distance L2² maximale d'un chunk retenu (vecteurs normalisés: 1.2 ~ cosinus 0.4)
+RETRIEVAL_MAX_DISTANCE = float(os.getenv("RETRIEVAL_MAX_DISTANCE", "1.2"))
+
+# Chunks conservés même si tous dépassent le seuil (les plus proches)
+RETRIEVAL_MIN_DOCS = int(os.getenv("RETRIEVAL_MIN_DOCS", "1"))
+
+# Candidats recherchés quand le 1er et le k-ième sont à moins de RETRIEVAL_CLOSE_MARGIN
+RETRIEVAL_MAX_K = int(os.getenv("RETRIEVAL_MAX_K", "12"))
+RETRIEVAL_CLOSE_MARGIN = float(os.getenv("RETRIEVAL_CLOSE_MARGIN", "0.05"))
+
+# Reranking sauté quand le 1er candidat devance le 2e d'au moins cette distance
+RERANK_SKIP_MARGIN = float(os.getenv("RERANK_SKIP_MARGIN", "0.25"))
+
+# ==============================
+# RECHERCHE HYBRIDE BM25 + VECTEURS
+# ==============================
+
+# Index BM25 des chunks (termes exacts: noms INCI, codes CI) fusionné avec la
+# recherche vectorielle par reciprocal rank fusion avant le reranking
+HYBRID_RETRIEVAL = bool(int(os.getenv("HYBRID_RETRIEVAL", "1")))
+
+# Candidats lexicaux par question, et constante k de la fusion RRF (1 / (k + rang))
+BM25_TOP_K = int(os.getenv("BM25_TOP_K", "6"))
+RRF_K = int(os.getenv("RRF_K", "60"))
+
+# ==============================
+# RAG-FUSION MULTI-REQUÊTES
+# ==============================
+
+# Reformulations de la question recherchées en parallèle puis fusionnées (RRF):
+# off, local (synonymes INCI / noms français, sans appel réseau) ou llm
+MULTI_QUERY_MODE = os.getenv("MULTI_QUERY_MODE", "off").lower()
+MULTI_QUERY_VARIANTS = int(os.getenv("MULTI_QUERY_VARIANTS", "3"))
+
+# Threads de recherche des reformulations, et délai de l'appel LLM (mode llm)
+MULTI_QUERY_WORKERS = int(os.getenv("MULTI_QUERY_WORKERS", "4"))
+MULTI_QUERY_LLM_TIMEOUT_SECONDS = float(os.getenv("MULTI_QUERY_LLM_TIMEOUT_SECONDS", "8"))
+
+# ==============================
+# RECHERCHE FILTRÉE PAR MÉTADONNÉES
+# ==============================
+
+# En dessous de ce nombre de chunks retenus par le filtre, les distances sont
+# calculées directement sur leurs vecteurs; au-delà, IDSelector FAISS
+METADATA_FILTER_BRUTE_FORCE_MAX = int(os.getenv("METADATA_FILTER_BRUTE_FORCE_MAX", "4096"))
+
+# ==============================
+# INDEX APPROXIMATIF (IVF / HNSW)
+# ==============================
+
+# auto: index exact (flat) puis promotion en ivf_flat / ivf_pq selon la taille;
+# ou type imposé: flat, ivf_flat, ivf_pq, hnsw
+ANN_INDEX_TYPE = os.getenv("ANN_INDEX_TYPE", "auto").lower()
+ANN_IVF_MIN_VECTORS = int(os.getenv("ANN_IVF_MIN_VECTORS", "50000"))
+ANN_PQ_MIN_VECTORS = int(os.getenv("ANN_PQ_MIN_VECTORS", "1000000"))
+
+# Construction: cellules IVF (0 = ~4*sqrt(n)), sous-quantificateurs PQ, voisins HNSW
+ANN_NLIST = int(os.getenv("ANN_NLIST", "0"))
+ANN_PQ_M = int(os.getenv("ANN_PQ_M", "48"))
+ANN_PQ_NBITS = int(os.getenv("ANN_PQ_NBITS", "8"))
+ANN_HNSW_M = int(os.getenv("ANN_HNSW_M", "32"))
+ANN_HNSW_EF_CONSTRUCTION = int(os.getenv("ANN_HNSW_EF_CONSTRUCTION", "200"))
+
+# Recherche: cellules explorées (IVF) et largeur du parcours (HNSW); rappel vs latence
+ANN_NPROBE = int(os.getenv("ANN_NPROBE", "16"))
+ANN_HNSW_EF_SEARCH = int(os.getenv("ANN_HNSW_EF_SEARCH", "128"))
+
+# ==============================
+# INDEX PARTAGÉ ENTRE WORKERS
+# ==============================
+
+# Index FAISS ouvert en mmap (lecture seule) au chargement: les workers gunicorn
+# partagent les pages via le cache du système; copié en mémoire au premier ajout
+INDEX_MMAP = bool(int(os.getenv("INDEX_MMAP", "1")))
+
+# Index au format précédent (index.pkl: docstore picklé, tel que livré dans
+# index/arx_faiss): chargement refusé, conversion avec scripts/migrate_index.py.
+# 1: conversion au premier chargement (désérialise index.pkl au démarrage)
+INDEX_AUTO_MIGRATE = bool(int(os.getenv("INDEX_AUTO_MIGRATE", "0")))
+
+# ==============================
+# SUPPRESSION / REMPLACEMENT DE DOCUMENTS
+# ==============================
+
+# Chunks des documents supprimés ou remplacés marqués (tombstones) et exclus des
+# recherches; l'index est compacté (reconstruit sans eux) quand leur nombre
+# atteint le minimum et la proportion de l'index
+INDEX_COMPACTION_MIN_DELETED = int(os.getenv("INDEX_COMPACTION_MIN_DELETED", "1000"))
+INDEX_COMPACTION_DELETED_RATIO = float(os.getenv("INDEX_COMPACTION_DELETED_RATIO", "0.2"))
@@ -9,7 +9,7 @@ import time
 import logging
 from typing import List, Dict, Tuple
 from datetime import datetime
-import google.generativeai as genai
+from .llm_backend import LLMBackend, get_llm_backend
 
 logger = logging.getLogger(__name__)
 
@@ -17,10 +17,10 @@ logger = logging.getLogger(__name__)
 class DataExtractor:
     """Classe pour extraire les ingrédients des PDF, images et audio"""
     
-    def __init__(self, api_key: str):
+    def __init__(self, api_key: str, llm: LLMBackend = None):
         self.api_key = api_key
-        genai.configure(api_key=api_key)
-        self.model = genai.GenerativeModel('gemini-2.5-pro')
+        # Backend de la route "extraction" (Gemini par défaut, voir LLM_BACKEND_EXTRACTION)
+        self.llm = llm or get_llm_backend("extraction", api_key=api_key)
     
     def extract_from_pdf(self, pdf_path: str) -> Tuple[str, Dict]:
         """
@@ -101,7 +101,7 @@ Texte à analyser:
 
 Retournez UNIQUEMENT le JSON sans autre texte."""
             
-            response = self.model.generate_content(prompt)
+            response = self.llm.generate(prompt)
             
             # Extraire le JSON de la réponse
             response_text = response.text
@@ -153,7 +153,7 @@ Retournez UNIQUEMENT le JSON sans autre texte."""
 
 Retournez UNIQUEMENT le JSON sans autre texte."""
             
-            response = self.model.generate_content([prompt, {'mime_type': 'image/jpeg', 'data': image_data}])
+            response = self.llm.generate([prompt, {'mime_type': 'image/jpeg', 'data': image_data}])
             
             response_text = response.text
             start_idx = response_text.find('{')
@@ -199,7 +199,7 @@ Texte:
 
 Retournez UNIQUEMENT le JSON sans autre texte."""
             
-            response = self.model.generate_content(prompt)
+            response = self.llm.generate(prompt)
             response_text = response.text
             
             start_idx = response_text.find('[')
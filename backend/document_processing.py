@@ -6,6 +6,7 @@ from PyPDF2 import PdfReader
 from docx import Document as DocxDocument
 from PIL import Image
 from nltk.tokenize import sent_tokenize
+from .chunking import chunk_sentences
 from .config import CACHE_DIR, MAX_FILE_SIZE_MB
 import hashlib
 
@@ -110,44 +111,15 @@ def chunk_text_semantically(text, max_tokens=500, overlap_tokens=100, tokenizer=
     Returns:
         list: Liste des chunks de texte
     """
-    # Tokenization en phrases avec NLTK
-    sentences = sent_tokenize(text)
-    chunks = []
-    current_chunk = []
-    current_len = 0
-
-    for sentence in sentences:
-        # Calcul du nombre de tokens dans la phrase
-        sent_tokens = len(tokenizer.encode(sentence)) if tokenizer else len(sentence.split())
-
-        # Vérification si l'ajout dépasse la limite
-        if current_len + sent_tokens > max_tokens:
-            # Sauvegarde du chunk courant
-            chunks.append(" ".join(current_chunk))
-            
-            # Calcul du chevauchement sémantique
-            overlap = []
-            token_sum = 0
-            # Parcours inversé pour prendre les dernières phrases
-            for sent in reversed(current_chunk):
-                token_sum += len(tokenizer.encode(sent)) if tokenizer else len(sent.split())
-                overlap.insert(0, sent)  # Insertion au début pour préserver l'ordre
-                if token_sum >= overlap_tokens:
-                    break
-            
-            # Nouveau chunk commence avec le chevauchement
-            current_chunk = overlap
-            current_len = sum(len(tokenizer.encode(s)) if tokenizer else len(s.split()) for s in current_chunk)
-
-        # Ajout de la phrase au chunk courant
-        current_chunk.append(sentence)
-        current_len += sent_tokens
-
-    # Ajout du dernier chunk s'il n'est pas vide
-    if current_chunk:
-        chunks.append(" ".join(current_chunk))
-
-    return chunks
+    # Comptage en tokens si un tokenizer est fourni, sinon en mots
+    if tokenizer:
+        count_tokens = lambda sentence: len(tokenizer.encode(sentence))
+    else:
+        count_tokens = lambda sentence: len(sentence.split())
+
+    # Tokenization en phrases avec NLTK, puis regroupement incrémental
+    # (chaque phrase n'est comptée qu'une seule fois)
+    return chunk_sentences(sent_tokenize(text), max_tokens, overlap_tokens, count_tokens)
 
 # ==============================
 # TRANSCRIPTION AUDIO AVEC WHISPER
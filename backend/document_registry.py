@@ -0,0 +1,199 @@
+"""
+Registre persistant des documents indexés dans FAISS
+Associe chaque document_id à ses chunks pour des vérifications de doublon en O(1)
+"""
+
+import os
+import json
+import logging
+import threading
+from typing import Dict, Iterable, List, Optional
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+
+class DocumentRegistry:
+    """Registre document_id -> chunks, titre, source, hash du contenu et date d'indexation"""
+
+    FILENAME = "registry.json"
+
+    def __init__(self, index_path: str):
+        self.index_path = index_path
+        self.path = os.path.join(index_path, self.FILENAME)
+        self._documents: Dict[str, Dict] = {}
+        self._lock = threading.RLock()
+
+    def __contains__(self, document_id) -> bool:
+        with self._lock:
+            return document_id in self._documents
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._documents)
+
+    def get(self, document_id: str) -> Optional[Dict]:
+        """Retourne l'entrée du registre pour un document, ou None"""
+        with self._lock:
+            entry = self._documents.get(document_id)
+            return dict(entry) if entry else None
+
+    def document_ids(self) -> set:
+        """Ensemble des document_id connus"""
+        with self._lock:
+            return set(self._documents)
+
+    def chunk_count(self) -> int:
+        """Nombre total de chunks référencés par le registre"""
+        with self._lock:
+            return sum(len(entry["chunk_ids"]) for entry in self._documents.values())
+
+    def list_documents(self) -> List[Dict]:
+        """Liste des documents indexés (sans la liste détaillée des chunks)"""
+        with self._lock:
+            return [
+                {
+                    "document_id": document_id,
+                    "title": entry.get("title"),
+                    "source": entry.get("source"),
+                    "content_hash": entry.get("content_hash"),
+                    "indexed_at": entry.get("indexed_at"),
+                    "chunks": len(entry["chunk_ids"]),
+                }
+                for document_id, entry in self._documents.items()
+            ]
+
+    def register(self, document_id: str, chunk_ids: List[str], title: str = None,
+                 source: str = None, content_hash: str = None) -> None:
+        """Enregistre (ou complète) un document et les identifiants docstore de ses chunks"""
+        with self._lock:
+            entry = self._documents.get(document_id)
+            if entry is None:
+                entry = {
+                    "chunk_ids": [],
+                    "title": title,
+                    "source": source,
+                    "content_hash": content_hash,
+                    "indexed_at": datetime.utcnow().isoformat(),
+                }
+                self._documents[document_id] = entry
+            entry["chunk_ids"].extend(chunk_ids)
+
+    def update(self, document_id: str, **fields) -> None:
+        """Met à jour les informations d'un document déjà enregistré (hors chunks)"""
+        with self._lock:
+            entry = self._documents.get(document_id)
+            if entry is not None:
+                entry.update({k: v for k, v in fields.items() if k != "chunk_ids"})
+
+    def remove(self, document_id: str) -> Optional[Dict]:
+        """Retire un document du registre et retourne son entrée"""
+        with self._lock:
+            return self._documents.pop(document_id, None)
+
+    def restore(self, document_id: str, entry: Dict) -> None:
+        """Réinsère une entrée retirée (annulation d'un remplacement)"""
+        with self._lock:
+            self._documents[document_id] = {**entry, "chunk_ids": list(entry["chunk_ids"])}
+
+    def rename_chunks(self, new_ids: Dict[str, str]) -> None:
+        """Renomme les identifiants docstore des chunks (conversion de format d'index)"""
+        with self._lock:
+            for entry in self._documents.values():
+                entry["chunk_ids"] = [new_ids.get(chunk_id, chunk_id) for chunk_id in entry["chunk_ids"]]
+
+    def renumbered(self, new_ids: Dict[str, str]) -> "DocumentRegistry":
+        """
+        Copie du registre aux identifiants de chunks renumérotés (compaction);
+        les chunks absents de `new_ids`, supprimés, sont retirés.
+        """
+        registry = DocumentRegistry(self.index_path)
+        with self._lock:
+            registry._documents = {
+                document_id: {
+                    **entry,
+                    "chunk_ids": [new_ids[chunk_id] for chunk_id in entry["chunk_ids"] if chunk_id in new_ids],
+                }
+                for document_id, entry in self._documents.items()
+            }
+        return registry
+
+    def clear(self) -> None:
+        with self._lock:
+            self._documents = {}
+
+    def load(self, expected_chunks: int = None) -> bool:
+        """
+        Charge le registre depuis le disque.
+
+        Args:
+            expected_chunks: Nombre de vecteurs de l'index; si le registre a été
+                sauvegardé pour un autre état de l'index, il est considéré invalide
+
+        Returns:
+            bool: True si le registre est chargé et cohérent avec l'index
+        """
+        with self._lock:
+            self._documents = {}
+            if not os.path.exists(self.path):
+                return False
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    payload = json.load(f)
+            except Exception as e:
+                logger.warning(f"Registre illisible ({self.path}) : {e}")
+                return False
+            if expected_chunks is not None and payload.get("ntotal") != expected_chunks:
+                logger.warning("Registre désynchronisé de l'index FAISS")
+                return False
+            self._documents = payload.get("documents", {})
+            return True
+
+    def save(self, ntotal: int = None, directory: str = None) -> None:
+        """
+        Sauvegarde atomique du registre (fichier temporaire puis renommage).
+
+        Args:
+            ntotal: Nombre de vecteurs de l'index au moment de la sauvegarde
+            directory: Dossier cible (par défaut celui de l'index)
+        """
+        directory = directory or self.index_path
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, self.FILENAME)
+        tmp_path = f"{path}.tmp"
+        with self._lock:
+            payload = {"ntotal": ntotal, "documents": self._documents}
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(payload, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    def rebuild_from_docstore(self, vectorstore, deleted: Iterable[int] = ()) -> None:
+        """
+        Reconstruit le registre en parcourant une seule fois le docstore FAISS.
+        Utilisé pour migrer un index existant créé avant le registre.
+
+        Args:
+            deleted: Positions FAISS des chunks supprimés (tombstones), ignorées
+        """
+        documents: Dict[str, Dict] = {}
+        deleted = {int(position) for position in deleted}
+        for position in sorted(vectorstore.index_to_docstore_id):
+            if position in deleted:
+                continue
+            docstore_id = vectorstore.index_to_docstore_id[position]
+            doc = vectorstore.docstore.search(docstore_id)
+            metadata = getattr(doc, "metadata", None) or {}
+            document_id = metadata.get("document_id")
+            if not document_id:
+                continue
+            entry = documents.setdefault(document_id, {
+                "chunk_ids": [],
+                "title": metadata.get("title"),
+                "source": metadata.get("source"),
+                "content_hash": metadata.get("content_hash"),
+                "indexed_at": metadata.get("indexed_at"),
+            })
+            entry["chunk_ids"].append(docstore_id)
+        with self._lock:
+            self._documents = documents
+        logger.info(f"Registre reconstruit : {len(documents)} documents")
@@ -0,0 +1,250 @@
+"""
+Caches d'embeddings
+- chunks: hash(modèle + contenu) -> vecteur float32, fichiers append-only relus par memory-map
+- requêtes: LRU en mémoire question normalisée -> vecteur
+"""
+
+import os
+import re
+import json
+import hashlib
+import logging
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+try:
+    import fcntl  # Verrou inter-processus (workers gunicorn) sur les systèmes POSIX
+except ImportError:  # Windows: un seul processus écrit en pratique
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingStore:
+    """
+    Stockage disque des vecteurs d'un modèle donné.
+
+    - vectors.f32 : vecteurs float32 concaténés (lecture via np.memmap)
+    - keys.txt    : une ligne "clé rang" par vecteur
+    - meta.json   : modèle et dimension
+
+    Les vecteurs sont écrits avant les clés: après un crash, seules les
+    lignes complètes des deux fichiers sont conservées. Un vecteur partiel
+    en fin de fichier est tronqué avant l'ajout suivant.
+    """
+
+    def __init__(self, directory: str, model_name: str):
+        self.model_name = model_name
+        slug = re.sub(r"[^A-Za-z0-9_.-]+", "_", model_name)
+        self.directory = os.path.join(directory, slug)
+        self.vectors_path = os.path.join(self.directory, "vectors.f32")
+        self.keys_path = os.path.join(self.directory, "keys.txt")
+        self.meta_path = os.path.join(self.directory, "meta.json")
+        self.dim = None
+        self._rows: Dict[str, int] = {}
+        self._mmap = None
+        self._lock = threading.Lock()
+        os.makedirs(self.directory, exist_ok=True)
+        self._load()
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def key(self, text: str) -> str:
+        return hashlib.sha1(f"{self.model_name}\0{text}".encode("utf-8")).hexdigest()
+
+    def _load(self) -> None:
+        if os.path.exists(self.meta_path):
+            with open(self.meta_path, "r", encoding="utf-8") as f:
+                self.dim = json.load(f).get("dim")
+        if not self.dim or not os.path.exists(self.keys_path):
+            return
+        n_vectors = os.path.getsize(self.vectors_path) // (4 * self.dim) if os.path.exists(self.vectors_path) else 0
+        with open(self.keys_path, "r", encoding="utf-8") as f:
+            for line in f:
+                if not line.endswith("\n"):
+                    break  # Ligne interrompue par un crash
+                parts = line.split()
+                if len(parts) == 2 and int(parts[1]) < n_vectors:
+                    self._rows[parts[0]] = int(parts[1])
+        logger.info(f"Cache d'embeddings chargé : {len(self._rows)} vecteurs ({self.model_name})")
+
+    def _vectors(self):
+        """Vue memory-mapped des vecteurs, rouverte si le fichier a grossi"""
+        n_rows = os.path.getsize(self.vectors_path) // (4 * self.dim)
+        if self._mmap is None or self._mmap.shape[0] < n_rows:
+            self._mmap = np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(n_rows, self.dim))
+        return self._mmap
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, np.ndarray]:
+        """Vecteurs connus parmi `keys` (les clés absentes sont omises)"""
+        with self._lock:
+            rows = {key: self._rows[key] for key in keys if key in self._rows}
+            if not rows:
+                return {}
+            vectors = self._vectors()
+            return {key: np.array(vectors[row]) for key, row in rows.items()}
+
+    def put_many(self, items: List[Tuple[str, List[float]]]) -> None:
+        """Ajoute des vecteurs en fin de fichier"""
+        if not items:
+            return
+        matrix = np.asarray([vector for _, vector in items], dtype=np.float32)
+        with self._lock:
+            if self.dim is None:
+                self.dim = int(matrix.shape[1])
+                with open(self.meta_path, "w", encoding="utf-8") as f:
+                    json.dump({"model_name": self.model_name, "dim": self.dim}, f)
+            with open(self.vectors_path, "ab") as vf, open(self.keys_path, "ab") as kf:
+                if fcntl:
+                    fcntl.flock(vf, fcntl.LOCK_EX)
+                try:
+                    # Rang réel en fin de fichier (un autre worker a pu écrire entre-temps);
+                    # un vecteur partiel laissé par un crash est retiré pour garder l'alignement
+                    row_size = 4 * self.dim
+                    start_row = os.fstat(vf.fileno()).st_size // row_size
+                    vf.truncate(start_row * row_size)
+                    vf.seek(0, os.SEEK_END)
+                    vf.write(matrix.tobytes())
+                    vf.flush()
+                    _drop_partial_line(kf)
+                    kf.write("".join(f"{key} {start_row + i}\n" for i, (key, _) in enumerate(items)).encode("utf-8"))
+                    kf.flush()
+                finally:
+                    if fcntl:
+                        fcntl.flock(vf, fcntl.LOCK_UN)
+            for i, (key, _) in enumerate(items):
+                self._rows[key] = start_row + i
+
+
+def _drop_partial_line(f) -> None:
+    """Tronque un fichier ouvert en ajout binaire après son dernier saut de ligne"""
+    size = os.fstat(f.fileno()).st_size
+    if not size:
+        return
+    with open(f.name, "rb") as reader:
+        reader.seek(max(0, size - 4096))
+        tail = reader.read()
+    if tail.endswith(b"\n"):
+        return
+    f.truncate(size - len(tail) + tail.rfind(b"\n") + 1)
+
+
+def normalize_query(text: str) -> str:
+    """Forme canonique d'une question: NFC, minuscules, espaces réduits"""
+    return " ".join(unicodedata.normalize("NFC", text).lower().split())
+
+
+class QueryEmbeddingCache:
+    """LRU en mémoire question normalisée -> vecteur, avec compteurs de hits/miss"""
+
+    def __init__(self, max_size: int = 2048):
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional[List[float]]:
+        with self._lock:
+            vector = self._entries.get(key)
+            if vector is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return list(vector)
+
+    def put(self, key: str, vector: List[float]) -> None:
+        with self._lock:
+            self._entries[key] = list(vector)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else None,
+            "size": len(self._entries),
+            "max_size": self.max_size,
+        }
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Enveloppe un modèle d'embeddings: les chunks déjà vus ne repassent pas
+    par le modèle (cache disque) et les questions répétées sont servies par
+    un LRU en mémoire. Chaque cache est optionnel.
+    """
+
+    def __init__(self, base: Embeddings, store: EmbeddingStore = None,
+                 query_cache: QueryEmbeddingCache = None):
+        self.base = base
+        self.store = store
+        self.query_cache = query_cache
+        self.hits = 0
+        self.misses = 0
+        self._stats_lock = threading.Lock()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if self.store is None:
+            return self.base.embed_documents(texts)
+        keys = [self.store.key(text) for text in texts]
+        found = self.store.get_many(keys)
+        missing = [i for i, key in enumerate(keys) if key not in found]
+
+        computed = {}
+        if missing:
+            vectors = self.base.embed_documents([texts[i] for i in missing])
+            new_items = []
+            for i, vector in zip(missing, vectors):
+                computed[i] = vector
+                # Doublons dans un même lot: une seule écriture
+                if keys[i] not in found:
+                    found[keys[i]] = None
+                    new_items.append((keys[i], vector))
+            self.store.put_many(new_items)
+
+        with self._stats_lock:
+            self.hits += len(texts) - len(missing)
+            self.misses += len(missing)
+
+        return [
+            list(computed[i]) if i in computed else found[key].tolist()
+            for i, key in enumerate(keys)
+        ]
+
+    def embed_query(self, text: str) -> List[float]:
+        if self.query_cache is None:
+            return self.base.embed_query(text)
+        key = normalize_query(text)
+        vector = self.query_cache.get(key)
+        if vector is None:
+            # Le modèle (MiniLM, non sensible à la casse) embedde la forme normalisée
+            vector = self.base.embed_query(key)
+            self.query_cache.put(key, vector)
+        return vector
+
+    def stats(self) -> Dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else None,
+            "stored_vectors": len(self.store) if self.store is not None else 0,
+        }
@@ -0,0 +1,123 @@
+"""
+Conversion d'un index FAISS à l'ancien format vers le ChunkStore (sans pickle)
+L'ancien format est index.faiss + index.pkl (docstore LangChain picklé,
+FAISS.save_local). Le pickle est désérialisé une seule fois, pour la
+conversion: ne convertir qu'un index de confiance (celui livré avec le projet
+ou écrit par une version précédente de l'application).
+
+Les chunks sont réécrits par position FAISS; les identifiants de chunks du
+registre des documents et de l'index BM25 sont renumérotés, les autres fichiers
+(index.faiss, index des métadonnées) sont conservés. Écriture atomique: l'ancien
+dossier n'est remplacé qu'une fois la conversion complète.
+
+Utilisé par scripts/migrate_index.py et, si INDEX_AUTO_MIGRATE=1, au premier chargement.
+"""
+
+import os
+import shutil
+import pickle
+import logging
+from contextlib import contextmanager
+from typing import Callable, Dict, Tuple
+
+from langchain_core.documents import Document
+
+from .bm25_index import BM25Index
+from .chunk_store import ChunkStore
+from .document_registry import DocumentRegistry
+from .index_persistence import atomic_replace_dir
+
+logger = logging.getLogger(__name__)
+
+LEGACY_FILES = ("index.pkl",)
+
+
+def read_pickled_docstore(index_path: str) -> Tuple[Callable[[str], Document], Dict[int, str]]:
+    with open(os.path.join(index_path, "index.pkl"), "rb") as f:
+        docstore, index_to_docstore_id = pickle.load(f)
+    return docstore.search, index_to_docstore_id
+
+
+def is_legacy_index(index_path: str) -> bool:
+    return not ChunkStore.exists(index_path) and os.path.exists(os.path.join(index_path, "index.pkl"))
+
+
+@contextmanager
+def _migration_lock(index_path: str):
+    """Verrou inter-processus: un seul worker gunicorn convertit l'index"""
+    try:
+        import fcntl
+    except ImportError:  # Windows: un seul processus en développement
+        yield
+        return
+    with open(f"{index_path}.migrate.lock", "w") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def migrate_if_legacy(index_path: str) -> bool:
+    """
+    Conversion au premier chargement: les autres workers attendent la fin de
+    la conversion puis trouvent l'index au nouveau format.
+
+    Returns:
+        bool: True si l'index a été converti par ce processus
+    """
+    if not is_legacy_index(index_path):
+        return False
+    with _migration_lock(index_path):
+        if not is_legacy_index(index_path):
+            return False
+        logger.warning(f"Index à l'ancien format dans {index_path} : conversion au format ChunkStore...")
+        migrate_legacy_index(index_path)
+        return True
+
+
+def migrate_legacy_index(index_path: str, dry_run: bool = False) -> int:
+    """
+    Convertit l'index de `index_path` au format ChunkStore.
+
+    Returns:
+        int: Nombre de chunks convertis
+
+    Raises:
+        FileNotFoundError: Pas d'index à l'ancien format
+        RuntimeError: Index incohérent (nombre de vecteurs et d'identifiants différents)
+    """
+    import faiss
+    if not os.path.exists(os.path.join(index_path, "index.pkl")):
+        raise FileNotFoundError(f"Aucun index à l'ancien format dans {index_path}")
+    lookup, index_to_docstore_id = read_pickled_docstore(index_path)
+
+    index = faiss.read_index(os.path.join(index_path, "index.faiss"))
+    if len(index_to_docstore_id) != index.ntotal:
+        raise RuntimeError(f"Index incohérent : {index.ntotal} vecteurs, {len(index_to_docstore_id)} identifiants")
+
+    chunks = ChunkStore()
+    chunks.add({str(position): lookup(index_to_docstore_id[position]) for position in range(index.ntotal)})
+    new_ids = {index_to_docstore_id[position]: str(position) for position in range(index.ntotal)}
+    if dry_run:
+        return index.ntotal
+
+    def write(directory):
+        for name in os.listdir(index_path):
+            if name not in LEGACY_FILES:
+                shutil.copy2(os.path.join(index_path, name), os.path.join(directory, name))
+        chunks.save(directory)
+
+        registry = DocumentRegistry(directory)
+        # Désynchronisés, ils seraient de toute façon reconstruits au chargement
+        if registry.load(expected_chunks=index.ntotal):
+            registry.rename_chunks(new_ids)
+            registry.save(ntotal=index.ntotal)
+        sparse = BM25Index(directory)
+        if sparse.load(expected_chunks=index.ntotal):
+            sparse.rename_chunks(new_ids)
+            sparse.save(ntotal=index.ntotal)
+
+    atomic_replace_dir(index_path, write)
+    logger.info(f"Index converti au format ChunkStore : {index_path} ({index.ntotal} chunks)")
+    return index.ntotal
@@ -0,0 +1,181 @@
+"""
+Persistance différée (write-behind) de l'index FAISS
+Les ajouts restent en mémoire et sont écrits sur disque par lots, de façon atomique
+"""
+
+import os
+import shutil
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable
+
+logger = logging.getLogger(__name__)
+
+
+def recover_index_dir(target_dir: str) -> None:
+    """
+    Restaure l'index si un crash est survenu entre les deux renommages
+    d'une sauvegarde atomique, et supprime les dossiers temporaires orphelins.
+    """
+    backup_dir = f"{target_dir}.old"
+    if not os.path.exists(target_dir) and os.path.exists(backup_dir):
+        logger.warning("Sauvegarde interrompue détectée, restauration de l'index précédent")
+        os.replace(backup_dir, target_dir)
+    parent = os.path.dirname(target_dir) or "."
+    prefix = f"{os.path.basename(target_dir)}.tmp-"
+    for name in os.listdir(parent) if os.path.isdir(parent) else []:
+        if name.startswith(prefix):
+            shutil.rmtree(os.path.join(parent, name), ignore_errors=True)
+
+
+def atomic_replace_dir(target_dir: str, write_fn: Callable[[str], None]) -> None:
+    """
+    Écrit un dossier complet dans un répertoire temporaire puis le substitue
+    au dossier cible par renommage: un crash en cours d'écriture ne peut
+    pas laisser un index.faiss / chunks.* incohérent.
+
+    Args:
+        target_dir: Dossier final (ex: index/arx_faiss)
+        write_fn: Fonction qui écrit tous les fichiers dans le dossier reçu
+    """
+    tmp_dir = f"{target_dir}.tmp-{os.getpid()}-{threading.get_ident()}"
+    backup_dir = f"{target_dir}.old"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    try:
+        write_fn(tmp_dir)
+    except Exception:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+    shutil.rmtree(backup_dir, ignore_errors=True)
+    if os.path.exists(target_dir):
+        os.replace(target_dir, backup_dir)
+    os.replace(tmp_dir, target_dir)
+    shutil.rmtree(backup_dir, ignore_errors=True)
+
+
+class IndexFlusher:
+    """Déclenche la sauvegarde de l'index selon un seuil de chunks en attente ou un délai"""
+
+    def __init__(self, save_fn: Callable[[], None], max_pending: int = 2000,
+                 max_delay: float = 30.0):
+        """
+        Args:
+            save_fn: Fonction de sauvegarde complète de l'index
+            max_pending: Nombre de chunks non sauvegardés déclenchant une écriture
+            max_delay: Délai maximal (secondes) avant écriture des chunks en attente
+        """
+        self._save_fn = save_fn
+        self.max_pending = max_pending
+        self.max_delay = max_delay
+        self._pending = 0
+        self._dirty_since = None
+        self._deferred = 0
+        self._state_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.flush_count = 0
+        self.last_flush_at = None
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    def mark_dirty(self, n_chunks: int = 1) -> None:
+        """Signale des modifications en mémoire non encore écrites sur disque"""
+        with self._state_lock:
+            self._pending += n_chunks
+            if self._dirty_since is None:
+                self._dirty_since = time.monotonic()
+            threshold_reached = self._pending >= self.max_pending and not self._deferred
+        self._ensure_thread()
+        if threshold_reached:
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Erreur sauvegarde de l'index (seuil atteint) : {e}")
+
+    @contextmanager
+    def deferred(self):
+        """Suspend les écritures par seuil pendant un traitement par lot, puis écrit une seule fois"""
+        with self._state_lock:
+            self._deferred += 1
+        try:
+            yield self
+        finally:
+            with self._state_lock:
+                self._deferred -= 1
+                should_flush = not self._deferred
+            if should_flush:
+                try:
+                    self.flush()
+                except Exception as e:
+                    # Les chunks restent en attente; le thread de fond réessaiera
+                    logger.error(f"Erreur sauvegarde de l'index après traitement par lot : {e}")
+
+    def flush(self, force: bool = False) -> bool:
+        """
+        Écrit l'index sur disque s'il y a des modifications en attente.
+
+        Args:
+            force: Écrit même si aucune modification n'est en attente
+
+        Returns:
+            bool: True si une écriture a eu lieu
+        """
+        with self._flush_lock:
+            with self._state_lock:
+                pending = self._pending
+                if not pending and not force:
+                    return False
+                self._pending = 0
+                self._dirty_since = None
+            start = time.perf_counter()
+            try:
+                self._save_fn()
+            except Exception:
+                # Les modifications restent à écrire au prochain flush
+                with self._state_lock:
+                    self._pending += pending
+                    if self._dirty_since is None:
+                        self._dirty_since = time.monotonic()
+                raise
+            self.flush_count += 1
+            self.last_flush_at = time.time()
+            logger.info(f"Index sauvegardé ({pending} chunks en attente) en "
+                        f"{time.perf_counter() - start:.2f}s")
+            return True
+
+    def _ensure_thread(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="faiss-index-flusher", daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        interval = max(1.0, self.max_delay / 4)
+        while not self._stop.wait(interval):
+            with self._state_lock:
+                due = (
+                    self._dirty_since is not None
+                    and not self._deferred
+                    and time.monotonic() - self._dirty_since >= self.max_delay
+                )
+            if due:
+                try:
+                    self.flush()
+                except Exception as e:
+                    logger.error(f"Erreur sauvegarde différée de l'index : {e}")
+
+    def close(self) -> None:
+        """Arrête le thread de fond et écrit les modifications restantes (arrêt du serveur)"""
+        self._stop.set()
+        try:
+            self.flush()
+        except Exception as e:
+            logger.error(f"Erreur sauvegarde de l'index à l'arrêt : {e}")
@@ -0,0 +1,118 @@
+"""
+Référence versionnée vers l'index FAISS actif (copy-on-write)
+Un rechargement construit un nouvel index à part puis l'échange atomiquement
+"""
+
+import logging
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Dict, Optional
+
+from .rwlock import ReadWriteLock
+
+logger = logging.getLogger(__name__)
+
+
+class IndexHandle:
+    """Une version immuable de la référence: vectorstore FAISS + registre des documents (+ index BM25, métadonnées, tombstones)"""
+
+    def __init__(self, store, registry, version: int, source: str, sparse=None, metadata=None, tombstones=None):
+        self.store = store
+        self.registry = registry
+        self.sparse = sparse
+        self.metadata = metadata
+        # Positions des chunks supprimés, exclues des recherches jusqu'à la compaction
+        self.tombstones = tombstones
+        # Index FAISS projeté en lecture seule: copié en mémoire avant toute modification
+        self.mmapped = False
+        self.version = version
+        self.source = source
+        self.loaded_at = time.time()
+        # Verrou propre à cette version: les ajouts en place restent exclusifs
+        self.lock = ReadWriteLock()
+
+    def to_dict(self) -> Dict:
+        return {
+            "version": self.version,
+            "source": self.source,
+            "loaded_at": datetime.utcfromtimestamp(self.loaded_at).isoformat() + "Z",
+            "vectors": self.store.index.ntotal if self.store is not None else 0,
+            "documents": len(self.registry) if self.registry is not None else 0,
+        }
+
+
+class VersionedIndex:
+    """
+    Détient la version active de l'index.
+
+    Les lecteurs capturent `active` une fois par requête et terminent sur
+    cette version même si un échange a lieu entre-temps. Les rédacteurs
+    (ajouts, rechargement, reset) sont sérialisés par `writer_mutex`, ce qui
+    garantit qu'aucun ajout n'est perdu pendant la construction d'une
+    nouvelle version.
+    """
+
+    def __init__(self):
+        self._active: Optional[IndexHandle] = None
+        self._next_version = 1
+        self.writer_mutex = threading.RLock()
+        self._reload_lock = threading.Lock()
+        self._reload_thread: Optional[threading.Thread] = None
+        self.last_reload_error: Optional[str] = None
+        self.last_reload_seconds: Optional[float] = None
+
+    @property
+    def active(self) -> Optional[IndexHandle]:
+        return self._active
+
+    @property
+    def reload_in_progress(self) -> bool:
+        return self._reload_thread is not None and self._reload_thread.is_alive()
+
+    def swap(self, store, registry, source: str, sparse=None, metadata=None, tombstones=None) -> IndexHandle:
+        """Publie une nouvelle version; l'affectation de la référence est atomique"""
+        with self.writer_mutex:
+            handle = IndexHandle(store, registry, self._next_version, source, sparse, metadata, tombstones)
+            self._next_version += 1
+            previous = self._active
+            self._active = handle
+        logger.info(f"Index FAISS version {handle.version} active ({source}, "
+                    f"précédente: {previous.version if previous else None})")
+        return handle
+
+    def reload_async(self, build_fn: Callable[[], IndexHandle]) -> bool:
+        """
+        Lance `build_fn` dans un thread de fond.
+
+        Returns:
+            bool: False si un rechargement est déjà en cours
+        """
+        with self._reload_lock:
+            if self.reload_in_progress:
+                return False
+            self._reload_thread = threading.Thread(
+                target=self._run_reload, args=(build_fn,), name="faiss-index-reload", daemon=True
+            )
+            self._reload_thread.start()
+            return True
+
+    def _run_reload(self, build_fn: Callable[[], IndexHandle]) -> None:
+        start = time.perf_counter()
+        try:
+            build_fn()
+            self.last_reload_error = None
+        except Exception as e:
+            self.last_reload_error = str(e)
+            logger.error(f"Erreur rechargement de l'index en arrière-plan : {e}", exc_info=True)
+        finally:
+            self.last_reload_seconds = round(time.perf_counter() - start, 3)
+
+    def status(self) -> Dict:
+        handle = self._active
+        return {
+            "active": handle.to_dict() if handle else None,
+            "reload_in_progress": self.reload_in_progress,
+            "last_reload_seconds": self.last_reload_seconds,
+            "last_reload_error": self.last_reload_error,
+        }
@@ -0,0 +1,169 @@
+"""
+Backends d'inférence CPU pour les embeddings et le cross-encoder
+- torch: float32 PyTorch (historique),
+- onnx:  export ONNX exécuté par onnxruntime (sentence-transformers >= 3.2 pour
+         les embeddings, >= 4.1 pour le cross-encoder, extra optimum[onnxruntime]),
+- int8:  quantification dynamique int8 des couches Linear (torch, sans dépendance).
+
+Si le backend demandé n'est pas disponible, le modèle est chargé en torch avec
+un avertissement. La parité (vecteurs et classements) se vérifie avec
+scripts/bench_inference.py sur le jeu de requêtes fixe ci-dessous.
+"""
+
+import logging
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+INFERENCE_BACKENDS = ("torch", "onnx", "int8")
+
+# Jeu fixe pour la vérification de parité: chaque requête a ses passages candidats
+PARITY_QUERIES: List[Tuple[str, List[str]]] = [
+    ("Puis-je utiliser du rétinol avec de la vitamine C ?", [
+        "Le rétinol et l'acide ascorbique s'utilisent de préférence à des moments différents de la journée.",
+        "La vitamine C est un antioxydant qui protège la peau des radicaux libres le matin.",
+        "Le rétinol accélère le renouvellement cellulaire et s'applique le soir.",
+        "Une crème solaire SPF 50 est recommandée pendant un traitement au rétinol.",
+        "La glycérine est un humectant présent dans la plupart des crèmes hydratantes.",
+        "Le parfum peut irriter les peaux sensibles.",
+    ]),
+    ("Quel sérum pour une peau grasse à tendance acnéique ?", [
+        "La niacinamide à 5 % régule la production de sébum et réduit les imperfections.",
+        "L'acide salicylique désobstrue les pores des peaux grasses.",
+        "Les huiles végétales riches conviennent aux peaux très sèches.",
+        "L'acide hyaluronique hydrate sans alourdir la peau.",
+        "Le beurre de karité nourrit les lèvres gercées.",
+        "Le phénoxyéthanol est un conservateur autorisé jusqu'à 1 %.",
+    ]),
+    ("La niacinamide est-elle compatible avec les AHA ?", [
+        "La niacinamide et les acides de fruits (AHA) peuvent être associés si la peau les tolère.",
+        "Un pH très acide peut réduire l'efficacité de la niacinamide.",
+        "Les AHA exfolient la couche superficielle de l'épiderme.",
+        "Le tocophérol stabilise les formules contenant des huiles.",
+        "Le SPF mesure la protection contre les UVB.",
+        "Les tests dermatologiques sont réalisés sur peaux sensibles.",
+    ]),
+    ("Which sunscreen should I use after a chemical peel?", [
+        "After a chemical peel, apply a broad-spectrum mineral sunscreen SPF 50 daily.",
+        "Zinc oxide and titanium dioxide are gentle UV filters for sensitized skin.",
+        "Glycolic acid peels increase photosensitivity for several days.",
+        "Hyaluronic acid serums hold water in the skin.",
+        "Fragrance-free formulas reduce the risk of irritation.",
+        "Shea butter is rich in fatty acids.",
+    ]),
+]
+
+
+def _fallback(kind: str, backend: str, error: Exception) -> None:
+    logger.warning(f"Backend d'inférence '{backend}' indisponible pour {kind} ({error}); utilisation de torch")
+
+
+def quantize_dynamic_int8(module):
+    """Quantification dynamique int8 des couches Linear (poids int8, activations float)"""
+    import torch
+    return torch.quantization.quantize_dynamic(module, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+
+
+def load_embedding_model(model_name: str, backend: str = "torch"):
+    """
+    Modèle d'embeddings LangChain (HuggingFaceEmbeddings) pour le backend demandé.
+    """
+    from langchain_huggingface import HuggingFaceEmbeddings
+    if backend == "onnx":
+        try:
+            return HuggingFaceEmbeddings(model_name=model_name, model_kwargs={"backend": "onnx"})
+        except Exception as e:
+            _fallback("les embeddings", backend, e)
+    embeddings = HuggingFaceEmbeddings(model_name=model_name)
+    if backend == "int8":
+        try:
+            quantize_dynamic_int8(embeddings._client)
+        except Exception as e:
+            _fallback("les embeddings", backend, e)
+    return embeddings
+
+
+def load_cross_encoder(model_name: str, backend: str = "torch"):
+    """CrossEncoder sentence-transformers pour le backend demandé."""
+    from sentence_transformers import CrossEncoder
+    if backend == "onnx":
+        try:
+            return CrossEncoder(model_name, backend="onnx")
+        except Exception as e:
+            _fallback("le cross-encoder", backend, e)
+    encoder = CrossEncoder(model_name)
+    if backend == "int8":
+        try:
+            quantize_dynamic_int8(encoder.model)
+        except Exception as e:
+            _fallback("le cross-encoder", backend, e)
+    return encoder
+
+
+# ==============================
+# PARITÉ
+# ==============================
+
+def _cosine_rows(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    a = a / np.linalg.norm(a, axis=1, keepdims=True)
+    b = b / np.linalg.norm(b, axis=1, keepdims=True)
+    return np.sum(a * b, axis=1)
+
+
+def _ranking(query_vector, passage_vectors) -> List[int]:
+    q = np.asarray(query_vector, dtype=np.float32)
+    p = np.asarray(passage_vectors, dtype=np.float32)
+    scores = p @ q / (np.linalg.norm(p, axis=1) * np.linalg.norm(q))
+    return list(np.argsort(-scores))
+
+
+def _top_k_overlap(reference: Sequence[int], candidate: Sequence[int], k: int) -> float:
+    return len(set(reference[:k]) & set(candidate[:k])) / k
+
+
+def embedding_parity(reference, candidate, queries=PARITY_QUERIES, k: int = 3) -> Dict:
+    """
+    Compare deux modèles d'embeddings sur le jeu fixe.
+
+    Returns:
+        dict: cosinus min/moyen entre vecteurs des deux modèles, accord du
+              premier passage et recouvrement du top-k de la recherche
+    """
+    cosines, top1, overlap = [], [], []
+    for query, passages in queries:
+        texts = [query] + passages
+        ref = np.asarray(reference.embed_documents(texts), dtype=np.float32)
+        cand = np.asarray(candidate.embed_documents(texts), dtype=np.float32)
+        cosines.extend(_cosine_rows(ref, cand).tolist())
+        ref_rank, cand_rank = _ranking(ref[0], ref[1:]), _ranking(cand[0], cand[1:])
+        top1.append(ref_rank[0] == cand_rank[0])
+        overlap.append(_top_k_overlap(ref_rank, cand_rank, k))
+    return {
+        "min_cosine": round(float(np.min(cosines)), 5),
+        "mean_cosine": round(float(np.mean(cosines)), 5),
+        "top1_agreement": round(float(np.mean(top1)), 3),
+        f"top{k}_overlap": round(float(np.mean(overlap)), 3),
+    }
+
+
+def rerank_parity(reference, candidate, queries=PARITY_QUERIES, k: int = 3) -> Dict:
+    """
+    Compare deux cross-encoders sur le jeu fixe: écart maximal des scores,
+    accord du premier passage et recouvrement du top-k.
+    """
+    deltas, top1, overlap = [], [], []
+    for query, passages in queries:
+        pairs = [(query, passage) for passage in passages]
+        ref = np.asarray(reference.predict(pairs, show_progress_bar=False), dtype=np.float32)
+        cand = np.asarray(candidate.predict(pairs, show_progress_bar=False), dtype=np.float32)
+        deltas.append(float(np.max(np.abs(ref - cand))))
+        ref_rank, cand_rank = list(np.argsort(-ref)), list(np.argsort(-cand))
+        top1.append(ref_rank[0] == cand_rank[0])
+        overlap.append(_top_k_overlap(ref_rank, cand_rank, k))
+    return {
+        "max_score_delta": round(max(deltas), 5),
+        "top1_agreement": round(float(np.mean(top1)), 3),
+        f"top{k}_overlap": round(float(np.mean(overlap)), 3),
+    }
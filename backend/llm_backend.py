@@ -0,0 +1,421 @@
+"""
+Backends de génération de texte (LLM)
+Interface commune (synchrone, asynchrone, en flux) avec délai maximal et
+comptage des tokens, et choix du fournisseur par route via l'environnement:
+
+    LLM_BACKEND=fake                  # toutes les routes
+    LLM_BACKEND_COMPATIBILITY=gemini  # sauf /compatibility/*
+
+Routes utilisées: ask (RAG /ask), compatibility, extraction, legacy (rag_engine)
+"""
+
+import os
+import time
+import asyncio
+import hashlib
+import logging
+import threading
+from typing import Dict, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class LLMError(Exception):
+    """Erreur remontée par un backend LLM"""
+
+
+class LLMTimeoutError(LLMError, TimeoutError):
+    """La génération a dépassé le délai imparti"""
+
+
+_token_encoder = None
+
+
+def estimate_tokens(text: str) -> int:
+    """Nombre de tokens approximatif (encodeur gpt2), quand le fournisseur ne le donne pas"""
+    global _token_encoder
+    if not text:
+        return 0
+    if _token_encoder is None:
+        import tiktoken
+        _token_encoder = tiktoken.get_encoding("gpt2")
+    return len(_token_encoder.encode(text))
+
+
+def _prompt_text(prompt) -> str:
+    """Partie texte d'un prompt simple ou multimodal ([texte, {'mime_type', 'data'}])"""
+    if isinstance(prompt, str):
+        return prompt
+    return "\n".join(part for part in prompt if isinstance(part, str))
+
+
+class LLMResponse:
+    """Texte généré et consommation de l'appel"""
+
+    def __init__(self, text: str, prompt_tokens: int = 0, completion_tokens: int = 0,
+                 latency: float = 0.0, backend: str = None, model: str = None):
+        self.text = text
+        self.prompt_tokens = prompt_tokens
+        self.completion_tokens = completion_tokens
+        self.latency = latency
+        self.backend = backend
+        self.model = model
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+    def to_dict(self) -> Dict:
+        return {
+            "backend": self.backend,
+            "model": self.model,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "latency_seconds": round(self.latency, 3),
+        }
+
+
+class LLMBackend:
+    """
+    Interface commune des backends.
+
+    Les sous-classes implémentent `_generate` (et `_stream` si le fournisseur
+    sait produire la réponse au fil de l'eau); la mesure du temps, le délai
+    par défaut et le cumul des tokens sont gérés ici.
+    """
+
+    name = "base"
+
+    def __init__(self, model_name: str = None, timeout: float = None):
+        self.model_name = model_name
+        self.timeout = timeout
+        self._usage_lock = threading.Lock()
+        self._usage = {"calls": 0, "errors": 0, "prompt_tokens": 0, "completion_tokens": 0, "seconds": 0.0}
+
+    @property
+    def available(self) -> bool:
+        """False si le backend ne peut pas répondre (ex: clé API absente)"""
+        return True
+
+    # --- À implémenter par les backends ---
+
+    def _generate(self, prompt, timeout: Optional[float], **options) -> LLMResponse:
+        raise NotImplementedError
+
+    def _stream(self, prompt, timeout: Optional[float], usage: Dict, **options) -> Iterator[str]:
+        """Par défaut: génération complète renvoyée en un seul fragment"""
+        response = self._generate(prompt, timeout, **options)
+        usage["prompt_tokens"] = response.prompt_tokens
+        usage["completion_tokens"] = response.completion_tokens
+        yield response.text
+
+    # --- API publique ---
+
+    def generate(self, prompt, timeout: float = None, **options) -> LLMResponse:
+        """
+        Génère une réponse complète.
+
+        Args:
+            prompt: Texte, ou liste de parties (texte + images) pour les backends multimodaux
+            timeout: Délai maximal en secondes (par défaut celui du backend)
+
+        Returns:
+            LLMResponse: Texte et consommation de l'appel
+        """
+        start = time.perf_counter()
+        try:
+            response = self._generate(prompt, timeout or self.timeout, **options)
+        except Exception:
+            self._record(0, 0, time.perf_counter() - start, error=True)
+            raise
+        response.latency = time.perf_counter() - start
+        response.backend = self.name
+        response.model = response.model or self.model_name
+        self._record(response.prompt_tokens, response.completion_tokens, response.latency)
+        return response
+
+    def stream(self, prompt, timeout: float = None, **options) -> Iterator[str]:
+        """Génère la réponse fragment par fragment (les tokens sont comptés en fin de flux)"""
+        start = time.perf_counter()
+        usage = {"prompt_tokens": 0, "completion_tokens": 0}
+        parts = []
+        try:
+            for text in self._stream(prompt, timeout or self.timeout, usage, **options):
+                if text:
+                    parts.append(text)
+                    yield text
+        except Exception:
+            self._record(0, 0, time.perf_counter() - start, error=True)
+            raise
+        prompt_tokens = usage["prompt_tokens"] or estimate_tokens(_prompt_text(prompt))
+        completion_tokens = usage["completion_tokens"] or estimate_tokens("".join(parts))
+        self._record(prompt_tokens, completion_tokens, time.perf_counter() - start)
+
+    async def agenerate(self, prompt, timeout: float = None, **options) -> LLMResponse:
+        """Version asynchrone de `generate` (exécutée dans un thread)"""
+        return await asyncio.to_thread(self.generate, prompt, timeout, **options)
+
+    def _record(self, prompt_tokens: int, completion_tokens: int, seconds: float, error: bool = False) -> None:
+        with self._usage_lock:
+            self._usage["calls"] += 1
+            self._usage["errors"] += int(error)
+            self._usage["prompt_tokens"] += prompt_tokens
+            self._usage["completion_tokens"] += completion_tokens
+            self._usage["seconds"] += seconds
+
+    def stats(self) -> Dict:
+        with self._usage_lock:
+            usage = dict(self._usage)
+        usage["seconds"] = round(usage["seconds"], 3)
+        usage["avg_latency_seconds"] = round(usage["seconds"] / usage["calls"], 3) if usage["calls"] else None
+        usage.update({"backend": self.name, "model": self.model_name})
+        return usage
+
+
+class GeminiBackend(LLMBackend):
+    """Google Gemini via google-generativeai"""
+
+    name = "gemini"
+
+    def __init__(self, model_name: str = "models/gemini-2.5-pro", api_key: str = None, timeout: float = None):
+        super().__init__(model_name, timeout)
+        self.api_key = api_key if api_key is not None else os.getenv("GOOGLE_API_KEY", "")
+        self._model = None
+
+    @property
+    def available(self) -> bool:
+        return bool(self.api_key)
+
+    def _get_model(self):
+        if self._model is None:
+            from .startup_profiler import profiler
+            with profiler.step("google.generativeai", group="import"):
+                import google.generativeai as genai
+            genai.configure(api_key=self.api_key)
+            logger.info(f"Chargement du modèle Gemini {self.model_name}...")
+            self._model = genai.GenerativeModel(self.model_name)
+        return self._model
+
+    @staticmethod
+    def _request_options(timeout):
+        return {"timeout": timeout} if timeout else None
+
+    @staticmethod
+    def _usage(response, prompt, text):
+        metadata = getattr(response, "usage_metadata", None)
+        prompt_tokens = getattr(metadata, "prompt_token_count", 0) or estimate_tokens(_prompt_text(prompt))
+        completion_tokens = getattr(metadata, "candidates_token_count", 0) or estimate_tokens(text)
+        return prompt_tokens, completion_tokens
+
+    def _generate(self, prompt, timeout, **options) -> LLMResponse:
+        response = self._get_model().generate_content(prompt, request_options=self._request_options(timeout))
+        # Réponse bloquée (filtre de sécurité): aucune partie texte
+        if response.candidates and response.candidates[0].content.parts:
+            text = "".join(
+                part.text for part in response.candidates[0].content.parts if hasattr(part, "text")
+            )
+        else:
+            text = ""
+        prompt_tokens, completion_tokens = self._usage(response, prompt, text)
+        return LLMResponse(text, prompt_tokens, completion_tokens)
+
+    def _stream(self, prompt, timeout, usage, **options) -> Iterator[str]:
+        response = self._get_model().generate_content(
+            prompt, stream=True, request_options=self._request_options(timeout)
+        )
+        chunk = None
+        for chunk in response:
+            try:
+                yield chunk.text
+            except ValueError:
+                # Bloc sans partie texte (filtre de sécurité, fin de flux)
+                continue
+        metadata = getattr(chunk, "usage_metadata", None)
+        usage["prompt_tokens"] = getattr(metadata, "prompt_token_count", 0) or 0
+        usage["completion_tokens"] = getattr(metadata, "candidates_token_count", 0) or 0
+
+
+class MPTBackend(LLMBackend):
+    """Modèle local MPT (transformers, CPU), chargé au premier appel"""
+
+    name = "mpt"
+
+    def __init__(self, model_name: str = "mosaicml/mpt-7b-instruct", timeout: float = None):
+        super().__init__(model_name, timeout)
+        self._tokenizer = None
+        self._model = None
+        self._load_lock = threading.Lock()
+
+    def _load(self):
+        with self._load_lock:
+            if self._model is None:
+                import torch
+                from transformers import AutoModelForCausalLM, AutoTokenizer
+                logger.info(f"Chargement du modèle {self.model_name}...")
+                self._tokenizer = AutoTokenizer.from_pretrained(self.model_name)
+                self._model = AutoModelForCausalLM.from_pretrained(
+                    self.model_name,
+                    device_map="cpu",            # Spécifique Windows/CPU - pas de support GPU
+                    torch_dtype=torch.float32,   # Précision simple pour stabilité sur CPU
+                    low_cpu_mem_usage=True       # Réduction consommation mémoire lors du chargement
+                )
+        return self._tokenizer, self._model
+
+    def _generation_args(self, prompt, timeout, max_tokens):
+        if not isinstance(prompt, str):
+            raise LLMError("Le backend MPT ne prend en charge que les prompts texte")
+        tokenizer, model = self._load()
+        inputs = tokenizer(prompt, return_tensors="pt")
+        kwargs = dict(inputs, max_new_tokens=max_tokens)
+        if timeout:
+            # transformers interrompt la génération au-delà de max_time secondes
+            kwargs["max_time"] = timeout
+        return tokenizer, model, inputs, kwargs
+
+    def _generate(self, prompt, timeout, max_tokens: int = 512, **options) -> LLMResponse:
+        tokenizer, model, inputs, kwargs = self._generation_args(prompt, timeout, max_tokens)
+        outputs = model.generate(**kwargs)
+        prompt_tokens = int(inputs["input_ids"].shape[1])
+        completion_tokens = int(outputs.shape[1]) - prompt_tokens
+        return LLMResponse(tokenizer.decode(outputs[0], skip_special_tokens=True), prompt_tokens, completion_tokens)
+
+    def _stream(self, prompt, timeout, usage, max_tokens: int = 512, **options) -> Iterator[str]:
+        from transformers import TextIteratorStreamer
+        tokenizer, model, inputs, kwargs = self._generation_args(prompt, timeout, max_tokens)
+        streamer = TextIteratorStreamer(tokenizer, skip_prompt=True, skip_special_tokens=True)
+        thread = threading.Thread(target=model.generate, kwargs=dict(kwargs, streamer=streamer), daemon=True)
+        thread.start()
+        yield from streamer
+        thread.join()
+        usage["prompt_tokens"] = int(inputs["input_ids"].shape[1])
+
+
+class FakeLLMBackend(LLMBackend):
+    """
+    Backend local déterministe pour les tests de charge hors ligne.
+
+    La réponse dépend uniquement du prompt (même prompt -> même texte) et sa
+    durée est simulée: `latency` secondes avant le premier token, puis
+    `token_interval` secondes entre deux tokens.
+    """
+
+    name = "fake"
+
+    WORDS = ("peau", "crème", "sérum", "ingrédient", "formule", "tolérance", "hydratation",
+             "niacinamide", "rétinol", "application", "protection", "compatibilité")
+
+    def __init__(self, latency: float = 0.5, tokens: int = 80, token_interval: float = 0.0,
+                 timeout: float = None):
+        super().__init__("fake-deterministic", timeout)
+        self.latency = latency
+        self.tokens = tokens
+        self.token_interval = token_interval
+
+    def _words(self, prompt):
+        digest = hashlib.sha256(_prompt_text(prompt).encode("utf-8")).digest()
+        words = [self.WORDS[digest[i % len(digest)] % len(self.WORDS)] for i in range(self.tokens)]
+        return [f"Réponse simulée ({digest.hex()[:8]}) :"] + words
+
+    def _wait(self, seconds, deadline):
+        if deadline is not None and time.monotonic() + seconds > deadline:
+            time.sleep(max(0.0, deadline - time.monotonic()))
+            raise LLMTimeoutError("Délai dépassé (backend simulé)")
+        if seconds > 0:
+            time.sleep(seconds)
+
+    def _generate(self, prompt, timeout, **options) -> LLMResponse:
+        words = self._words(prompt)
+        deadline = time.monotonic() + timeout if timeout else None
+        self._wait(self.latency + self.token_interval * len(words), deadline)
+        text = " ".join(words) + "."
+        # Comptage en mots: aucun encodeur à télécharger hors ligne
+        return LLMResponse(text, len(_prompt_text(prompt).split()), len(words))
+
+    def _stream(self, prompt, timeout, usage, **options) -> Iterator[str]:
+        words = self._words(prompt)
+        deadline = time.monotonic() + timeout if timeout else None
+        self._wait(self.latency, deadline)
+        for i, word in enumerate(words):
+            if i:
+                self._wait(self.token_interval, deadline)
+            yield word if i == 0 else f" {word}"
+        yield "."
+        usage["prompt_tokens"] = len(_prompt_text(prompt).split())
+        usage["completion_tokens"] = len(words)
+
+
+# ==============================
+# SÉLECTION DU BACKEND PAR ROUTE
+# ==============================
+
+# Backend par défaut de chaque route quand rien n'est configuré
+ROUTE_DEFAULTS = {
+    "ask": "gemini",
+    "compatibility": "gemini",
+    "extraction": "gemini",
+    "legacy": "mpt",
+}
+
+_backends: Dict[tuple, LLMBackend] = {}
+_backends_lock = threading.Lock()
+
+
+def backend_name_for_route(route: str) -> str:
+    """LLM_BACKEND_<ROUTE>, sinon LLM_BACKEND, sinon le défaut de la route"""
+    from .config import LLM_BACKEND
+    return (
+        os.getenv(f"LLM_BACKEND_{route.upper()}")
+        or LLM_BACKEND
+        or ROUTE_DEFAULTS.get(route, "gemini")
+    ).lower()
+
+
+def _create_backend(name: str, api_key: str = None) -> LLMBackend:
+    from .config import (
+        LLM_TIMEOUT_SECONDS,
+        GEMINI_MODEL_NAME,
+        MPT_MODEL_NAME,
+        FAKE_LLM_LATENCY_SECONDS,
+        FAKE_LLM_TOKENS,
+        FAKE_LLM_TOKEN_INTERVAL_SECONDS,
+    )
+    if name == "gemini":
+        return GeminiBackend(GEMINI_MODEL_NAME, api_key=api_key, timeout=LLM_TIMEOUT_SECONDS)
+    if name == "mpt":
+        return MPTBackend(MPT_MODEL_NAME, timeout=LLM_TIMEOUT_SECONDS)
+    if name == "fake":
+        return FakeLLMBackend(
+            latency=FAKE_LLM_LATENCY_SECONDS,
+            tokens=FAKE_LLM_TOKENS,
+            token_interval=FAKE_LLM_TOKEN_INTERVAL_SECONDS,
+            timeout=LLM_TIMEOUT_SECONDS,
+        )
+    raise ValueError(f"Backend LLM inconnu : {name}")
+
+
+def get_llm_backend(route: str = "ask", api_key: str = None) -> LLMBackend:
+    """
+    Backend configuré pour une route (instance partagée par nom de backend).
+
+    Args:
+        route: ask, compatibility, extraction ou legacy
+        api_key: Clé API explicite (Gemini); par défaut GOOGLE_API_KEY
+    """
+    name = backend_name_for_route(route)
+    if name == "gemini":
+        api_key = api_key or os.getenv("GOOGLE_API_KEY", "")
+    key = (name, api_key if name == "gemini" else None)
+    with _backends_lock:
+        backend = _backends.get(key)
+        if backend is None:
+            backend = _create_backend(name, api_key=api_key)
+            _backends[key] = backend
+            logger.info(f"Backend LLM '{name}' initialisé pour la route '{route}'")
+        return backend
+
+
+def llm_usage_stats() -> list:
+    """Consommation cumulée (appels, tokens, temps) de chaque backend instancié"""
+    with _backends_lock:
+        backends = list(_backends.values())
+    return [backend.stats() for backend in backends]
@@ -0,0 +1,330 @@
+"""
+Résilience des appels LLM
+Nouvelles tentatives avec attente exponentielle aléatoire (jitter), délai total
+par requête, distinction erreurs transitoires / définitives, et disjoncteur
+(circuit breaker) par backend qui échoue immédiatement quand le fournisseur
+est en panne au lieu de faire attendre chaque requête.
+"""
+
+import time
+import random
+import logging
+import threading
+from typing import Callable, Dict, Optional
+
+from .llm_backend import LLMError, LLMTimeoutError
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitOpenError(LLMError):
+    """Le disjoncteur du backend est ouvert: appel refusé sans contacter le fournisseur"""
+
+
+class DeadlineExceededError(LLMError, TimeoutError):
+    """Le délai total de la requête est épuisé"""
+
+
+# Codes HTTP des erreurs transitoires (google.api_core.exceptions expose `.code`)
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+
+def is_retryable(error: Exception) -> bool:
+    """
+    True si une nouvelle tentative a des chances d'aboutir: délai dépassé,
+    erreur réseau, quota temporaire ou erreur serveur. Les erreurs de requête
+    (prompt invalide, clé refusée, réponse bloquée) sont définitives.
+    """
+    if isinstance(error, (CircuitOpenError, DeadlineExceededError)):
+        return False
+    if isinstance(error, (LLMTimeoutError, TimeoutError, ConnectionError)):
+        return True
+    code = getattr(error, "code", None)
+    if isinstance(code, int):
+        return code in RETRYABLE_STATUS_CODES
+    # Erreurs transitoires des clients HTTP sans code exploitable
+    return type(error).__name__ in {
+        "ServiceUnavailable", "TooManyRequests", "ResourceExhausted",
+        "DeadlineExceeded", "InternalServerError", "RetryError",
+    }
+
+
+class CircuitBreaker:
+    """
+    Disjoncteur à trois états:
+    - closed: appels autorisés; `failure_threshold` échecs transitoires consécutifs l'ouvrent,
+    - open: appels refusés pendant `reset_timeout` secondes,
+    - half_open: un seul appel d'essai; succès -> closed, échec -> open.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+        self.rejected = 0
+        self.opened_count = 0
+        self.last_state_change = None
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            self._refresh()
+            return self._state
+
+    def _refresh(self):
+        if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+            self._transition(self.HALF_OPEN)
+
+    def _transition(self, state):
+        if state != self._state:
+            logger.warning(f"Disjoncteur LLM '{self.name}' : {self._state} -> {state}")
+            self._state = state
+            self.last_state_change = time.time()
+
+    def allow(self) -> bool:
+        """True si un appel peut partir (compte le refus sinon)"""
+        with self._lock:
+            self._refresh()
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            self.rejected += 1
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._probe_in_flight = False
+            self._transition(self.CLOSED)
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            self._probe_in_flight = False
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    self.opened_count += 1
+                self._opened_at = time.monotonic()
+                self._transition(self.OPEN)
+
+    def release(self) -> None:
+        """Fin d'un appel ni réussi ni imputable au fournisseur (erreur définitive)"""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def stats(self) -> Dict:
+        with self._lock:
+            self._refresh()
+            return {
+                "state": self._state,
+                "consecutive_failures": self._failures,
+                "opened_count": self.opened_count,
+                "rejected": self.rejected,
+                "last_state_change": self.last_state_change,
+            }
+
+
+class RetryPolicy:
+    """
+    Nombre maximal de tentatives, attente exponentielle avec jitter complet
+    (uniforme entre 0 et min(max_delay, base_delay * 2**tentative)) et délai
+    total par requête.
+    """
+
+    def __init__(self, max_attempts: int = 3, base_delay: float = 0.5, max_delay: float = 4.0,
+                 deadline: float = 45.0):
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.deadline = deadline
+
+    def backoff(self, attempt: int) -> float:
+        """Attente avant la tentative `attempt + 1` (attempt commence à 0)"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    def start(self, breaker: CircuitBreaker = None) -> "RetryState":
+        return RetryState(self, breaker)
+
+    def call(self, fn: Callable[[Optional[float]], object], breaker: CircuitBreaker = None):
+        """
+        Exécute `fn(timeout)` avec nouvelles tentatives; `timeout` est le temps
+        restant avant le délai total (à transmettre au backend).
+
+        Raises:
+            CircuitOpenError, DeadlineExceededError, ou la dernière erreur de `fn`
+        """
+        retry = self.start(breaker)
+        while True:
+            timeout = retry.begin()
+            try:
+                result = fn(timeout)
+            except Exception as e:
+                retry.failed(e)
+                continue
+            retry.succeeded()
+            return result
+
+
+class RetryState:
+    """
+    Déroulement des tentatives d'une requête. Utilisé directement quand l'appel
+    ne tient pas dans une fonction (réponse en flux):
+
+        retry = policy.start(breaker)
+        while True:
+            timeout = retry.begin()   # lève si disjoncteur ouvert / délai épuisé
+            try:
+                ...
+                retry.succeeded()
+            except Exception as e:
+                retry.failed(e)       # attend, ou relève l'erreur si c'est fini
+                continue
+            finally:
+                retry.abandon()       # client parti (GeneratorExit): sonde libérée
+            break
+    """
+
+    def __init__(self, policy: RetryPolicy, breaker: CircuitBreaker = None):
+        self.policy = policy
+        self.breaker = breaker
+        self.attempt = 0
+        self._in_flight = False
+        self.deadline = time.monotonic() + policy.deadline if policy.deadline else None
+
+    def remaining(self) -> Optional[float]:
+        return None if self.deadline is None else self.deadline - time.monotonic()
+
+    def begin(self) -> Optional[float]:
+        """Autorise une tentative et renvoie le temps restant (timeout de l'appel)"""
+        remaining = self.remaining()
+        if remaining is not None and remaining <= 0:
+            _metrics.incr("deadline_exceeded")
+            raise DeadlineExceededError("Délai total de la requête LLM épuisé")
+        if self.breaker is not None and not self.breaker.allow():
+            _metrics.incr("circuit_rejections")
+            raise CircuitOpenError(f"Backend LLM '{self.breaker.name}' indisponible (disjoncteur ouvert)")
+        self.attempt += 1
+        self._in_flight = True
+        _metrics.incr("attempts")
+        return remaining
+
+    def succeeded(self) -> None:
+        self._in_flight = False
+        if self.breaker is not None:
+            self.breaker.record_success()
+        _metrics.incr("successes")
+
+    def failed(self, error: Exception, retry: bool = True) -> None:
+        """
+        Enregistre l'échec puis attend avant la tentative suivante, ou relève
+        `error` si elle est définitive, si les tentatives ou le délai sont épuisés,
+        ou si `retry` est False.
+        """
+        retryable = is_retryable(error)
+        self._in_flight = False
+        if self.breaker is not None:
+            # Seules les pannes du fournisseur comptent pour le disjoncteur
+            if retryable:
+                self.breaker.record_failure()
+            else:
+                self.breaker.release()
+        if not retryable:
+            _metrics.incr("fatal_errors")
+            raise error
+        if not retry or self.attempt >= self.policy.max_attempts:
+            _metrics.incr("exhausted")
+            raise error
+        if self.breaker is not None and self.breaker.state == CircuitBreaker.OPEN:
+            # Le disjoncteur vient de s'ouvrir: inutile d'attendre pour être refusé
+            _metrics.incr("exhausted")
+            raise error
+        delay = self.policy.backoff(self.attempt - 1)
+        remaining = self.remaining()
+        if remaining is not None and delay >= remaining:
+            _metrics.incr("deadline_exceeded")
+            raise error
+        _metrics.incr("retries")
+        logger.warning(f"Tentative LLM {self.attempt} échouée ({error}); nouvel essai dans {delay:.2f}s")
+        time.sleep(delay)
+
+    def abandon(self) -> None:
+        """
+        Tentative interrompue sans issue (client déconnecté, GeneratorExit):
+        libère la sonde du disjoncteur semi-ouvert. Sans effet si la tentative
+        a déjà été enregistrée par succeeded() ou failed().
+        """
+        if not self._in_flight:
+            return
+        self._in_flight = False
+        if self.breaker is not None:
+            self.breaker.release()
+        _metrics.incr("abandoned")
+
+
+class _Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {key: 0 for key in (
+            "attempts", "successes", "retries", "fatal_errors",
+            "exhausted", "deadline_exceeded", "circuit_rejections", "abandoned",
+        )}
+
+    def incr(self, key: str) -> None:
+        with self._lock:
+            self._counters[key] += 1
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return dict(self._counters)
+
+
+_metrics = _Metrics()
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_circuit_breaker(name: str) -> CircuitBreaker:
+    """Disjoncteur partagé d'un backend (par nom: gemini, mpt, fake)"""
+    from .config import LLM_BREAKER_FAILURE_THRESHOLD, LLM_BREAKER_RESET_SECONDS
+    with _breakers_lock:
+        breaker = _breakers.get(name)
+        if breaker is None:
+            breaker = CircuitBreaker(name, LLM_BREAKER_FAILURE_THRESHOLD, LLM_BREAKER_RESET_SECONDS)
+            _breakers[name] = breaker
+        return breaker
+
+
+def default_retry_policy(max_attempts: int = None) -> RetryPolicy:
+    """Politique configurée (LLM_RETRY_*, LLM_REQUEST_DEADLINE_SECONDS)"""
+    from .config import (
+        LLM_RETRY_MAX_ATTEMPTS,
+        LLM_RETRY_BASE_DELAY_SECONDS,
+        LLM_RETRY_MAX_DELAY_SECONDS,
+        LLM_REQUEST_DEADLINE_SECONDS,
+    )
+    return RetryPolicy(
+        max_attempts=max_attempts or LLM_RETRY_MAX_ATTEMPTS,
+        base_delay=LLM_RETRY_BASE_DELAY_SECONDS,
+        max_delay=LLM_RETRY_MAX_DELAY_SECONDS,
+        deadline=LLM_REQUEST_DEADLINE_SECONDS,
+    )
+
+
+def resilience_stats() -> Dict:
+    """Compteurs de tentatives et état des disjoncteurs"""
+    with _breakers_lock:
+        breakers = dict(_breakers)
+    stats = _metrics.snapshot()
+    stats["circuit_breakers"] = {name: breaker.stats() for name, breaker in breakers.items()}
+    return stats
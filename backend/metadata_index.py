@@ -0,0 +1,236 @@
+"""
+Index inversé des métadonnées des chunks FAISS pour la recherche filtrée
+Associe chaque valeur de métadonnée (document, type de source, produit, marque)
+aux positions FAISS des chunks qui la portent. Le filtre est résolu en un
+ensemble de positions avant la recherche, puis appliqué dans le parcours
+vectoriel (IDSelector FAISS, ou distances calculées sur les seuls vecteurs
+retenus quand ils sont peu nombreux): pas de sur-échantillonnage suivi d'un tri.
+
+Les positions FAISS sont celles des ajouts successifs (comme BM25); les chunks
+supprimés restent dans les postings et sont retirés de la sélection
+(tombstones) jusqu'à la compaction, qui reconstruit l'index.
+"""
+
+import os
+import json
+import logging
+import unicodedata
+from array import array
+from typing import Dict, Iterable, List, Mapping, Optional, Set
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Champs filtrables et clés de métadonnées dont ils sont tirés
+FILTER_FIELDS = {
+    "document_id": ("document_id",),
+    "source_type": ("source",),
+    "product": ("product", "products", "product_name"),
+    "brand": ("brand", "brands"),
+}
+
+
+def normalize_value(value) -> str:
+    """Minuscules sans accents ni espaces superflus ("Vitamine C " == "vitamine c")"""
+    text = unicodedata.normalize("NFKD", str(value).strip().lower())
+    return "".join(ch for ch in text if not unicodedata.combining(ch))
+
+
+def source_type(source: str) -> Optional[str]:
+    """Extension du fichier source sans le point ("brochure.PDF" -> "pdf")"""
+    ext = os.path.splitext(source or "")[1]
+    return ext[1:].lower() or None
+
+
+def chunk_tags(metadata: Mapping) -> Dict[str, Set[str]]:
+    """Valeurs filtrables d'un chunk, par champ"""
+    tags: Dict[str, Set[str]] = {}
+    for field, keys in FILTER_FIELDS.items():
+        values = set()
+        for key in keys:
+            raw = metadata.get(key)
+            if raw is None:
+                continue
+            for value in (raw if isinstance(raw, (list, tuple, set)) else [raw]):
+                if field == "source_type":
+                    value = source_type(value)
+                elif field != "document_id":
+                    value = normalize_value(value)
+                if value:
+                    values.add(value)
+        if values:
+            tags[field] = values
+    return tags
+
+
+def normalize_filters(filters: Optional[Mapping]) -> Dict[str, Set[str]]:
+    """
+    Filtres de requête {champ: valeur ou liste de valeurs}, normalisés comme à l'indexation.
+
+    Raises:
+        ValueError: Champ inconnu
+    """
+    normalized: Dict[str, Set[str]] = {}
+    for field, raw in (filters or {}).items():
+        if field not in FILTER_FIELDS:
+            raise ValueError(f"Filtre inconnu '{field}' (champs: {', '.join(FILTER_FIELDS)})")
+        if raw is None or raw == "" or raw == []:
+            continue
+        values = raw if isinstance(raw, (list, tuple, set)) else [raw]
+        if field == "document_id":
+            cleaned = {str(v).strip() for v in values}
+        elif field == "source_type":
+            cleaned = {str(v).strip().lstrip(".").lower() for v in values}
+        else:
+            cleaned = {normalize_value(v) for v in values}
+        cleaned.discard("")
+        if cleaned:
+            normalized[field] = cleaned
+    return normalized
+
+
+class MetadataIndex:
+    """
+    Postings champ -> valeur -> positions FAISS croissantes (array 'q').
+
+    Pas de verrou interne: comme le vectorstore et BM25, il est protégé par le
+    verrou lecteurs/rédacteur de la version d'index (IndexHandle.lock).
+    """
+
+    FILENAME = "metadata_index.json"
+
+    def __init__(self, index_path: str):
+        self.index_path = index_path
+        self._postings: Dict[str, Dict[str, array]] = {field: {} for field in FILTER_FIELDS}
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    # --- Construction ---
+
+    def add(self, position: int, metadata: Mapping) -> None:
+        for field, values in chunk_tags(metadata or {}).items():
+            postings = self._postings[field]
+            for value in values:
+                postings.setdefault(value, array("q")).append(position)
+        self._size = max(self._size, position + 1)
+
+    def add_many(self, first_position: int, metadatas: Iterable[Mapping]) -> None:
+        """Ajoute des chunks occupant des positions FAISS consécutives à partir de `first_position`"""
+        for offset, metadata in enumerate(metadatas):
+            self.add(first_position + offset, metadata)
+
+    def rebuild_from_docstore(self, vectorstore) -> None:
+        """Reconstruit l'index en parcourant une fois le docstore"""
+        self.__init__(self.index_path)
+        for position in sorted(vectorstore.index_to_docstore_id):
+            doc = vectorstore.docstore.search(vectorstore.index_to_docstore_id[position])
+            self.add(position, getattr(doc, "metadata", None) or {})
+        self._size = vectorstore.index.ntotal
+        logger.info(f"Index des métadonnées reconstruit : {self._size} chunks")
+
+    # --- Sélection ---
+
+    def values(self, field: str) -> List[str]:
+        """Valeurs connues d'un champ (pour proposer les filtres disponibles)"""
+        return sorted(self._postings.get(field, {}))
+
+    def select(self, filters: Mapping[str, Set[str]]) -> Optional[np.ndarray]:
+        """
+        Positions FAISS des chunks qui satisfont les filtres normalisés:
+        OU entre les valeurs d'un champ, ET entre les champs.
+
+        Returns:
+            np.ndarray (int64, trié) ou None sans filtre
+        """
+        selected = None
+        for field, values in filters.items():
+            postings = self._postings.get(field, {})
+            parts = [np.frombuffer(postings[value], dtype=np.int64) for value in values if value in postings]
+            positions = np.unique(np.concatenate(parts)) if parts else np.empty(0, dtype=np.int64)
+            selected = positions if selected is None else np.intersect1d(selected, positions, assume_unique=True)
+            if not len(selected):
+                break
+        return selected
+
+    # --- Persistance ---
+
+    def save(self, ntotal: int = None, directory: str = None) -> None:
+        """Sauvegarde atomique (fichier temporaire puis renommage)"""
+        directory = directory or self.index_path
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, self.FILENAME)
+        payload = {
+            "ntotal": ntotal,
+            "postings": {
+                field: {value: positions.tolist() for value, positions in postings.items()}
+                for field, postings in self._postings.items()
+            },
+        }
+        with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+            json.dump(payload, f, ensure_ascii=False)
+        os.replace(f"{path}.tmp", path)
+
+    def load(self, expected_chunks: int = None) -> bool:
+        """
+        Returns:
+            bool: True si l'index est chargé et couvre `expected_chunks` chunks
+        """
+        path = os.path.join(self.index_path, self.FILENAME)
+        if not os.path.exists(path):
+            return False
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                payload = json.load(f)
+        except Exception as e:
+            logger.warning(f"Index des métadonnées illisible ({path}) : {e}")
+            return False
+        if expected_chunks is not None and payload.get("ntotal") != expected_chunks:
+            logger.warning("Index des métadonnées désynchronisé de l'index FAISS")
+            return False
+        self._postings = {field: {} for field in FILTER_FIELDS}
+        for field, postings in payload.get("postings", {}).items():
+            if field in self._postings:
+                self._postings[field] = {value: array("q", positions) for value, positions in postings.items()}
+        self._size = payload.get("ntotal") or 0
+        return True
+
+    def stats(self) -> Dict:
+        return {field: len(postings) for field, postings in self._postings.items()}
+
+
+def filtered_search(index, query_vector, positions: np.ndarray, k: int, brute_force_max: int = 4096):
+    """
+    Recherche des k plus proches voisins parmi les seules `positions` d'un index FAISS.
+
+    Sous `brute_force_max` positions, les vecteurs retenus sont relus et comparés
+    directement (un document, une brochure); au-delà, un IDSelector restreint le
+    parcours de FAISS (plat, IVF ou HNSW). Distances L2 au carré, comme
+    similarity_search_with_score.
+
+    Returns:
+        list: (position, distance) par distance croissante
+    """
+    if not len(positions) or k <= 0:
+        return []
+    query = np.asarray(query_vector, dtype=np.float32).reshape(1, -1)
+    k = min(k, len(positions))
+
+    if len(positions) > brute_force_max:
+        import faiss
+        from .ann_index import search_parameters
+        try:
+            params = search_parameters(index, faiss.IDSelectorBatch(positions))
+            distances, ids = index.search(query, k, params=params)
+            return [(int(i), float(d)) for i, d in zip(ids[0], distances[0]) if i != -1]
+        except (AttributeError, TypeError, RuntimeError) as e:
+            # FAISS < 1.7.3 ou type d'index sans sélecteur: comparaison directe
+            logger.debug(f"IDSelector indisponible ({e}), comparaison directe")
+
+    vectors = index.reconstruct_batch(positions)
+    distances = np.sum((vectors - query) ** 2, axis=1)
+    best = np.argpartition(distances, k - 1)[:k] if k < len(positions) else np.arange(len(positions))
+    best = best[np.argsort(distances[best], kind="stable")]
+    return [(int(positions[i]), float(distances[i])) for i in best]
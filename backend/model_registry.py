@@ -0,0 +1,157 @@
+"""
+Registre des modèles et ressources lourdes
+Chaque composant (embeddings, cross-encoder, Whisper, BLIP, index FAISS) est
+chargé une seule fois, au premier usage ou par un préchauffage en arrière-plan
+lancé après le démarrage du serveur. Les bibliothèques lourdes (torch,
+transformers, whisper) ne sont importées que par les fonctions de chargement.
+"""
+
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, Optional
+
+from .startup_profiler import profiler
+
+logger = logging.getLogger(__name__)
+
+
+class _Component:
+    def __init__(self, name: str, loader: Callable[[], object]):
+        self.name = name
+        self.loader = loader
+        self.value = None
+        self.state = "pending"   # pending, loading, ready, failed
+        self.error: Optional[str] = None
+        self.exception: Optional[Exception] = None
+        self.failed_at: Optional[float] = None
+        self.load_seconds: Optional[float] = None
+        self.loaded_at: Optional[float] = None
+        self.lock = threading.Lock()
+
+    def to_dict(self) -> Dict:
+        return {
+            "state": self.state,
+            "load_seconds": round(self.load_seconds, 3) if self.load_seconds is not None else None,
+            "loaded_at": self.loaded_at,
+            "error": self.error,
+        }
+
+
+class ModelRegistry:
+    """
+    Chargement paresseux et thread-safe de composants nommés.
+
+    Deux threads qui demandent le même composant attendent le même chargement;
+    des composants différents se chargent en parallèle. Un échec est mémorisé
+    (état "failed"): l'erreur est relevée telle quelle pendant `retry_seconds`,
+    puis le chargement est retenté au prochain appel (ou plus tôt via retry).
+    """
+
+    def __init__(self, retry_seconds: float = 30.0):
+        self.retry_seconds = retry_seconds
+        self._components: Dict[str, _Component] = {}
+        self._warmup_thread: Optional[threading.Thread] = None
+
+    def register(self, name: str, loader: Callable[[], object]) -> None:
+        self._components[name] = _Component(name, loader)
+
+    def get(self, name: str):
+        """Valeur du composant, chargée au premier appel"""
+        component = self._components[name]
+        if component.state == "ready":
+            return component.value
+        self._raise_if_backing_off(component)
+        with component.lock:
+            if component.state != "ready":
+                self._raise_if_backing_off(component)
+                self._load(component)
+            return component.value
+
+    def _raise_if_backing_off(self, component: _Component) -> None:
+        """Échec récent: pas de nouvelle tentative avant la fin du délai"""
+        failed_at = component.failed_at
+        if component.state == "failed" and failed_at is not None \
+                and time.monotonic() - failed_at < self.retry_seconds:
+            # Traceback remis à zéro: il ne grossit pas à chaque appel
+            raise component.exception.with_traceback(None)
+
+    def retry(self, name: str) -> None:
+        """Lève le délai après un échec: le prochain get() recharge le composant"""
+        self._components[name].failed_at = None
+
+    def _load(self, component: _Component) -> None:
+        component.state = "loading"
+        component.error = None
+        component.exception = None
+        component.failed_at = None
+        start = time.perf_counter()
+        logger.info(f"Chargement du composant '{component.name}'...")
+        try:
+            # Imports lourds (torch, transformers...) compris, mesurés par le profilage du démarrage
+            with profiler.step(f"modèle: {component.name}", group="model"):
+                component.value = component.loader()
+        except Exception as e:
+            component.state = "failed"
+            component.error = str(e)
+            component.exception = e
+            component.failed_at = time.monotonic()
+            logger.error(f"Échec du chargement de '{component.name}' : {e}")
+            raise
+        component.load_seconds = time.perf_counter() - start
+        component.loaded_at = time.time()
+        component.state = "ready"
+        logger.info(f"Composant '{component.name}' prêt en {component.load_seconds:.1f}s")
+
+    def set(self, name: str, value) -> None:
+        """Marque un composant comme prêt avec une valeur construite ailleurs"""
+        component = self._components[name]
+        with component.lock:
+            component.value = value
+            component.loaded_at = time.time()
+            component.error = None
+            component.exception = None
+            component.failed_at = None
+            component.state = "ready"
+
+    def peek(self, name: str):
+        """Valeur si le composant est déjà chargé, sans déclencher de chargement"""
+        component = self._components[name]
+        return component.value if component.state == "ready" else None
+
+    def is_ready(self, name: str) -> bool:
+        return self._components[name].state == "ready"
+
+    def warm_up(self, names: Iterable[str], max_workers: int = None) -> threading.Thread:
+        """
+        Charge les composants en parallèle dans un thread de fond et rend la
+        main immédiatement (le serveur accepte les requêtes pendant ce temps).
+        """
+        names = [name for name in names if name in self._components]
+
+        def run():
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=max_workers or max(1, len(names)),
+                                    thread_name_prefix="warmup") as pool:
+                for name in names:
+                    pool.submit(self._warm, name)
+            logger.info(f"Préchauffage terminé en {time.perf_counter() - start:.1f}s : {self.status()}")
+
+        self._warmup_thread = threading.Thread(target=run, name="model-warmup", daemon=True)
+        self._warmup_thread.start()
+        return self._warmup_thread
+
+    def _warm(self, name: str) -> None:
+        try:
+            self.get(name)
+        except Exception:
+            # Déjà journalisé; le composant sera rechargé au premier usage
+            pass
+
+    @property
+    def warming_up(self) -> bool:
+        return self._warmup_thread is not None and self._warmup_thread.is_alive()
+
+    def status(self) -> Dict[str, Dict]:
+        return {name: component.to_dict() for name, component in self._components.items()}
@@ -0,0 +1,123 @@
+"""
+Reformulations de la question pour le RAG-Fusion multi-requêtes
+- local: substitutions sans appel réseau (nom INCI <-> nom courant français,
+  synonymes, codes CI) et variante réduite aux mots-clés,
+- llm:   reformulations demandées au modèle (repli sur local en cas d'échec).
+
+Chaque reformulation est recherchée en parallèle; les classements sont
+fusionnés par reciprocal rank fusion dans backendtow.
+"""
+
+import re
+import logging
+import unicodedata
+from typing import List
+
+logger = logging.getLogger(__name__)
+
+# Groupes d'équivalents: INCI, nom courant français, anglais, abréviations, codes CI
+SYNONYM_GROUPS = [
+    ("acide ascorbique", "ascorbic acid", "vitamine c", "vitamin c"),
+    ("rétinol", "retinol", "vitamine a", "vitamin a"),
+    ("niacinamide", "nicotinamide", "vitamine b3", "vitamin b3"),
+    ("tocophérol", "tocopherol", "vitamine e", "vitamin e"),
+    ("panthénol", "panthenol", "provitamine b5"),
+    ("acide hyaluronique", "hyaluronic acid", "sodium hyaluronate", "hyaluronate de sodium"),
+    ("glycérine", "glycerin", "glycerol"),
+    ("acide glycolique", "glycolic acid", "aha", "acides de fruits"),
+    ("acide salicylique", "salicylic acid", "bha"),
+    ("acide lactique", "lactic acid"),
+    ("sodium lauryl sulfate", "laurylsulfate de sodium", "sls"),
+    ("sodium laureth sulfate", "laureth sulfate de sodium", "sles"),
+    ("dioxyde de titane", "titanium dioxide", "ci 77891"),
+    ("oxyde de zinc", "zinc oxide", "ci 77947"),
+    ("oxydes de fer", "iron oxides", "ci 77491"),
+    ("phénoxyéthanol", "phenoxyethanol"),
+    ("parfum", "fragrance"),
+    ("beurre de karité", "shea butter", "butyrospermum parkii butter"),
+    ("aloe vera", "aloe barbadensis leaf juice"),
+    ("écran solaire", "crème solaire", "sunscreen", "spf"),
+    ("peau grasse", "oily skin"),
+    ("peau sèche", "dry skin"),
+    ("peau sensible", "sensitive skin"),
+]
+
+STOPWORDS = {
+    "le", "la", "les", "un", "une", "des", "de", "du", "d", "l", "et", "ou", "avec", "sans",
+    "pour", "sur", "dans", "en", "au", "aux", "est", "sont", "que", "qui", "quel", "quelle",
+    "quels", "quelles", "ce", "cette", "ces", "je", "puis", "peux", "peut", "mon", "ma",
+    "mes", "il", "elle", "on", "a", "y", "ne", "pas", "plus", "se", "the", "a", "an", "and",
+    "or", "with", "can", "i", "is", "of", "to", "for", "in", "my",
+}
+
+
+def _fold(text: str) -> str:
+    """Minuscules sans accents, pour comparer sans tenir compte des variantes d'écriture"""
+    text = unicodedata.normalize("NFKD", text.lower())
+    return "".join(ch for ch in text if not unicodedata.combining(ch))
+
+
+def _dedupe(query: str, variants: List[str], max_variants: int) -> List[str]:
+    seen = {_fold(query).strip()}
+    unique = []
+    for variant in variants:
+        key = _fold(variant).strip()
+        if key and key not in seen:
+            seen.add(key)
+            unique.append(variant.strip())
+        if len(unique) >= max_variants:
+            break
+    return unique
+
+
+def local_reformulations(query: str, max_variants: int = 3) -> List[str]:
+    """
+    Variantes obtenues en remplaçant chaque terme connu par ses équivalents
+    (INCI, nom français, code CI), plus une variante réduite aux mots-clés.
+    """
+    folded = _fold(query)
+    # Les substitutions se font sur le texte original tant que le repliement conserve
+    # les positions (lettres accentuées latines), sinon sur le texte replié
+    base = query if len(folded) == len(query) else folded
+    per_group = []
+    for group in SYNONYM_GROUPS:
+        for term in group:
+            pattern = re.compile(rf"\b{re.escape(_fold(term))}\b")
+            match = pattern.search(folded)
+            if not match:
+                continue
+            per_group.append([
+                base[:match.start()] + synonym + base[match.end():]
+                for synonym in group if _fold(synonym) != _fold(term)
+            ])
+            break
+    # Une substitution par terme reconnu à tour de rôle: chaque terme est couvert
+    variants = [
+        group_variants[i]
+        for i in range(max((len(v) for v in per_group), default=0))
+        for group_variants in per_group if i < len(group_variants)
+    ]
+    keywords = [word for word in re.findall(r"\w+", query) if _fold(word) not in STOPWORDS]
+    if keywords:
+        variants.insert(min(len(per_group), len(variants)), " ".join(keywords))
+    return _dedupe(query, variants, max_variants)
+
+
+REFORMULATION_PROMPT = """Reformule la question suivante de {n} façons différentes pour une recherche documentaire
+sur des produits cosmétiques: utilise les noms INCI, les noms courants en français et des synonymes.
+Une reformulation par ligne, sans numérotation ni commentaire.
+
+Question : {query}"""
+
+
+def llm_reformulations(query: str, llm, max_variants: int = 3, timeout: float = None) -> List[str]:
+    """Reformulations produites par le modèle; repli sur les variantes locales en cas d'échec"""
+    try:
+        response = llm.generate(REFORMULATION_PROMPT.format(n=max_variants, query=query), timeout=timeout)
+        lines = [re.sub(r"^\s*(?:[-*•]|\d+[.)])\s*", "", line) for line in response.text.splitlines()]
+        variants = _dedupe(query, [line for line in lines if line.strip()], max_variants)
+        if variants:
+            return variants
+    except Exception as e:
+        logger.warning(f"Reformulations LLM indisponibles ({e}); variantes locales")
+    return local_reformulations(query, max_variants)
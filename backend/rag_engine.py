@@ -2,156 +2,32 @@ import logging
 import time
 import os
 from datetime import datetime
-from langchain_community.vectorstores import FAISS
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_core.documents import Document
 from tiktoken import get_encoding
-from .config import INDEX_PATH
 from .evaluation import rerank_documents
-from .document_processing import chunk_text_semantically, extract_text
+from .document_processing import extract_text
 from .file_utils import get_title_from_filename, get_file_hash
 from .models import db, ChatMessage
-from transformers import AutoModelForCausalLM, AutoTokenizer
-import torch
-
-# ==============================
-# CONFIGURATION DU MODÈLE MPT
-# ==============================
-
-# Modèle MPT-7B de MosaicML, version optimisée pour le dialogue
-# Alternative: "mosaicml/mpt-3b-instruct" pour machines avec RAM limitée
-MODEL_NAME = "mosaicml/mpt-7b-instruct"
-
-# Initialisation du tokenizer pour le prétraitement du texte
-# Gère la tokenization des prompts et des réponses
-tokenizer = AutoTokenizer.from_pretrained(MODEL_NAME)
-
-# Chargement du modèle principal avec configuration optimisée CPU
-model = AutoModelForCausalLM.from_pretrained(
-    MODEL_NAME,
-    device_map="cpu",            # Spécifique Windows/CPU - pas de support GPU
-    torch_dtype=torch.float32,   # Précision simple pour stabilité sur CPU
-    low_cpu_mem_usage=True       # Réduction consommation mémoire lors du chargement
+from .llm_backend import get_llm_backend
+from .backendtow import (
+    current_index,
+    index_unavailable_message,
+    embed_query,
+    load_faiss_index,
+    reset_faiss_index,
+    get_existing_document_ids,
+    add_document_to_index,
+    _search_by_vector,
 )
 
 # ==============================
 # GESTION DES EMBEDDINGS ET BASE VECTORIELLE FAISS
 # ==============================
 
-# Modèle d'embedding SentenceTransformers - équilibre performance/vitesse
-# all-MiniLM-L6-v2: 384 dimensions, rapide et efficace
-embeddings = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
-
-# Variable globale pour l'index FAISS - initialisée à None au démarrage
-db_faiss = None
-
-def load_faiss_index():
-    """
-    Charge l'index FAISS depuis le stockage local.
-    Crée un index vide si aucun index existant n'est trouvé.
-    
-    Returns:
-        None
-    """
-    global db_faiss
-    try:
-        # Tentative de chargement de l'index existant
-        # allow_dangerous_deserialization=True nécessaire pour FAISS mais nécessite confiance dans la source
-        db_faiss = FAISS.load_local(INDEX_PATH, embeddings, allow_dangerous_deserialization=True)
-        logging.info("✅ Index FAISS chargé.")
-    except Exception as e:
-        # Fallback: création d'un nouvel index vide
-        logging.warning(f"⚠️ Index non trouvé ou invalide, création d'un index vide : {e}")
-        db_faiss = FAISS.from_documents([], embeddings)  # Index vide avec modèle d'embedding
-        db_faiss.save_local(INDEX_PATH)  # Sauvegarde pour usage futur
-        logging.info("✅ Index FAISS vide créé.")
-
-def reset_faiss_index():
-    """
-    Réinitialise complètement l'index FAISS.
-    Utile pour les tests ou la maintenance.
-    
-    Returns:
-        None
-    """
-    global db_faiss
-    logging.info("⚠️ Réinitialisation de l'index FAISS...")
-    # Création d'un nouvel index vide
-    db_faiss = FAISS.from_documents([], embeddings)
-    db_faiss.save_local(INDEX_PATH)  # Persistance immédiate
-    logging.info("✅ Index FAISS réinitialisé.")
-
-def get_existing_document_ids():
-    """
-    Récupère tous les IDs de documents présents dans l'index.
-    Utilisé pour éviter les doublons lors de l'indexation.
-    
-    Returns:
-        set: Ensemble des IDs de documents existants
-    """
-    try:
-        # Recherche vide pour récupérer tous les documents (limité à 1000)
-        return set(
-            doc.metadata.get("document_id")
-            for doc in db_faiss.similarity_search("", k=1000)
-            if doc.metadata.get("document_id")  # Filtre les documents sans ID
-        )
-    except Exception as e:
-        logging.warning(f"Erreur récupération des document_id : {e}")
-        return set()  # Retourne un set vide en cas d'erreur
-
-def add_document_to_index(text, metadata=None):
-    """
-    Ajoute un document à l'index FAISS après traitement et découpage.
-    
-    Args:
-        text (str): Texte du document à indexer
-        metadata (dict, optional): Métadonnées associées au document
-    
-    Returns:
-        bool: True si l'ajout réussi, False sinon
-    """
-    global db_faiss
-    try:
-        # Validation du texte d'entrée
-        if not text.strip():
-            logging.warning("Texte vide, rien à indexer.")
-            return False
-
-        # Extraction et vérification de l'ID du document
-        document_id = metadata.get("document_id") if metadata else None
-        existing_ids = get_existing_document_ids()
-        
-        # Vérification de doublon
-        if document_id and document_id in existing_ids:
-            logging.info(f"📛 Document déjà indexé : {document_id}")
-            return False
-
-        # Découpage sémantique du texte en chunks
-        # max_tokens=500: taille optimale pour la recherche
-        # overlap_tokens=100: préservation du contexte entre chunks
-        chunks = chunk_text_semantically(text, max_tokens=500, overlap_tokens=100)
-        docs = []
-        
-        # Création des objets Document avec métadonnées enrichies
-        for i, chunk in enumerate(chunks):
-            chunk_metadata = metadata.copy() if metadata else {}
-            chunk_metadata.update({
-                "chunk_index": i,  # Position du chunk dans le document
-                "chunk_length": len(chunk),  # Longueur en caractères
-                "title": metadata.get("title", "Sans titre") if metadata else "Sans titre"
-            })
-            docs.append(Document(page_content=chunk, metadata=chunk_metadata))
-
-        # Ajout à l'index et sauvegarde
-        db_faiss.add_documents(docs)
-        db_faiss.save_local(INDEX_PATH)
-        logging.info(f"✅ {len(docs)} chunks ajoutés avec métadonnées enrichies.")
-        return True
-        
-    except Exception as e:
-        logging.error(f"Erreur ajout document à l'index : {e}")
-        return False
+# L'index FAISS, le registre des documents et les embeddings sont ceux de
+# backendtow (format ChunkStore, registre par position FAISS, écritures
+# différées): ce module n'ouvre ni n'écrit jamais INDEX_PATH lui-même.
+# load_faiss_index, reset_faiss_index, get_existing_document_ids et
+# add_document_to_index sont réexportés pour backend.backend.
 
 # ==============================
 # GESTION DE L'HISTORIQUE DEPUIS LA BASE DE DONNÉES
@@ -209,7 +85,8 @@ def get_chat_history_from_db(user_id, session_id, thread_id, limit=10):
 
 def call_mpt(prompt, max_tokens=512):
     """
-    Exécute le modèle MPT avec le prompt fourni.
+    Exécute le backend de la route "legacy" (MPT-7B local par défaut, chargé
+    au premier appel; voir LLM_BACKEND_LEGACY) avec le prompt fourni.
     
     Args:
         prompt (str): Texte d'entrée pour le modèle
@@ -219,15 +96,7 @@ def call_mpt(prompt, max_tokens=512):
         str: Réponse générée par le modèle
     """
     try:
-        # Tokenization du prompt
-        inputs = tokenizer(prompt, return_tensors="pt")  # Tenseurs PyTorch
-        
-        # Génération de la réponse
-        outputs = model.generate(**inputs, max_new_tokens=max_tokens)
-        
-        # Décodage et nettoyage de la réponse
-        return tokenizer.decode(outputs[0], skip_special_tokens=True)
-        
+        return get_llm_backend("legacy").generate(prompt, max_tokens=max_tokens).text
     except Exception as e:
         logging.error(f"Erreur MPT : {e}")
         return " Réponse impossible."  # Message d'erreur générique
@@ -252,9 +121,10 @@ def rag_fusion_multi_docs(query, chat_history=None, k=6, nb_messages=10, use_rer
         tuple: (réponse, documents de contexte)
     """
     # Vérification de l'initialisation de FAISS
-    if db_faiss is None:
+    handle = current_index()
+    if handle is None:
         logging.error("Index FAISS non chargé")
-        return " Index non chargé.", []
+        return index_unavailable_message(), []
 
     # Initialisation par défaut de l'historique
     if chat_history is None:
@@ -262,7 +132,8 @@ def rag_fusion_multi_docs(query, chat_history=None, k=6, nb_messages=10, use_rer
 
     try:
         # Étape 1: Recherche vectorielle initiale
-        retrieved_docs = db_faiss.similarity_search(query, k=k)
+        # Recherche sous verrou de lecture, chunks supprimés exclus
+        retrieved_docs = [doc for doc, _ in _search_by_vector(handle, embed_query(query), k)]
         
         # Étape 2: Re-ranking des résultats (optionnel)
         docs = rerank_documents(query, retrieved_docs, top_k=k, use_reranking=use_reranking)
@@ -0,0 +1,128 @@
+"""
+Reranking par micro-lots
+Les requêtes concurrentes déposent leurs paires (question, passage) dans une
+file; un thread unique les regroupe pendant quelques millisecondes (ou jusqu'à
+un nombre maximal de paires), exécute un seul `CrossEncoder.predict` et renvoie
+à chaque requête ses scores. Sous charge, un gros appel remplace des dizaines
+de petits appels qui se disputent les cœurs CPU.
+"""
+
+import time
+import queue
+import logging
+import threading
+from typing import Callable, Dict, List, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class _RerankRequest:
+    __slots__ = ("pairs", "scores", "error", "done")
+
+    def __init__(self, pairs: List[Tuple[str, str]]):
+        self.pairs = pairs
+        self.scores = None
+        self.error = None
+        self.done = threading.Event()
+
+
+class BatchingReranker:
+    """
+    Args:
+        predict: Fonction (pairs, batch_size) -> scores (ex: CrossEncoder.predict)
+        max_wait_ms: Attente maximale pour compléter un lot après la première requête
+        max_pairs: Nombre de paires au-delà duquel le lot part sans attendre
+        batch_size: Taille des lots internes de `predict`
+    """
+
+    def __init__(self, predict: Callable[[Sequence[Tuple[str, str]], int], Sequence[float]],
+                 max_wait_ms: float = 5, max_pairs: int = 64, batch_size: int = 32):
+        self.predict = predict
+        self.max_wait = max_wait_ms / 1000.0
+        self.max_pairs = max_pairs
+        self.batch_size = batch_size
+        self._queue: "queue.Queue[_RerankRequest]" = queue.Queue()
+        self._worker = None
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.batches = 0
+        self.requests = 0
+        self.pairs = 0
+        self.max_batch_pairs = 0
+        self.predict_seconds = 0.0
+
+    def score(self, pairs: List[Tuple[str, str]], timeout: float = None) -> List[float]:
+        """Scores des paires, calculés dans le prochain lot (bloquant)"""
+        if not pairs:
+            return []
+        self._ensure_worker()
+        request = _RerankRequest(list(pairs))
+        self._queue.put(request)
+        if not request.done.wait(timeout):
+            raise TimeoutError("Reranking: délai dépassé")
+        if request.error is not None:
+            raise request.error
+        return request.scores
+
+    def _ensure_worker(self):
+        if self._worker is None:
+            with self._start_lock:
+                if self._worker is None:
+                    self._worker = threading.Thread(target=self._run, name="rerank-batcher", daemon=True)
+                    self._worker.start()
+
+    def _collect(self) -> List[_RerankRequest]:
+        batch = [self._queue.get()]
+        size = len(batch[0].pairs)
+        deadline = time.monotonic() + self.max_wait
+        while size < self.max_pairs:
+            remaining = deadline - time.monotonic()
+            try:
+                # Les requêtes arrivées pendant le lot précédent sont prises sans attendre
+                request = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            batch.append(request)
+            size += len(request.pairs)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            pairs = [pair for request in batch for pair in request.pairs]
+            start = time.perf_counter()
+            try:
+                scores = list(self.predict(pairs, self.batch_size))
+            except Exception as e:
+                logger.error(f"Erreur reranking ({len(pairs)} paires) : {e}")
+                for request in batch:
+                    request.error = e
+                    request.done.set()
+                continue
+            elapsed = time.perf_counter() - start
+
+            offset = 0
+            for request in batch:
+                request.scores = scores[offset:offset + len(request.pairs)]
+                offset += len(request.pairs)
+                request.done.set()
+
+            with self._stats_lock:
+                self.batches += 1
+                self.requests += len(batch)
+                self.pairs += len(pairs)
+                self.max_batch_pairs = max(self.max_batch_pairs, len(pairs))
+                self.predict_seconds += elapsed
+
+    def stats(self) -> Dict:
+        with self._stats_lock:
+            return {
+                "batches": self.batches,
+                "requests": self.requests,
+                "pairs": self.pairs,
+                "avg_requests_per_batch": round(self.requests / self.batches, 2) if self.batches else None,
+                "avg_pairs_per_batch": round(self.pairs / self.batches, 1) if self.batches else None,
+                "max_batch_pairs": self.max_batch_pairs,
+                "predict_seconds": round(self.predict_seconds, 3),
+                "queued": self._queue.qsize(),
+            }
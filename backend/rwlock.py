@@ -0,0 +1,68 @@
+"""
+Verrou lecteurs/rédacteur pour l'accès concurrent à l'index FAISS
+Plusieurs recherches simultanées, une seule modification à la fois
+"""
+
+import threading
+from contextlib import contextmanager
+
+
+class ReadWriteLock:
+    """
+    Verrou partagé en lecture, exclusif en écriture.
+
+    Les rédacteurs sont prioritaires: dès qu'une écriture attend, les nouvelles
+    lectures patientent, ce qui évite qu'un flux continu de requêtes /ask
+    n'affame un upload. Le verrou n'est pas réentrant.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writer = False
+        self._waiting_writers = 0
+
+    def acquire_read(self) -> None:
+        with self._cond:
+            while self._writer or self._waiting_writers:
+                self._cond.wait()
+            self._readers += 1
+
+    def release_read(self) -> None:
+        with self._cond:
+            self._readers -= 1
+            if not self._readers:
+                self._cond.notify_all()
+
+    def acquire_write(self) -> None:
+        with self._cond:
+            self._waiting_writers += 1
+            try:
+                while self._writer or self._readers:
+                    self._cond.wait()
+            finally:
+                self._waiting_writers -= 1
+            self._writer = True
+
+    def release_write(self) -> None:
+        with self._cond:
+            self._writer = False
+            self._cond.notify_all()
+
+    @contextmanager
+    def read_locked(self):
+        """Section de lecture partagée (similarity_search, sauvegarde sur disque)"""
+        self.acquire_read()
+        try:
+            yield
+        finally:
+            self.release_read()
+
+    @contextmanager
+    def write_locked(self):
+        """Section d'écriture exclusive (add_documents, delete, rechargement, reset)"""
+        self.acquire_write()
+        try:
+            yield
+        finally:
+            self.release_write()
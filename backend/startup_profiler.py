@@ -0,0 +1,173 @@
+"""
+Profilage du démarrage
+Mesure le temps réel et la variation de mémoire résidente (RSS) de chaque
+groupe d'imports et étape d'initialisation (app.py, backendtow, chargement de
+l'index et des modèles), puis écrit un rapport JSON et un tableau lisible.
+
+Activé par STARTUP_PROFILE=1 (voir config.py); tableau écrit à côté du JSON (.txt).
+"""
+
+import os
+import sys
+import json
+import time
+import logging
+import platform
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from .config import STARTUP_PROFILE, STARTUP_PROFILE_PATH
+
+logger = logging.getLogger(__name__)
+
+try:
+    import psutil
+except ImportError:  # Optionnel: /proc ou resource sinon
+    psutil = None
+
+
+def current_rss_bytes() -> Optional[int]:
+    """Mémoire résidente actuelle du processus (None si indisponible)"""
+    if psutil is not None:
+        return psutil.Process().memory_info().rss
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+    try:
+        import resource
+        # Pic de RSS (kilo-octets sous Linux, octets sous macOS): approximation
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+    except ImportError:
+        return None
+
+
+class StartupProfiler:
+    """
+    Enregistre des étapes nommées (groupe "import", "init" ou "model").
+
+    Sans activation, `step` ne mesure rien et ne coûte qu'un appel de
+    fonction. Les étapes qui se terminent après `finish` (préchauffage en
+    arrière-plan, chargement paresseux) réécrivent le rapport.
+    """
+
+    def __init__(self, enabled: bool = False, path: str = None):
+        self.enabled = enabled
+        self.path = path
+        self.started_at = time.time()
+        self._start = time.perf_counter()
+        self._start_rss = current_rss_bytes() if enabled else None
+        self._steps: List[Dict] = []
+        self._lock = threading.Lock()
+        self._finished = False
+
+    @contextmanager
+    def step(self, name: str, group: str = "init"):
+        if not self.enabled:
+            yield
+            return
+        rss_before = current_rss_bytes()
+        start = time.perf_counter()
+        error = None
+        try:
+            yield
+        except BaseException as e:
+            error = type(e).__name__
+            raise
+        finally:
+            rss_after = current_rss_bytes()
+            self._record({
+                "name": name,
+                "group": group,
+                "thread": threading.current_thread().name,
+                "offset_seconds": round(start - self._start, 3),
+                "seconds": round(time.perf_counter() - start, 3),
+                "rss_delta_mb": _mb(rss_after - rss_before) if rss_before is not None and rss_after is not None else None,
+                "rss_after_mb": _mb(rss_after) if rss_after is not None else None,
+                "error": error,
+            })
+
+    def _record(self, entry: Dict) -> None:
+        with self._lock:
+            self._steps.append(entry)
+            finished = self._finished
+        if finished:
+            self.write_report()
+
+    def finish(self) -> Optional[Dict]:
+        """Fin du démarrage synchrone: écrit le rapport (réécrit par les étapes suivantes)"""
+        if not self.enabled:
+            return None
+        with self._lock:
+            self._finished = True
+        return self.write_report()
+
+    def report(self) -> Dict:
+        with self._lock:
+            steps = list(self._steps)
+        rss = current_rss_bytes()
+        groups: Dict[str, Dict] = {}
+        for entry in steps:
+            group = groups.setdefault(entry["group"], {"steps": 0, "seconds": 0.0, "rss_delta_mb": 0.0})
+            group["steps"] += 1
+            group["seconds"] = round(group["seconds"] + entry["seconds"], 3)
+            group["rss_delta_mb"] = round(group["rss_delta_mb"] + (entry["rss_delta_mb"] or 0.0), 1)
+        return {
+            "started_at": datetime.utcfromtimestamp(self.started_at).isoformat() + "Z",
+            "elapsed_seconds": round(time.perf_counter() - self._start, 3),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "pid": os.getpid(),
+            "rss_start_mb": _mb(self._start_rss) if self._start_rss is not None else None,
+            "rss_mb": _mb(rss) if rss is not None else None,
+            "groups": groups,
+            "steps": steps,
+        }
+
+    def write_report(self) -> Optional[Dict]:
+        report = self.report()
+        if not self.path:
+            return report
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, self.path)
+            table = format_table(report)
+            with open(os.path.splitext(self.path)[0] + ".txt", "w", encoding="utf-8") as f:
+                f.write(table + "\n")
+            logger.info(f"Profil de démarrage écrit dans {self.path}\n{table}")
+        except OSError as e:
+            logger.warning(f"Écriture du profil de démarrage impossible : {e}")
+        return report
+
+
+def _mb(num_bytes: int) -> float:
+    return round(num_bytes / (1024 * 1024), 1)
+
+
+def format_table(report: Dict) -> str:
+    """Tableau des étapes, triées par ordre de démarrage"""
+    header = f"{'étape':<44} {'groupe':<7} {'début s':>8} {'durée s':>8} {'ΔRSS Mo':>8}  thread"
+    lines = [header, "-" * len(header)]
+    for entry in sorted(report["steps"], key=lambda e: e["offset_seconds"]):
+        delta = "" if entry["rss_delta_mb"] is None else f"{entry['rss_delta_mb']:+.1f}"
+        name = entry["name"] + (f" [{entry['error']}]" if entry["error"] else "")
+        lines.append(
+            f"{name[:44]:<44} {entry['group']:<7} {entry['offset_seconds']:>8.3f} "
+            f"{entry['seconds']:>8.3f} {delta:>8}  {entry['thread']}"
+        )
+    lines.append("-" * len(header))
+    for group, totals in report["groups"].items():
+        lines.append(f"total {group:<38} {'':<7} {'':>8} {totals['seconds']:>8.3f} {totals['rss_delta_mb']:>+8.1f}")
+    lines.append(f"RSS: {report['rss_start_mb']} Mo -> {report['rss_mb']} Mo, écoulé {report['elapsed_seconds']} s")
+    return "\n".join(lines)
+
+
+# Instance du processus, créée au premier import (avant les imports lourds de backendtow)
+profiler = StartupProfiler(enabled=STARTUP_PROFILE, path=STARTUP_PROFILE_PATH)
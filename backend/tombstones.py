@@ -0,0 +1,127 @@
+"""
+Chunks supprimés de l'index FAISS (tombstones)
+Retirer un vecteur d'un index plat décale toutes les positions suivantes, dont
+dépendent le ChunkStore, BM25 et l'index des métadonnées; HNSW ne permet pas
+de suppression. Les positions des chunks d'un document supprimé ou remplacé
+sont donc seulement marquées ici et exclues des recherches (IDSelector FAISS,
+masque BM25, sélection des filtres). La compaction reconstruit l'index sans
+elles quand elles deviennent trop nombreuses.
+
+Contrairement au registre, à BM25 ou aux métadonnées, cet état ne peut pas
+être reconstruit depuis le docstore: il est sauvegardé avec l'index.
+"""
+
+import os
+import json
+import logging
+from typing import Dict, Iterable, List, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class Tombstones:
+    """
+    Positions FAISS supprimées (tableau int64 trié).
+
+    Pas de verrou interne: modifié sous le verrou exclusif de la version
+    d'index (IndexHandle.lock). Chaque ajout publie un nouveau tableau: un
+    lecteur qui a capturé `positions` garde une vue cohérente.
+    """
+
+    FILENAME = "tombstones.json"
+
+    def __init__(self, index_path: str):
+        self.index_path = index_path
+        self._positions = np.empty(0, dtype=np.int64)
+
+    def __len__(self) -> int:
+        return len(self._positions)
+
+    @property
+    def positions(self) -> np.ndarray:
+        return self._positions
+
+    def add(self, positions: Iterable[int]) -> None:
+        added = np.fromiter((int(position) for position in positions), dtype=np.int64)
+        self._positions = np.union1d(self._positions, added)
+
+    def exclude(self, positions: np.ndarray) -> np.ndarray:
+        """`positions` (triées, sans doublon) privées des positions supprimées"""
+        if not len(self._positions):
+            return positions
+        return np.setdiff1d(positions, self._positions, assume_unique=True)
+
+    def live_positions(self, ntotal: int) -> np.ndarray:
+        """Positions non supprimées d'un index de `ntotal` vecteurs, dans l'ordre"""
+        return self.exclude(np.arange(ntotal, dtype=np.int64))
+
+    # --- Persistance ---
+
+    def save(self, ntotal: int = None, directory: str = None) -> None:
+        """Sauvegarde atomique (fichier temporaire puis renommage)"""
+        directory = directory or self.index_path
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, self.FILENAME)
+        with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+            json.dump({"ntotal": ntotal, "positions": self._positions.tolist()}, f)
+        os.replace(f"{path}.tmp", path)
+
+    def load(self, expected_chunks: int = None) -> bool:
+        """
+        Returns:
+            bool: True si des tombstones ont été chargés (aucun fichier: index sans suppression)
+        """
+        self._positions = np.empty(0, dtype=np.int64)
+        path = os.path.join(self.index_path, self.FILENAME)
+        if not os.path.exists(path):
+            return False
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                payload = json.load(f)
+        except Exception as e:
+            logger.warning(f"Tombstones illisibles ({path}) : {e}")
+            return False
+        positions = np.unique(np.asarray(payload.get("positions", []), dtype=np.int64))
+        if expected_chunks is not None and payload.get("ntotal") != expected_chunks:
+            # Irreconstructible: les positions encore valides sont conservées
+            logger.warning("Tombstones désynchronisés de l'index FAISS")
+            positions = positions[positions < expected_chunks]
+        self._positions = positions
+        return True
+
+    def stats(self) -> Dict:
+        return {"deleted_chunks": len(self._positions)}
+
+
+def search_excluding(index, query_vector, excluded: np.ndarray, k: int) -> List[Tuple[int, float]]:
+    """
+    Recherche des k plus proches voisins hors des positions `excluded`.
+
+    Le sélecteur FAISS écarte les positions supprimées pendant le parcours
+    (plat, IVF ou HNSW); sans sélecteur, k + len(excluded) candidats suffisent
+    à en garder k. Distances L2 au carré, comme similarity_search_with_score.
+
+    Returns:
+        list: (position, distance) par distance croissante
+    """
+    query = np.asarray(query_vector, dtype=np.float32).reshape(1, -1)
+    k = min(k, index.ntotal - len(excluded))
+    if k <= 0:
+        return []
+    try:
+        import faiss
+        from .ann_index import search_parameters
+        # Référence gardée: IDSelectorNot ne possède pas le sélecteur qu'il inverse
+        deleted = faiss.IDSelectorBatch(excluded)
+        params = search_parameters(index, faiss.IDSelectorNot(deleted))
+        distances, ids = index.search(query, k, params=params)
+        return [(int(i), float(d)) for i, d in zip(ids[0], distances[0]) if i != -1]
+    except (AttributeError, TypeError, RuntimeError) as e:
+        # FAISS < 1.7.3 ou type d'index sans sélecteur: candidats filtrés après coup
+        logger.debug(f"IDSelector indisponible ({e}), filtrage des candidats")
+
+    distances, ids = index.search(query, min(index.ntotal, k + len(excluded)))
+    keep = (ids[0] != -1) & ~np.isin(ids[0], excluded)
+    return [(int(i), float(d)) for i, d in zip(ids[0][keep][:k], distances[0][keep][:k])]
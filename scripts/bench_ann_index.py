@@ -0,0 +1,104 @@
+"""Benchmark rappel@k / latence des index approximatifs contre l'index exact.
+Lit les vecteurs de l'index FAISS du projet (index/arx_faiss/index.faiss), prend
+des chunks existants légèrement bruités comme questions, calcule la vérité
+terrain avec l'index plat puis mesure, pour chaque type et chaque réglage
+(nprobe pour IVF, efSearch pour HNSW), le rappel@k et la latence par question.
+
+Usage:
+    python scripts/bench_ann_index.py
+    python scripts/bench_ann_index.py --types ivf_flat hnsw --nprobe 4 8 16 32 --k 6
+    python scripts/bench_ann_index.py --index path/to/index.faiss --queries 500 --synthetic 200000
+"""
+import os, sys, time, argparse
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import numpy as np
+import faiss
+from backend.ann_index import all_vectors, apply_search_params, build_index
+from backend.config import INDEX_PATH, ANN_NLIST, ANN_PQ_M, ANN_PQ_NBITS, ANN_HNSW_M, ANN_HNSW_EF_CONSTRUCTION
+
+
+def load_vectors(path, synthetic):
+    """Vecteurs de l'index du projet, complétés par des vecteurs synthétiques si demandé"""
+    vectors = np.empty((0, 384), dtype=np.float32)
+    if os.path.exists(path):
+        vectors = all_vectors(faiss.read_index(path)).astype(np.float32)
+        print(f"Index chargé : {len(vectors)} vecteurs de dimension {vectors.shape[1]}")
+    elif not synthetic:
+        sys.exit(f"Index introuvable : {path} (utiliser --synthetic N)")
+    if synthetic:
+        # Bruit autour de vecteurs existants (ou gaussien sans index): même géométrie approximative
+        rng = np.random.default_rng(1)
+        dim = vectors.shape[1]
+        if len(vectors):
+            base = vectors[rng.integers(0, len(vectors), synthetic)]
+            extra = base + rng.normal(0, 0.05, base.shape).astype(np.float32)
+        else:
+            extra = rng.normal(0, 1, (synthetic, dim)).astype(np.float32)
+        extra /= np.linalg.norm(extra, axis=1, keepdims=True)
+        vectors = np.vstack([vectors, extra])
+        print(f"{synthetic} vecteurs synthétiques ajoutés ({len(vectors)} au total)")
+    return vectors
+
+
+def make_queries(vectors, n, noise):
+    rng = np.random.default_rng(0)
+    queries = vectors[rng.choice(len(vectors), min(n, len(vectors)), replace=False)]
+    queries = queries + rng.normal(0, noise, queries.shape).astype(np.float32)
+    return np.ascontiguousarray(queries / np.linalg.norm(queries, axis=1, keepdims=True))
+
+
+def measure(index, queries, k, truth):
+    """Rappel@k moyen et latences (ms) question par question, comme en production"""
+    latencies, recalls = [], []
+    for i, query in enumerate(queries):
+        start = time.perf_counter()
+        _, ids = index.search(query.reshape(1, -1), k)
+        latencies.append((time.perf_counter() - start) * 1000)
+        recalls.append(len(set(ids[0]) & set(truth[i])) / k)
+    latencies = np.array(latencies)
+    return float(np.mean(recalls)), float(np.percentile(latencies, 50)), float(np.percentile(latencies, 95))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--index", default=os.path.join(INDEX_PATH, "index.faiss"))
+    parser.add_argument("--types", nargs="+", default=["ivf_flat", "ivf_pq", "hnsw"],
+                        choices=["ivf_flat", "ivf_pq", "hnsw"])
+    parser.add_argument("--k", type=int, default=6, help="Chunks récupérés (k de rag_fusion_multi_docs)")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--noise", type=float, default=0.02, help="Bruit ajouté aux chunks pris comme questions")
+    parser.add_argument("--synthetic", type=int, default=0, help="Vecteurs synthétiques ajoutés au corpus")
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 8, 16, 32, 64])
+    parser.add_argument("--ef-search", type=int, nargs="+", default=[16, 32, 64, 128, 256])
+    parser.add_argument("--threads", type=int, default=1, help="Threads OpenMP de FAISS (1 = une requête / cœur)")
+    args = parser.parse_args()
+
+    faiss.omp_set_num_threads(args.threads)
+    vectors = load_vectors(args.index, args.synthetic)
+    queries = make_queries(vectors, args.queries, args.noise)
+
+    flat = build_index(vectors, "flat")
+    _, truth = flat.search(queries, args.k)
+    recall, p50, p95 = measure(flat, queries, args.k, truth)
+    print(f"\n{'Index':<12}{'Réglage':<16}{'Constr. (s)':>12}{'Rappel@' + str(args.k):>11}{'p50 (ms)':>11}{'p95 (ms)':>11}{'Gain p50':>10}")
+    print(f"{'flat':<12}{'-':<16}{0:>12.1f}{recall:>11.3f}{p50:>11.3f}{p95:>11.3f}{1:>9.1f}x")
+    baseline = p50
+
+    for index_type in args.types:
+        start = time.perf_counter()
+        index = build_index(vectors, index_type, nlist=ANN_NLIST, pq_m=ANN_PQ_M, pq_nbits=ANN_PQ_NBITS,
+                            hnsw_m=ANN_HNSW_M, ef_construction=ANN_HNSW_EF_CONSTRUCTION)
+        build_seconds = time.perf_counter() - start
+        if index_type == "hnsw":
+            settings = [(f"efSearch={ef}", dict(ef_search=ef)) for ef in args.ef_search]
+        else:
+            settings = [(f"nprobe={n}", dict(nprobe=n)) for n in args.nprobe]
+        for label, params in settings:
+            apply_search_params(index, **params)
+            recall, p50, p95 = measure(index, queries, args.k, truth)
+            print(f"{index_type:<12}{label:<16}{build_seconds:>12.1f}{recall:>11.3f}{p50:>11.3f}{p95:>11.3f}"
+                  f"{baseline / p50:>9.1f}x")
+
+
+if __name__ == '__main__':
+    main()
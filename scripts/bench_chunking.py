@@ -0,0 +1,121 @@
+"""Benchmark du découpage sémantique: algorithme historique vs comptage incrémental.
+Vérifie que les chunks produits sont identiques et mesure le débit en tokens/s.
+
+Usage:
+    python scripts/bench_chunking.py                      # document synthétique (~300 pages)
+    python scripts/bench_chunking.py --file dossier.txt   # texte réel
+    python scripts/bench_chunking.py --pages 600 --repeat 5
+"""
+import os, sys, time, argparse, random
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import tiktoken
+from nltk.tokenize import sent_tokenize
+from backend.chunking import chunk_sentences
+
+tokenizer = tiktoken.get_encoding("gpt2")
+
+
+class CountingTokenizer:
+    """Compte les appels d'encodage pour montrer le travail évité"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, text):
+        self.calls += 1
+        return len(tokenizer.encode(text))
+
+
+def legacy_chunk(sentences, max_tokens, overlap_tokens, count_tokens):
+    """Copie de l'ancien chunk_text_semantically (backendtow.py) pour comparaison"""
+    chunks = []
+    current_chunk = []
+    current_len = 0
+    for sentence in sentences:
+        sent_tokens = count_tokens(sentence)
+        if current_len + sent_tokens > max_tokens:
+            chunks.append(" ".join(current_chunk))
+            overlap = []
+            token_sum = 0
+            for sent in reversed(current_chunk):
+                token_sum += count_tokens(sent)
+                overlap.insert(0, sent)
+                if token_sum >= overlap_tokens:
+                    break
+            current_chunk = overlap
+            current_len = sum(count_tokens(s) for s in current_chunk)
+        current_chunk.append(sentence)
+        current_len += sent_tokens
+    if current_chunk:
+        chunks.append(" ".join(current_chunk))
+    return chunks
+
+
+def synthetic_text(pages, seed=0):
+    """Texte de type fiche technique cosmétique, ~450 mots par page"""
+    rng = random.Random(seed)
+    words = ("sérum crème rétinol niacinamide acide hyaluronique glycérine parfum conservateur "
+             "phénoxyéthanol tocophérol peau sensible irritation concentration formule stabilité "
+             "pH émulsion application soir matin protection solaire SPF test dermatologique").split()
+    sentences = []
+    for _ in range(pages * 30):
+        n = rng.randint(6, 40)
+        sentences.append(" ".join(rng.choice(words) for _ in range(n)).capitalize() + ".")
+    return " ".join(sentences)
+
+
+def run(fn, sentences, args):
+    counter = CountingTokenizer()
+    best = None
+    for _ in range(args.repeat):
+        counter.calls = 0
+        start = time.perf_counter()
+        chunks = fn(sentences, args.max_tokens, args.overlap_tokens, counter)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return chunks, best, counter.calls
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--file", help="Fichier texte (UTF-8) à découper")
+    parser.add_argument("--pages", type=int, default=300, help="Pages du document synthétique")
+    parser.add_argument("--max-tokens", type=int, default=500)
+    parser.add_argument("--overlap-tokens", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=3, help="Meilleur temps sur N exécutions")
+    args = parser.parse_args()
+
+    if args.file:
+        with open(args.file, "r", encoding="utf-8") as f:
+            text = f.read()
+    else:
+        text = synthetic_text(args.pages)
+
+    start = time.perf_counter()
+    sentences = sent_tokenize(text)
+    split_time = time.perf_counter() - start
+    total_tokens = sum(len(tokenizer.encode(s)) for s in sentences)
+
+    print(f"Document: {len(text):,} caractères, {len(sentences):,} phrases, {total_tokens:,} tokens")
+    print(f"Découpage en phrases (commun): {split_time:.3f}s\n")
+
+    legacy_chunks, legacy_time, legacy_calls = run(legacy_chunk, sentences, args)
+    new_chunks, new_time, new_calls = run(chunk_sentences, sentences, args)
+
+    print(f"{'Algorithme':<14}{'Temps (s)':>12}{'Tokens/s':>16}{'Appels encode':>16}{'Chunks':>10}")
+    for name, elapsed, calls, chunks in (
+        ("historique", legacy_time, legacy_calls, legacy_chunks),
+        ("incrémental", new_time, new_calls, new_chunks),
+    ):
+        print(f"{name:<14}{elapsed:>12.3f}{total_tokens / elapsed:>16,.0f}{calls:>16,}{len(chunks):>10}")
+
+    print(f"\nAccélération: x{legacy_time / new_time:.2f}")
+    if legacy_chunks == new_chunks:
+        print("Parité: OK (chunks identiques)")
+    else:
+        print("Parité: ÉCHEC (les chunks diffèrent)")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+"""Benchmark et parité des backends d'inférence CPU (torch float32 vs ONNX / int8).
+Compare les embeddings (all-MiniLM-L6-v2) et le cross-encoder (ms-marco-MiniLM-L-6-v2)
+sur le jeu de requêtes fixe de backend/inference_backend.py, puis mesure le débit
+en embeddings/s et en paires rerankées/s.
+
+Usage:
+    python scripts/bench_inference.py                    # onnx et int8 contre torch
+    python scripts/bench_inference.py --backends int8
+    python scripts/bench_inference.py --texts 2000 --repeat 5 --min-top1 1.0
+"""
+import os, sys, time, argparse
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from backend.inference_backend import (
+    INFERENCE_BACKENDS,
+    PARITY_QUERIES,
+    embedding_parity,
+    load_cross_encoder,
+    load_embedding_model,
+    rerank_parity,
+)
+
+EMBEDDING_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+CROSS_ENCODER_MODEL_NAME = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+
+
+def workload(n_texts):
+    """Passages et paires (question, passage) répétés jusqu'à n_texts éléments"""
+    passages = [p for _, candidates in PARITY_QUERIES for p in candidates]
+    pairs = [(q, p) for q, candidates in PARITY_QUERIES for p in candidates]
+    texts = (passages * (n_texts // len(passages) + 1))[:n_texts]
+    pairs = (pairs * (n_texts // len(pairs) + 1))[:n_texts]
+    return texts, pairs
+
+
+def best_rate(fn, items, repeat):
+    fn(items[:8])  # Préchauffage (allocation, graphes ONNX)
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(items)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return len(items) / best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backends", nargs="+", default=["onnx", "int8"],
+                        choices=[b for b in INFERENCE_BACKENDS if b != "torch"])
+    parser.add_argument("--texts", type=int, default=512, help="Textes / paires par mesure")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--repeat", type=int, default=3, help="Meilleur temps sur N exécutions")
+    parser.add_argument("--min-top1", type=float, default=1.0,
+                        help="Accord minimal du premier résultat exigé pour la parité")
+    args = parser.parse_args()
+
+    texts, pairs = workload(args.texts)
+    results = {}
+    for backend in ["torch"] + args.backends:
+        print(f"Chargement des modèles ({backend})...")
+        results[backend] = {
+            "embeddings": load_embedding_model(EMBEDDING_MODEL_NAME, backend),
+            "cross_encoder": load_cross_encoder(CROSS_ENCODER_MODEL_NAME, backend),
+        }
+
+    print(f"\n{'Backend':<10}{'Embeddings/s':>16}{'Paires/s':>14}")
+    rates = {}
+    for backend, models in results.items():
+        emb_rate = best_rate(models["embeddings"].embed_documents, texts, args.repeat)
+        rerank_rate = best_rate(
+            lambda items: models["cross_encoder"].predict(items, batch_size=args.batch_size, show_progress_bar=False),
+            pairs, args.repeat,
+        )
+        rates[backend] = (emb_rate, rerank_rate)
+        print(f"{backend:<10}{emb_rate:>16,.1f}{rerank_rate:>14,.1f}")
+
+    failed = False
+    reference = results["torch"]
+    for backend in args.backends:
+        emb = embedding_parity(reference["embeddings"], results[backend]["embeddings"])
+        rerank = rerank_parity(reference["cross_encoder"], results[backend]["cross_encoder"])
+        emb_speedup = rates[backend][0] / rates["torch"][0]
+        rerank_speedup = rates[backend][1] / rates["torch"][1]
+        print(f"\n[{backend}] accélération: embeddings x{emb_speedup:.2f}, reranking x{rerank_speedup:.2f}")
+        print(f"  embeddings: {emb}")
+        print(f"  reranking:  {rerank}")
+        ok = emb["top1_agreement"] >= args.min_top1 and rerank["top1_agreement"] >= args.min_top1
+        print(f"  Parité: {'OK' if ok else 'ÉCHEC'}")
+        failed = failed or not ok
+
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
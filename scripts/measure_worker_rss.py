@@ -0,0 +1,120 @@
+"""Mémoire par worker: index chargé en mémoire privée (ancien format) vs mmap partagé.
+Lance N processus comme N workers gunicorn: chacun ouvre l'index du projet,
+exécute des recherches (pages réellement touchées), puis tous restent vivants
+pendant la mesure. Sont relevés par worker:
+- RSS: pages résidentes, partagées comprises (surestime le coût réel en mmap),
+- PSS: pages partagées divisées par le nombre de processus (somme = RAM réelle),
+- USS (Private): pages propres au worker.
+
+Modes:
+- memory: vecteurs lus en mémoire et chunks tous matérialisés en Document
+          (équivalent de FAISS.load_local + docstore picklé d'index.pkl),
+- mmap:   vecteurs projetés (IO_FLAG_MMAP) et chunks lus à la demande (ChunkStore).
+
+Usage:
+    python scripts/measure_worker_rss.py                    # 8 workers, deux modes
+    python scripts/measure_worker_rss.py --workers 4 --modes mmap --queries 500
+"""
+import os, sys, time, argparse
+import multiprocessing as mp
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from backend.config import INDEX_PATH
+
+
+def memory_counters():
+    """RSS / PSS / USS (octets) depuis /proc/self/smaps_rollup (Linux)"""
+    counters = {}
+    with open("/proc/self/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if parts[0] in ("Rss:", "Pss:", "Private_Clean:", "Private_Dirty:"):
+                counters[parts[0].rstrip(":")] = int(parts[1]) * 1024
+    return {
+        "rss": counters.get("Rss", 0),
+        "pss": counters.get("Pss", 0),
+        "uss": counters.get("Private_Clean", 0) + counters.get("Private_Dirty", 0),
+    }
+
+
+def load(mode, index_path):
+    import faiss
+    from backend.chunk_store import ChunkStore
+    faiss_path = os.path.join(index_path, "index.faiss")
+    if mode == "mmap":
+        flags = faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY | getattr(faiss, "IO_FLAG_MMAP_IFC", 0)
+        return faiss.read_index(faiss_path, flags), ChunkStore.open(index_path)
+
+    index = faiss.read_index(faiss_path)
+    # Équivalent du docstore picklé: tous les chunks en objets Python
+    chunks = ChunkStore.open(index_path)
+    return index, {str(position): chunks.search(str(position)) for position in range(len(chunks))}
+
+
+def worker(mode, index_path, n_queries, k, barrier, results):
+    import numpy as np
+    before = memory_counters()
+    start = time.perf_counter()
+    index, docstore = load(mode, index_path)
+    load_seconds = time.perf_counter() - start
+
+    rng = np.random.default_rng(os.getpid())
+    queries = rng.normal(0, 1, (n_queries, index.d)).astype(np.float32)
+    lookup = docstore.get if isinstance(docstore, dict) else docstore.search
+    for query in queries:
+        _, positions = index.search(query.reshape(1, -1), k)
+        for position in positions[0]:
+            if position != -1:
+                lookup(str(position))
+
+    # Mesure quand tous les workers ont chargé l'index (pages partagées comptées une fois en PSS)
+    barrier.wait()
+    after = memory_counters()
+    results.put({"pid": os.getpid(), "load_seconds": load_seconds, "before": before, "after": after})
+    barrier.wait()
+
+
+def run(mode, args):
+    ctx = mp.get_context("spawn")
+    barrier = ctx.Barrier(args.workers)
+    results = ctx.Queue()
+    processes = [ctx.Process(target=worker, args=(mode, args.index, args.queries, args.k, barrier, results))
+                 for _ in range(args.workers)]
+    for p in processes:
+        p.start()
+    reports = [results.get() for _ in processes]
+    for p in processes:
+        p.join()
+    return reports
+
+
+def mib(n):
+    return n / (1024 * 1024)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--index", default=INDEX_PATH)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--modes", nargs="+", default=["memory", "mmap"], choices=["memory", "mmap"])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=6)
+    args = parser.parse_args()
+
+    from backend.chunk_store import ChunkStore
+    if not ChunkStore.exists(args.index):
+        sys.exit("Index au nouveau format introuvable: convertir avec scripts/migrate_index.py")
+
+    print(f"{'Mode':<8}{'Chargement (s)':>15}{'RSS/worker':>13}{'PSS/worker':>13}{'USS/worker':>13}{'PSS total':>12}  (MiB, index seul)")
+    for mode in args.modes:
+        reports = run(mode, args)
+        delta = {key: [r["after"][key] - r["before"][key] for r in reports] for key in ("rss", "pss", "uss")}
+        load_seconds = sum(r["load_seconds"] for r in reports) / len(reports)
+        print(f"{mode:<8}{load_seconds:>15.2f}"
+              f"{mib(sum(delta['rss']) / len(reports)):>13.1f}"
+              f"{mib(sum(delta['pss']) / len(reports)):>13.1f}"
+              f"{mib(sum(delta['uss']) / len(reports)):>13.1f}"
+              f"{mib(sum(delta['pss'])):>12.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,44 @@
+"""Conversion d'un index FAISS à l'ancien format vers le ChunkStore (sans pickle).
+L'ancien format est index.faiss + index.pkl (docstore LangChain picklé,
+FAISS.save_local). Le pickle est désérialisé une seule fois ici: ne convertir
+qu'un fichier de confiance.
+
+L'application refuse de charger un index à l'ancien format: le convertir avec
+ce script (--dry-run pour vérifier sans écrire). INDEX_AUTO_MIGRATE=1 fait la
+même conversion au premier chargement.
+Les chunks sont réécrits par position FAISS; les identifiants de chunks du
+registre des documents et de l'index BM25 sont renumérotés. Écriture atomique:
+l'ancien dossier n'est remplacé qu'une fois la conversion complète.
+
+Usage:
+    python scripts/migrate_index.py                 # index/arx_faiss
+    python scripts/migrate_index.py --index path/to/index --dry-run
+"""
+import os, sys, argparse
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from backend.config import INDEX_PATH
+from backend.chunk_store import ChunkStore
+from backend.index_migration import migrate_legacy_index
+from backend.index_persistence import recover_index_dir
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--index", default=INDEX_PATH)
+    parser.add_argument("--dry-run", action="store_true", help="Vérifie la conversion sans écrire")
+    args = parser.parse_args()
+
+    recover_index_dir(args.index)
+    if ChunkStore.exists(args.index):
+        sys.exit("Index déjà au format ChunkStore, rien à convertir.")
+    try:
+        count = migrate_legacy_index(args.index, dry_run=args.dry_run)
+    except (FileNotFoundError, RuntimeError) as e:
+        sys.exit(str(e))
+    print(f"{count} chunks lus")
+    if not args.dry_run:
+        print(f"Index converti : {args.index}")
+
+
+if __name__ == '__main__':
+    main()
@@ -875,6 +875,96 @@ function updateLoadingMessage(messageId, newText, context = []) {
   }
 }
 
+/**
+ * Affiche le texte partiel d'une réponse en cours de génération
+ */
+function renderStreamingText(messageId, text) {
+  const msgDiv = $(`.message[data-message-id="${messageId}"]`);
+  if (msgDiv.length === 0) return;
+
+  let processedText;
+  try {
+    processedText = window.marked ? marked.parse(text) : escapeHtml(text);
+  } catch (e) {
+    processedText = escapeHtml(text);
+  }
+  msgDiv.find('.message-text').html(processedText);
+
+  if (localStorage.getItem('auto-scroll') !== 'false') {
+    chatHistoryElem.scrollTop(chatHistoryElem[0].scrollHeight);
+  }
+}
+
+/**
+ * Envoie une question à /ask/stream et affiche la réponse au fil des tokens (Server-Sent Events).
+ * Retourne un objet au format de /ask: { answer, context, thread_id } ou { error }
+ */
+async function streamAnswer(formData, messageId) {
+  const response = await fetch("/ask/stream", {
+    method: "POST",
+    body: formData,
+  });
+
+  // Erreur de validation: réponse JSON classique
+  if (!response.ok || !response.body) {
+    return await response.json();
+  }
+
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = "";
+  let text = "";
+  let context = [];
+  let result = null;
+  let renderScheduled = false;
+
+  // Un rendu markdown par frame au plus, quel que soit le débit des tokens
+  const scheduleRender = () => {
+    if (renderScheduled) return;
+    renderScheduled = true;
+    requestAnimationFrame(() => {
+      renderScheduled = false;
+      renderStreamingText(messageId, text);
+    });
+  };
+
+  while (!result) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+
+    let boundary;
+    while ((boundary = buffer.indexOf("\n\n")) >= 0) {
+      const block = buffer.slice(0, boundary);
+      buffer = buffer.slice(boundary + 2);
+
+      let event = "message";
+      let data = "";
+      for (const line of block.split("\n")) {
+        if (line.startsWith("event:")) event = line.slice(6).trim();
+        else if (line.startsWith("data:")) data += line.slice(5).trim();
+      }
+      const payload = data ? JSON.parse(data) : null;
+
+      if (event === "sources") {
+        context = payload || [];
+      } else if (event === "token") {
+        text += payload;
+        scheduleRender();
+      } else if (event === "summary") {
+        text += `\n\n📄 Résumé : ${payload}`;
+        scheduleRender();
+      } else if (event === "done") {
+        result = { ...payload, context };
+      } else if (event === "error") {
+        result = payload;
+      }
+    }
+  }
+
+  return result || { error: "Flux interrompu avant la fin de la réponse" };
+}
+
 /**
  * Crée une nouvelle conversation
  */
@@ -942,12 +1032,17 @@ async function sendMessage(e) {
   sendBtn.prop("disabled", true).addClass("sending");
   
   try {
-    const response = await fetch("/ask", {
-      method: "POST",
-      body: formData,
-    });
-
-    const data = await response.json();
+    let data;
+    if (filesForDisplay.length === 0) {
+      // Question seule: réponse affichée au fil de la génération
+      data = await streamAnswer(formData, loadingMessageId);
+    } else {
+      const response = await fetch("/ask", {
+        method: "POST",
+        body: formData,
+      });
+      data = await response.json();
+    }
 
     if (data.error) {
       // Suppression du message de chargement en cas d'erreur
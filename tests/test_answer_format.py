@@ -0,0 +1,38 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from backend import answer_format
+
+TWO_MARKERS = (
+    "Introduction.\n"
+    "### Résumé : détails du protocole\n"
+    "Suite de la réponse.\n"
+    "### 📄 Résumé : synthèse courte.\n"
+)
+
+
+def _stream(text, size):
+    splitter = answer_format.SummaryStreamSplitter()
+    shown = "".join(splitter.feed(text[i:i + size]) for i in range(0, len(text), size))
+    shown += splitter.close()
+    return shown, splitter
+
+
+def test_last_marker_wins():
+    answer, summary = answer_format.split_answer_summary(TWO_MARKERS)
+    assert answer == "Introduction.\n### Résumé : détails du protocole\nSuite de la réponse."
+    assert summary == "synthèse courte."
+
+
+def test_stream_matches_non_streaming_split():
+    expected = answer_format.split_answer_summary(TWO_MARKERS)
+    for size in (1, 3, 7, len(TWO_MARKERS)):
+        shown, splitter = _stream(TWO_MARKERS, size)
+        assert (splitter.answer, splitter.summary) == expected
+        assert shown.strip() == expected[0]
+
+
+def test_stream_single_marker():
+    shown, splitter = _stream("Réponse.\nRésumé : court.", 4)
+    assert (splitter.answer, splitter.summary) == ("Réponse.", "court.")
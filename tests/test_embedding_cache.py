@@ -0,0 +1,31 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+pytest.importorskip("langchain_core")
+from backend.embedding_cache import EmbeddingStore
+
+
+def test_put_many_after_partial_row(tmp_path):
+    store = EmbeddingStore(str(tmp_path), "modele-test")
+    store.put_many([("a", [1.0, 2.0, 3.0]), ("b", [4.0, 5.0, 6.0])])
+
+    # Crash simulé au milieu d'un ajout: vecteur et ligne de clé incomplets
+    with open(store.vectors_path, "ab") as f:
+        f.write(np.float32(7.0).tobytes())
+    with open(store.keys_path, "a", encoding="utf-8") as f:
+        f.write("c 2")
+
+    reopened = EmbeddingStore(str(tmp_path), "modele-test")
+    assert len(reopened) == 2
+    reopened.put_many([("d", [8.0, 9.0, 10.0]), ("e", [11.0, 12.0, 13.0])])
+
+    for s in (reopened, EmbeddingStore(str(tmp_path), "modele-test")):
+        found = s.get_many(["a", "b", "c", "d", "e"])
+        assert sorted(found) == ["a", "b", "d", "e"]
+        assert found["a"].tolist() == [1.0, 2.0, 3.0]
+        assert found["d"].tolist() == [8.0, 9.0, 10.0]
+        assert found["e"].tolist() == [11.0, 12.0, 13.0]
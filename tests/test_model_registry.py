@@ -0,0 +1,49 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from backend import model_registry
+from backend.model_registry import ModelRegistry
+
+
+def _failing_registry(monkeypatch, retry_seconds=30.0):
+    clock = [100.0]
+    monkeypatch.setattr(model_registry.time, "monotonic", lambda: clock[0])
+    calls = []
+
+    def loader():
+        calls.append(clock[0])
+        raise RuntimeError("index illisible")
+
+    registry = ModelRegistry(retry_seconds=retry_seconds)
+    registry.register("faiss_index", loader)
+    return registry, calls, clock
+
+
+def test_failed_component_is_not_reloaded_before_backoff(monkeypatch):
+    registry, calls, clock = _failing_registry(monkeypatch)
+    for _ in range(3):
+        with pytest.raises(RuntimeError, match="index illisible"):
+            registry.get("faiss_index")
+    assert len(calls) == 1
+    assert registry.status()["faiss_index"]["state"] == "failed"
+
+    clock[0] += 31
+    with pytest.raises(RuntimeError):
+        registry.get("faiss_index")
+    assert len(calls) == 2
+
+
+def test_retry_forces_reload(monkeypatch):
+    registry, calls, _ = _failing_registry(monkeypatch)
+    with pytest.raises(RuntimeError):
+        registry.get("faiss_index")
+    registry.retry("faiss_index")
+    with pytest.raises(RuntimeError):
+        registry.get("faiss_index")
+    assert len(calls) == 2
+
+    registry.set("faiss_index", "index")
+    assert registry.get("faiss_index") == "index"